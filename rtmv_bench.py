@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   rtmv_bench.py
+@Time    :   2026/10/18 11:55:00
+@Desc    :   Benchmarks of the rtmv hot paths, compared against a baseline
+'''
+
+import os, sys, time
+import json
+import socket
+import argparse
+import platform
+import tempfile
+
+import av
+
+from rtmvfile import RtmvParser, RtmvVidPayloadFeeder, RtmvPayloadReader
+from rtmv_synth import RtmvSynth, parseSections
+
+import logging
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(funcName)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class RtmvBench(object):
+    '''
+    Times the hot paths on one rtmv file, the best of repeat runs. Every case
+    gives a value, its unit and whether higher or lower is better, see run().
+    '''
+    CASES = ('load', 'load_mmap', 'load_header_only', 'load_index', 'scan',
+             'payloads', 'probe', 'feeder', 'decode', 'decode_inproc')
+
+    def __init__(self, url, repeat=3):
+        self.url = url
+        self.repeat = repeat
+        self.filesize = os.path.getsize(url)
+
+    def _best(self, func, setup=None) -> float:
+        # best time of func(setup()) in seconds, setup is not timed
+        best = None
+        for _ in range(self.repeat):
+            arg = setup() if setup is not None else None
+            t0 = time.perf_counter()
+            func(arg)
+            t = time.perf_counter() - t0
+            best = t if best is None else min(best, t)
+        return best
+
+    def _load(self, **kw) -> RtmvParser:
+        rt = RtmvParser()
+        rt.load(self.url, **kw)
+        return rt
+
+    def _loadRate(self, **kw):
+        t = self._best(lambda _: self._load(**kw).free())
+        return self.filesize/t/1e6, 'MB/s', 'higher'
+
+    def benchLoad(self):
+        return self._loadRate(use_index=False)
+
+    def benchLoadMmap(self):
+        return self._loadRate(use_index=False, use_mmap=True)
+
+    def benchLoadHeaderOnly(self):
+        return self._loadRate(use_index=False, header_only=True)
+
+    def benchLoadIndex(self):
+        self._load(use_index=True).free()  # make sure the index is there
+        return self._loadRate(use_index=True)
+
+    def benchScan(self):
+        rt = self._load(use_index=False)
+        t = self._best(lambda _: rt._scanPackages(1))
+        n = len(rt.rtmvpackages)
+        rt.free()
+        return n/t, 'packages/s', 'higher'
+
+    def benchPayloads(self):
+        rt = self._load(use_index=False)
+        pkgs = range(len(rt.rtmvpackages))
+        size = sum(len(p) for p in rt.getPayloads(pkgs))
+        t = self._best(lambda _: rt.getPayloads(pkgs))
+        rt.free()
+        return size/t/1e6, 'MB/s', 'higher'
+
+    def benchProbe(self):
+        # a fresh parser every run, the sections are probed once only
+        t = self._best(lambda rt: (rt.probeSections(), rt.free()),
+                       setup=lambda: self._load(use_index=False))
+        return t, 's', 'lower'
+
+    def _videoSection(self, rt):
+        for sec in rt.payload_sections:
+            if sec.type == RtmvParser.PayloadType.VIDEO and sec.end > sec.start:
+                return sec
+        return None
+
+    def benchFeeder(self):
+        rt = self._load(use_index=False)
+        sec = self._videoSection(rt)
+        if sec is None:
+            rt.free()
+            return None
+
+        def feed(_):
+            feeder = RtmvVidPayloadFeeder(rt, sec.start, sec.end, autostart=True)
+            with socket.create_connection(feeder.hostaddr[:2]) as s:
+                while s.recv(1024*1024):
+                    pass
+            feeder.stop()
+        size = sum(len(p) for p in rt.getPayloads(range(sec.start, sec.end + 1)))
+        t = self._best(feed)
+        rt.free()
+        return size/t/1e6, 'MB/s', 'higher'
+
+    def _decodeRate(self, inproc):
+        rt = self._load(use_index=False)
+        sec = self._videoSection(rt)
+        if sec is None:
+            rt.free()
+            return None
+        frames = [0]
+
+        def decode(_):
+            # the ways the player does it, demuxed by pyav from the feeder
+            # over tcp or from the reader in process
+            if inproc:
+                feeder = RtmvPayloadReader(rt, sec.start, sec.end)
+                ct = av.open(feeder, mode='r')
+            else:
+                feeder = RtmvVidPayloadFeeder(rt, sec.start, sec.end, autostart=True,
+                                              address=('127.0.0.1', 0))
+                ct = av.open(feeder.url, mode='r')
+            frames[0] = sum(1 for _ in ct.decode(video=0))
+            ct.close()
+            feeder.stop()
+        t = self._best(decode)
+        rt.free()
+        return frames[0]/t, 'fps', 'higher'
+
+    def benchDecode(self):
+        return self._decodeRate(inproc=False)
+
+    def benchDecodeInproc(self):
+        return self._decodeRate(inproc=True)
+
+    def run(self, cases=None) -> dict:
+        '''
+        run the cases (all if None), return {case: {'value', 'unit', 'better'}}
+        '''
+        results = {}
+        for case in cases or RtmvBench.CASES:
+            method = 'bench' + ''.join(w.capitalize() for w in case.split('_'))
+            res = getattr(self, method)()
+            if res is None:
+                logger.info(f'{case}: skipped')
+                continue
+            value, unit, better = res
+            results[case] = {'value': value, 'unit': unit, 'better': better}
+            logger.info(f'{case}: {value:.2f} {unit}')
+        return results
+
+
+def compare(results, baseline, tolerance=0.15) -> list:
+    '''
+    cases of results worse than in baseline by more than tolerance (a
+    fraction), as (case, value, baseline value, relative change) tuples
+    '''
+    regressions = []
+    for case, res in results.items():
+        base = baseline.get(case)
+        if base is None or base['value'] == 0: continue
+        change = (res['value'] - base['value'])/base['value']
+        if (res['better'] == 'higher' and change < -tolerance) or \
+                (res['better'] == 'lower' and change > tolerance):
+            regressions.append((case, res['value'], base['value'], change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the rtmv hot paths.')
+    parser.add_argument('url', nargs='?', help='rtmv file, a synthetic one is made if not given')
+    parser.add_argument('-s', '--sections', default='video:3000,image:50,video:3000',
+                        help='sections of the synthetic file, see rtmv_synth.py')
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('-c', '--cases', nargs='+', choices=RtmvBench.CASES, default=None)
+    parser.add_argument('-b', '--baseline', help='baseline json to compare with')
+    parser.add_argument('--save', help='save the results as a baseline json')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.15,
+                        help='allowed relative slow down against the baseline')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url
+        if url is None:
+            url = os.path.join(tmp, 'synth.rtmv')
+            RtmvSynth().write(url, parseSections(args.sections))
+        results = RtmvBench(url, args.repeat).run(args.cases)
+
+    for case, res in results.items():
+        print(f'{case:<20}{res["value"]:>14.2f} {res["unit"]}')
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'host': platform.node(), 'python': platform.python_version(),
+                       'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for case, value, base, change in regressions:
+            print(f'REGRESSION {case}: {value:.2f} against {base:.2f} ({change:+.0%})')
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   rtmv_catalog.py
+@Time    :   2026/10/18 11:10:00
+@Desc    :   Catalog of rtmv files in a directory tree, kept in sqlite
+'''
+
+import os, sys, time
+import argparse
+import sqlite3
+import struct
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import av
+import numpy as np
+
+from rtmvfile import RtmvParser
+
+import logging
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(funcName)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _summarize(url, use_index=False):
+    '''
+    process pool worker, load a rtmv file and sum it up into a dict.
+    None is returned if the file cannot be read or parsed. With use_index
+    the .idx sidecar of the file is used and written.
+    '''
+    rt = RtmvParser()
+    try:
+        st = os.stat(url)
+        summary = {'url': url, 'size': st.st_size, 'mtime': st.st_mtime_ns,
+                   'start_time': None, 'duration': 0, 'uav_name': '',
+                   'lat_min': None, 'lat_max': None, 'lon_min': None, 'lon_max': None,
+                   'pkg_cnt': 0, 'vpkg_cnt': 0, 'ppkg_cnt': 0, 'sections': []}
+        rt.load(url, use_index=use_index, use_mmap=True)
+        hd = rt.headers
+        if len(hd) > 0:
+            lat, lon = hd['lat'], hd['long']
+            fixed = np.isfinite(lat) & np.isfinite(lon) & ((lat != 0) | (lon != 0))
+            if fixed.any():
+                summary.update(lat_min=float(lat[fixed].min()), lat_max=float(lat[fixed].max()),
+                               lon_min=float(lon[fixed].min()), lon_max=float(lon[fixed].max()))
+            summary.update(start_time=float(rt.start_time), duration=float(rt.duration),
+                           uav_name=hd['uav_name'][0].decode('ascii', 'replace').strip('\x00 '),
+                           pkg_cnt=len(hd), vpkg_cnt=rt.vpkg_cnt, ppkg_cnt=rt.ppkg_cnt)
+            for sec in rt.payload_sections:
+                meta = sec.meta or {}
+                summary['sections'].append((sec.type.name, sec.start, sec.end, float(sec.duration),
+                                            meta.get('codec'), meta.get('size')))
+    except (OSError, ValueError, struct.error, av.FFmpegError) as e:
+        logger.warning(f'Fail to index {url}: {e}')
+        return None
+    finally:
+        rt.free()
+    return summary
+
+
+class RtmvCatalog(object):
+    '''
+    Per-file summaries of rtmv files in a sqlite database. scan() indexes a
+    directory tree with a process pool, files whose size and mtime did not
+    change since the last scan are skipped. No .idx sidecars are written
+    next to the files unless scan() is asked to.
+    '''
+    _SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS files (
+            url         TEXT PRIMARY KEY,
+            size        INTEGER,
+            mtime       INTEGER,
+            start_time  REAL,
+            duration    REAL,
+            uav_name    TEXT,
+            lat_min     REAL,
+            lat_max     REAL,
+            lon_min     REAL,
+            lon_max     REAL,
+            pkg_cnt     INTEGER,
+            vpkg_cnt    INTEGER,
+            ppkg_cnt    INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS files_time ON files (start_time);
+        CREATE INDEX IF NOT EXISTS files_uav ON files (uav_name, start_time);
+        CREATE TABLE IF NOT EXISTS sections (
+            url         TEXT REFERENCES files (url) ON DELETE CASCADE,
+            idx         INTEGER,
+            type        TEXT,
+            start       INTEGER,
+            end         INTEGER,
+            duration    REAL,
+            codec       TEXT,
+            size        TEXT,
+            PRIMARY KEY (url, idx)
+        );
+    '''
+    _FILE_COLS = ('url', 'size', 'mtime', 'start_time', 'duration', 'uav_name',
+                  'lat_min', 'lat_max', 'lon_min', 'lon_max', 'pkg_cnt', 'vpkg_cnt', 'ppkg_cnt')
+
+    def __init__(self, db_url='rtmv_catalog.db'):
+        self._db = sqlite3.connect(db_url)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA foreign_keys = ON')
+        self._db.executescript(RtmvCatalog._SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def scan(self, root, workers=None, ext='.rtmv', write_index=False):
+        '''
+        (re)index the rtmv files under root, return the counts of
+        (indexed, unchanged, removed) files. With write_index the files are
+        loaded with their .idx sidecars, which are written where missing.
+        '''
+        root = os.path.abspath(root)
+        found = {}
+        for dirpath, _, filenames in os.walk(root):
+            for fn in filenames:
+                if fn.lower().endswith(ext):
+                    url = os.path.join(dirpath, fn)
+                    try:
+                        st = os.stat(url)
+                    except OSError as e:  # gone while walking
+                        logger.warning(f'Fail to stat {url}: {e}')
+                        continue
+                    found[url] = (st.st_size, st.st_mtime_ns)
+
+        prefix = os.path.join(root, '')
+        known = {row['url']: (row['size'], row['mtime']) for row in
+                 self._db.execute('SELECT url, size, mtime FROM files WHERE substr(url, 1, ?) = ?',
+                                  (len(prefix), prefix))}
+        todo = [url for url, stat in found.items() if known.get(url) != stat]
+        gone = [url for url in known if url not in found]
+
+        time_start = time.time()
+        indexed = 0
+        with ProcessPoolExecutor(workers) as executor, self._db:
+            self._db.executemany('DELETE FROM files WHERE url = ?', [(url,) for url in gone])
+            for url, summary in zip(todo, executor.map(partial(_summarize, use_index=write_index),
+                                                       todo, chunksize=4)):
+                # a file changed since the last scan loses its row, even if
+                # it cannot be summed up now
+                self._db.execute('DELETE FROM files WHERE url = ?', (url,))
+                if summary is None: continue
+                self._db.execute(f'INSERT INTO files ({", ".join(self._FILE_COLS)}) '
+                                 f'VALUES ({", ".join("?"*len(self._FILE_COLS))})',
+                                 [summary[c] for c in self._FILE_COLS])
+                self._db.executemany('INSERT INTO sections VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                     [(summary['url'], i, *sec) for i, sec in enumerate(summary['sections'])])
+                indexed += 1
+        logger.info(f'Indexed {indexed} of {len(todo)} changed files, {len(found)-len(todo)} '
+                    f'unchanged, {len(gone)} removed in {time.time()-time_start:.2f}s')
+        return indexed, len(found) - len(todo), len(gone)
+
+    def query(self, uav_name=None, t0=None, t1=None, bbox=None) -> list:
+        '''
+        files of the uav (if given) recorded in the period [t0, t1] (unix
+        time, either end may be open) over the bbox (lat_min, lon_min,
+        lat_max, lon_max), as a list of dicts sorted by start time.
+        '''
+        where, args = [], []
+        if uav_name is not None:
+            where.append('uav_name = ?')
+            args.append(uav_name)
+        if t1 is not None:
+            where.append('start_time <= ?')
+            args.append(t1)
+        if t0 is not None:
+            where.append('start_time + duration >= ?')
+            args.append(t0)
+        if bbox is not None:
+            where.append('lat_min <= ? AND lat_max >= ? AND lon_min <= ? AND lon_max >= ?')
+            args.extend((bbox[2], bbox[0], bbox[3], bbox[1]))
+        sql = 'SELECT * FROM files'
+        if where: sql += ' WHERE ' + ' AND '.join(where)
+        return [dict(row) for row in self._db.execute(sql + ' ORDER BY start_time', args)]
+
+    def sections(self, url) -> list:
+        return [dict(row) for row in self._db.execute(
+                    'SELECT * FROM sections WHERE url = ? ORDER BY idx', (os.path.abspath(url),))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Index rtmv files and query the catalog')
+    parser.add_argument('--db', default='rtmv_catalog.db', help='catalog database')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_scan = sub.add_parser('scan', help='index a directory tree')
+    p_scan.add_argument('root')
+    p_scan.add_argument('-j', '--workers', type=int, default=None)
+    p_scan.add_argument('--write-index', action='store_true',
+                        help='use and write the .idx sidecars of the files')
+    p_query = sub.add_parser('query', help='query the catalog')
+    p_query.add_argument('--uav')
+    p_query.add_argument('--since', type=float, help='unix time')
+    p_query.add_argument('--until', type=float, help='unix time')
+    p_query.add_argument('--bbox', type=float, nargs=4, metavar=('LAT_MIN', 'LON_MIN', 'LAT_MAX', 'LON_MAX'))
+    args = parser.parse_args()
+
+    catalog = RtmvCatalog(args.db)
+    if args.cmd == 'scan':
+        catalog.scan(args.root, args.workers, write_index=args.write_index)
+    else:
+        for f in catalog.query(args.uav, args.since, args.until, args.bbox):
+            print('{url}  {uav_name}  {0}  {duration:.1f}s'.format(
+                    time.asctime(time.localtime(f['start_time'])), **f))
+    catalog.close()
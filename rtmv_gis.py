@@ -3,15 +3,197 @@
 @author: Zhengwei GUAN
 """
 
-# GIS for rtmv parsing
+# GIS for rtmv parsing: the flight route from the package headers, simplified
+# and written as GeoJSON, KML, GPX or a folium html map.
 
-
-import folium
 import os
+import time
+import json
+import math
+import argparse
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+import logging
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(funcName)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+EARTH_RADIUS = 6371008.8   # mean earth radius in metres
+
+class RtmvRoute(object):
+    '''
+    The flight route as time, lat, long and alt columns. Build it by
+    fromHeaders from a rtmv header array (rt.headers), positions without a
+    valid fix are left out. simplify() returns a route with fewer points,
+    the write methods stream the points to the file in chunks.
+    '''
+    _CHUNK = 10000
+
+    def __init__(self, ts, lat, lon, alt, name=''):
+        self.ts = np.asarray(ts, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.alt = np.asarray(alt, dtype=np.float64)
+        self.name = name
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def fromHeaders(cls, headers):
+        lat, lon = headers['lat'], headers['long']
+        valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180) \
+                & ((lat != 0) | (lon != 0))
+        # a new point only where the position moves
+        valid[1:] &= (lat[1:] != lat[:-1]) | (lon[1:] != lon[:-1])
+        name = ''
+        if len(headers) > 0:
+            name = headers['uav_name'][0].rstrip(b'\0').decode('ascii', 'replace')
+        return cls(headers['timestamp'][valid], lat[valid], lon[valid], headers['alt'][valid], name)
+
+    def _take(self, keep):
+        return RtmvRoute(self.ts[keep], self.lat[keep], self.lon[keep], self.alt[keep], self.name)
+
+    def _metres(self):
+        # local equirectangular projection, scaled at the mean latitude
+        lat0 = np.radians(np.mean(self.lat))
+        x = EARTH_RADIUS*np.radians(self.lon - self.lon[0])*np.cos(lat0)
+        y = EARTH_RADIUS*np.radians(self.lat - self.lat[0])
+        return x, y
+
+    def simplify(self, tolerance=1.0):
+        '''
+        Douglas-Peucker simplification in the horizontal plane, no point of
+        the route is farther than tolerance metres from the simplified one.
+        '''
+        n = len(self)
+        if n < 3 or tolerance <= 0: return self
+        x, y = self._metres()
+        keep = np.zeros(n, dtype=bool)
+        keep[0] = keep[-1] = True
+        stack = [(0, n - 1)]
+        while stack:
+            s, e = stack.pop()
+            if e - s < 2: continue
+            dx, dy = x[e] - x[s], y[e] - y[s]
+            px, py = x[s+1:e] - x[s], y[s+1:e] - y[s]
+            seg2 = dx*dx + dy*dy
+            # distance to the segment, the projection clamped to its ends
+            u = np.clip((px*dx + py*dy)/seg2, 0, 1) if seg2 > 0 else 0
+            d = np.hypot(px - u*dx, py - u*dy)
+            k = int(np.argmax(d))
+            if d[k] > tolerance:
+                m = s + 1 + k
+                keep[m] = True
+                stack.append((s, m))
+                stack.append((m, e))
+        route = self._take(keep)
+        logger.info(f'Route simplified from {n} to {len(route)} points, tolerance {tolerance}m')
+        return route
+
+    def _chunks(self):
+        for s in range(0, len(self), self._CHUNK):
+            e = s + self._CHUNK
+            yield zip(self.ts[s:e].tolist(), self.lat[s:e].tolist(),
+                      self.lon[s:e].tolist(), self.alt[s:e].tolist())
+
+    @staticmethod
+    def _isoTime(t):
+        return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t)) + f'.{int(t % 1 * 1000):03d}Z'
+
+    def writeGeoJson(self, f):
+        props = {'name': self.name, 'points': len(self)}
+        if len(self) > 0:
+            props.update(start=self._isoTime(self.ts[0]), end=self._isoTime(self.ts[-1]))
+        f.write('{"type": "FeatureCollection", "features": [{"type": "Feature", '
+                f'"properties": {json.dumps(props, allow_nan=False)}, '
+                '"geometry": {"type": "LineString", "coordinates": [\n')
+        sep = ''
+        for chunk in self._chunks():
+            # no altitude for the points without one, NaN is not JSON
+            f.write(sep + ',\n'.join(f'[{lon:.7f}, {lat:.7f}, {alt:.2f}]' if not math.isnan(alt)
+                                     else f'[{lon:.7f}, {lat:.7f}]' for _, lat, lon, alt in chunk))
+            sep = ',\n'
+        f.write('\n]}}]}\n')
+
+    def writeKml(self, f):
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+                f'<Placemark><name>{escape(self.name)}</name><LineString>'
+                '<altitudeMode>absolute</altitudeMode><coordinates>\n')
+        for chunk in self._chunks():
+            f.write('\n'.join(f'{lon:.7f},{lat:.7f},{alt:.2f}' if not math.isnan(alt) else f'{lon:.7f},{lat:.7f}'
+                              for _, lat, lon, alt in chunk) + '\n')
+        f.write('</coordinates></LineString></Placemark>\n</Document></kml>\n')
+
+    def writeGpx(self, f):
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx version="1.1" creator="rtmv_gis" xmlns="http://www.topografix.com/GPX/1/1">\n'
+                f'<trk><name>{escape(self.name)}</name><trkseg>\n')
+        for chunk in self._chunks():
+            f.write(''.join(f'<trkpt lat="{lat:.7f}" lon="{lon:.7f}">'
+                            + (f'<ele>{alt:.2f}</ele>' if not math.isnan(alt) else '')
+                            + f'<time>{self._isoTime(t)}</time></trkpt>\n' for t, lat, lon, alt in chunk))
+        f.write('</trkseg></trk>\n</gpx>\n')
+
+    def renderMap(self, url, max_points=5000, tolerance=1.0):
+        '''
+        save a folium html map of the route, simplified with a tolerance
+        doubled until it has at most max_points points.
+        '''
+        if len(self) == 0:
+            raise ValueError('no valid position in the route')
+        import folium  # only needed for the html map
+        route = self.simplify(tolerance)
+        while len(route) > max_points:
+            tolerance *= 2
+            route = self.simplify(tolerance)
+        points = list(zip(route.lat.tolist(), route.lon.tolist()))
+        m = folium.Map(location=[float(np.mean(route.lat)), float(np.mean(route.lon))])
+        folium.PolyLine(points, tooltip=self.name).add_to(m)
+        folium.Marker(points[0], tooltip='start').add_to(m)
+        folium.Marker(points[-1], tooltip='end').add_to(m)
+        m.fit_bounds([[float(route.lat.min()), float(route.lon.min())],
+                      [float(route.lat.max()), float(route.lon.max())]])
+        m.save(url)
+
+    _WRITERS = {'.geojson': 'writeGeoJson', '.json': 'writeGeoJson',
+                '.kml': 'writeKml', '.gpx': 'writeGpx'}
+
+    def save(self, url) -> int:
+        '''
+        write the route by the extension of url: .geojson/.json, .kml, .gpx
+        or .html for a map, GeoJSON for any other. Return the file size.
+        '''
+        ext = os.path.splitext(url)[1].lower()
+        if ext in ('.html', '.htm'):
+            self.renderMap(url)
+            return os.path.getsize(url)
+        if len(self) == 0:
+            logger.warning('No valid position in the route.')
+        if ext not in self._WRITERS:
+            logger.info(f'Unknown route format "{ext}", write GeoJSON.')
+        with open(url, 'w', encoding='utf-8') as f:
+            getattr(self, self._WRITERS.get(ext, 'writeGeoJson'))(f)
+        return os.path.getsize(url)
 
 
 if __name__ == "__main__":
-    m = folium.Map(location=[45.5236, -122.6750])
-    print(m)
-    'This is a default'
-    m.save('map.html')
+    from rtmvfile import RtmvParser
+
+    parser = argparse.ArgumentParser(description='Export the flight route of a rtmv file.')
+    parser.add_argument('rtmv', help='the rtmv file')
+    parser.add_argument('out', nargs='+', help='output files, .geojson/.json, .kml, .gpx or .html')
+    parser.add_argument('-t', '--tolerance', type=float, default=1.0,
+                        help='simplification tolerance in metres, 0 to keep all points')
+    args = parser.parse_args()
+
+    rt = RtmvParser()
+    rt.load(args.rtmv, header_only=True)
+    route = RtmvRoute.fromHeaders(rt.headers)
+    simplified = route.simplify(args.tolerance)
+    for url in args.out:
+        print(f'{url}: {simplified.save(url)} bytes')
+    rt.free()
@@ -145,8 +145,9 @@ class MainWindow(QMainWindow):
             print(f'Fail to load the file {furl}.')
             return
 
-        # get the payload sections of the rtmv
-        self.payload_sections = self.rt.payload_sections
+        # get the payload sections of the rtmv, their metadata is probed on
+        # first use
+        self.payload_sections = list(self.rt.payload_sections)
 
         # Set up package tree
         top_item = QTreeWidgetItem()
@@ -184,19 +185,19 @@ class MainWindow(QMainWindow):
             self.sectiontree[-1].setHeaderLabels(['Key', 'Value'])
             self.sectiontree[-1].header().setSectionResizeMode(QHeaderView.ResizeToContents)
 
-            # set up the payload section tree with section content
+            # set up the payload section tree, the content is filled in when
+            # the section is shown, see _showSectionTree
             self.sectiontree[-1].clear()
             top = QTreeWidgetItem()
             top.setText(0, f'{os.path.split(self.rt.srcurl)[1]} Payload Section {i:>02}:')
             self.sectiontree[-1].addTopLevelItem(top)
-            self._loadJsonTree(self.sectiontree[-1], ps.meta, top)
             self.section_tree_layout.addWidget(self.sectiontree[-1])
 
         if len(self.payload_sections) > 0:
             # TODO: show the payload content
             self._current_sec = 0
             self.sectionlabels[self._current_sec].setChecked(True)
-            self.section_tree_layout.setCurrentIndex(self._current_sec)
+            self._showSectionTree(self._current_sec)
 
             # Load player
             if self.payload_sections[self._current_sec].type == RtmvParser.PayloadType.VIDEO:
@@ -231,7 +232,14 @@ class MainWindow(QMainWindow):
                     label.setChecked(False)
 
             # Update the section information
-            self.section_tree_layout.setCurrentIndex(self._current_sec)
+            self._showSectionTree(self._current_sec)
+
+    def _showSectionTree(self, i):
+        # the metadata of a section is probed the first time it is shown
+        top = self.sectiontree[i].topLevelItem(0)
+        if top.childCount() == 0:
+            self._loadJsonTree(self.sectiontree[i], self.payload_sections[i].meta, top)
+        self.section_tree_layout.setCurrentIndex(i)
 
     def sectionInfoUpdate(self, label):
         pass
@@ -252,7 +260,7 @@ class MainWindow(QMainWindow):
 
         self.sectionlabels.clear()
         self.sectiontree.clear()
-        self.payload_sections.clear()
+        self.payload_sections = []
 
         # release rtmv
         if self.rt is not None:
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   rtmv_ingest.py
+@Time    :   2026/10/18 11:20:00
+@Desc    :   asyncio ingest server for live rtmv streams over TCP/UDP
+'''
+
+import os, sys, time
+import argparse
+import asyncio
+import struct
+
+from rtmvfile import RtmvParser, RtmvStreamParser
+
+import logging
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(funcName)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class RtmvIngestStream(object):
+    '''
+    One incoming stream, i.e. a TCP connection or the datagrams from one UDP
+    peer. Parsed packages are put into queue as (header, payload) pairs, and
+    None is put when the stream ends. The queue is bounded: a full queue
+    stops reading a TCP connection, UDP packages are dropped instead.
+    '''
+    def __init__(self, name, queue_size=256, max_payload=None, record_url=None):
+        self._name      = name
+        self._queue     = asyncio.Queue(queue_size)
+        self._parser    = RtmvStreamParser(max_payload)
+        self._record    = None if record_url is None else open(record_url, 'wb')
+        self._pkg_cnt   = 0
+        self._byte_cnt  = 0
+        self._drop_cnt  = 0
+        self._closed    = False
+        self._time_start = time.time()
+        self._time_last = time.monotonic()   # of the last data received
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def queue(self):
+        return self._queue
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def stats(self) -> dict:
+        return {'packages': self._pkg_cnt, 'bytes': self._byte_cnt, 'dropped': self._drop_cnt,
+                'syncs': self._parser.sync_cnt, 'seconds': time.time() - self._time_start}
+
+    @property
+    def idle(self) -> float:
+        '''
+        seconds since the last data received
+        '''
+        return time.monotonic() - self._time_last
+
+    def _feed(self, data) -> list:
+        self._byte_cnt += len(data)
+        self._time_last = time.monotonic()
+        return self._got(self._parser.feed(data))
+
+    def _close(self) -> list:
+        pkgs = self._got(self._parser.close())
+        self._closed = True
+        if self._record is not None:
+            self._record.close()
+        return pkgs
+
+    def _got(self, pkgs: list) -> list:
+        self._pkg_cnt += len(pkgs)
+        if self._record is not None:
+            for header, payload in pkgs:
+                self._record.write(struct.pack(RtmvParser._struct_fmt, *header))
+                self._record.write(payload)
+        return pkgs
+
+    def _offer(self, pkg):
+        # for UDP, there is no way to push back on the sender
+        try:
+            self._queue.put_nowait(pkg)
+        except asyncio.QueueFull:
+            self._drop()
+
+    def _end(self):
+        # make room for the end mark by dropping the oldest package
+        if self._queue.full():
+            self._queue.get_nowait()
+            self._drop()
+        self._queue.put_nowait(None)
+
+    def _drop(self, cnt=1):
+        self._drop_cnt += cnt
+        if self._drop_cnt == cnt or self._drop_cnt % 100 < cnt:  # sampled
+            logger.warning(f'Stream {self._name} queue is full, {self._drop_cnt} packages dropped')
+
+
+class _RtmvUdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self._server = server
+
+    def datagram_received(self, data, addr):
+        stream = self._server._openStream(f'udp_{addr[0]}_{addr[1]}')
+        for pkg in stream._feed(data):
+            stream._offer(pkg)
+
+
+class RtmvIngestServer(object):
+    '''
+    Accept rtmv streams from many UAVs over TCP, and UDP if udp_port is set,
+    and parse them incrementally. Every stream is a RtmvIngestStream in
+    streams, on_stream(stream) is called when one shows up so the caller can
+    start consuming its queue. With record_dir the packages of each stream
+    are also written to record_dir/<stream name>.rtmv.
+    A stream is dropped from streams when it ends. A UDP stream has no
+    connection to close, it ends after udp_timeout seconds without a
+    datagram; a later datagram of the peer starts a new one.
+    Memory per stream is bounded by chunk_size, queue_size and max_payload.
+    '''
+    def __init__(self, host='127.0.0.1', port=15100, udp_port=None, queue_size=256,
+                    chunk_size=64*1024, max_payload=None, record_dir=None, on_stream=None,
+                    udp_timeout=30.0):
+        self._host        = host
+        self._port        = port
+        self._udp_port    = udp_port
+        self._queue_size  = queue_size
+        self._chunk_size  = chunk_size
+        self._max_payload = max_payload
+        self._record_dir  = record_dir
+        self._on_stream   = on_stream
+        self._streams     = {}
+        self._tcp_server  = None
+        self._udp_transport = None
+        self._udp_timeout = udp_timeout
+        self._udp_reaper  = None
+
+    @property
+    def streams(self) -> dict:
+        return self._streams
+
+    @property
+    def hostaddr(self):
+        return self._tcp_server.sockets[0].getsockname()
+
+    async def start(self):
+        self._tcp_server = await asyncio.start_server(self._handleTcp, self._host, self._port,
+                                                      limit=self._chunk_size)
+        logger.info(f'Ingest server listening on tcp {self.hostaddr[0]}:{self.hostaddr[1]}')
+        if self._udp_port is not None:
+            self._udp_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                    lambda: _RtmvUdpProtocol(self), local_addr=(self._host, self._udp_port))
+            logger.info(f'Ingest server listening on udp {self._host}:{self._udp_port}')
+            self._udp_reaper = asyncio.ensure_future(self._reapUdp())
+
+    async def stop(self):
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            await self._tcp_server.wait_closed()
+        if self._udp_reaper is not None:
+            self._udp_reaper.cancel()
+            self._udp_reaper = None
+        if self._udp_transport is not None:
+            self._udp_transport.close()
+            for stream in list(self._streams.values()):
+                if stream.name.startswith('udp') and not stream.closed:
+                    self._endStream(stream)
+
+    def _endStream(self, stream: RtmvIngestStream):
+        # put what is left and the end mark without waiting, and forget it
+        for pkg in stream._close():
+            stream._offer(pkg)
+        stream._end()
+        if self._streams.get(stream.name) is stream:
+            del self._streams[stream.name]
+        logger.info(f'Stream {stream.name} closed: {stream.stats}')
+
+    async def _reapUdp(self):
+        # end the UDP streams idle for udp_timeout, as a TCP stream ends
+        # with its connection
+        while True:
+            await asyncio.sleep(max(self._udp_timeout/4, 0.05))
+            for name, stream in list(self._streams.items()):
+                if name.startswith('udp') and stream.idle > self._udp_timeout:
+                    self._endStream(stream)
+
+    async def serve_forever(self):
+        await self.start()
+        await self._tcp_server.serve_forever()
+
+    def _openStream(self, name) -> RtmvIngestStream:
+        stream = self._streams.get(name)
+        if stream is None or stream.closed:
+            record_url = None
+            if self._record_dir is not None:
+                record_url = os.path.join(self._record_dir, f'{name}_{int(time.time())}.rtmv')
+            stream = RtmvIngestStream(name, self._queue_size, self._max_payload, record_url)
+            self._streams[name] = stream
+            logger.info(f'New stream {name}')
+            if self._on_stream is not None:
+                self._on_stream(stream)
+        return stream
+
+    async def _handleTcp(self, reader, writer):
+        host, port = writer.get_extra_info('peername')[:2]
+        stream = self._openStream(f'tcp_{host}_{port}')
+        try:
+            while True:
+                data = await reader.read(self._chunk_size)
+                if not data: break
+                for pkg in stream._feed(data):
+                    # no reading from the socket while the queue is full
+                    await stream.queue.put(pkg)
+        except ConnectionError as e:
+            logger.info(f'Stream {stream.name}: {e}')
+        finally:
+            try:
+                # no waiting here, a consumer gone would hold the socket forever
+                self._endStream(stream)
+            finally:
+                writer.close()
+
+
+async def replay(url, host='127.0.0.1', port=15100, udp=False, chunk_size=64*1024, rate=None):
+    '''
+    Send a rtmv file to an ingest server as it is, in chunk_size pieces
+    (datagrams with udp), at most rate bytes per second if rate is set.
+    return the bytes sent.
+    '''
+    if udp:
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=(host, port))
+        send = transport.sendto
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+        send = writer.write
+    sent = 0
+    time_start = time.time()
+    with open(url, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data: break
+            send(data)
+            sent += len(data)
+            if not udp:
+                await writer.drain()
+            if rate is not None:
+                delay = time_start + sent / rate - time.time()
+                if delay > 0: await asyncio.sleep(delay)
+            elif udp:
+                await asyncio.sleep(0)  # let the receiver keep up
+    if udp:
+        transport.close()
+    else:
+        writer.close()
+        await writer.wait_closed()
+    return sent
+
+
+async def _serve(args):
+    async def report(stream):
+        pkg_cnt = 0
+        while await stream.queue.get() is not None:
+            pkg_cnt += 1
+            if pkg_cnt % 1000 == 0:
+                logger.info(f'Stream {stream.name}: {stream.stats}')
+
+    tasks = set()
+    def on_stream(stream):
+        task = asyncio.ensure_future(report(stream))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    server = RtmvIngestServer(args.host, args.port, args.udp_port, record_dir=args.record,
+                              udp_timeout=args.udp_timeout,
+                              on_stream=on_stream)
+    await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Ingest live rtmv streams')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_serve = sub.add_parser('serve', help='run the ingest server')
+    p_serve.add_argument('--host', default='127.0.0.1')
+    p_serve.add_argument('--port', type=int, default=15100)
+    p_serve.add_argument('--udp-port', type=int, default=None)
+    p_serve.add_argument('--udp-timeout', type=float, default=30.0,
+                         help='seconds without a datagram that end a UDP stream')
+    p_serve.add_argument('--record', default=None, help='folder to record the streams to')
+    p_replay = sub.add_parser('replay', help='send a rtmv file to a server')
+    p_replay.add_argument('url')
+    p_replay.add_argument('--host', default='127.0.0.1')
+    p_replay.add_argument('--port', type=int, default=15100)
+    p_replay.add_argument('--udp', action='store_true')
+    p_replay.add_argument('--rate', type=float, default=None, help='bytes per second')
+    args = parser.parse_args()
+
+    if args.cmd == 'serve':
+        asyncio.run(_serve(args))
+    else:
+        sent = asyncio.run(replay(args.url, args.host, args.port, args.udp, rate=args.rate))
+        print(f'{sent} bytes sent')
@@ -10,6 +10,7 @@
 
 
 import sys, os, time, threading, io
+import tempfile
 from typing import Union
 import subprocess as sp
 from enum import Enum
@@ -22,13 +23,23 @@ from PySide6.QtGui import QImage, QPixmap
 from PySide6.QtCore import Qt, Signal
 import av
 
-from rtmvfile import RtmvParser, RtmvVidPayloadFeeder, RtmvPayloadSection
+from rtmvfile import RtmvParser, RtmvVidPayloadFeeder, RtmvPayloadReader, RtmvPayloadSection
+from rtmv_metrics import metrics
 
 import logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(message)s')
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+_decode_seconds  = metrics.histogram('rtmv_decode_seconds', 'time to decode one packet')
+_render_seconds  = metrics.histogram('rtmv_render_seconds', 'time to convert, scale and show a frame')
+_queue_depth     = metrics.gauge('rtmv_frame_queue_depth', 'frames waiting to be rendered')
+_queue_empty     = metrics.counter('rtmv_frame_queue_empty_total', 'renderer polls finding no frame')
+_frames_decoded  = metrics.counter('rtmv_frames_decoded_total', 'frames decoded by the players')
+_frames_rendered = metrics.counter('rtmv_frames_rendered_total', 'frames shown by the players')
+_frames_skipped  = metrics.counter('rtmv_frames_skipped_total', 'frames dropped to catch up')
+_playback_fps    = metrics.gauge('rtmv_playback_fps', 'average frame rate of the last playback')
+
 
 class RtmvVideoPlayer(QLabel):
     '''
@@ -51,13 +62,21 @@ class RtmvVideoPlayer(QLabel):
     playingProgressChanged = Signal(float)
     _playingDecodingStopped = Signal(int)
 
-    def __init__(self, parent, payload_sec: RtmvPayloadSection=None):
+    # How payloads get to pyav: 'inproc' reads them from the parser in this
+    # process, 'tcp' and 'unix' go through a RtmvVidPayloadFeeder listening
+    # on localhost or on a unix domain socket.
+    TRANSPORTS = ('inproc', 'tcp', 'unix')
+
+    def __init__(self, parent, payload_sec: RtmvPayloadSection=None, transport='inproc'):
         super(RtmvVideoPlayer, self).__init__(parent)
 
         self._stat = RtmvVideoPlayer.State.STOPPED
         self._speed = Fraction(0, 4)  # 0.5, 1, x2, x4
 
-        self._feeder = None  # the feeder instance
+        if transport not in RtmvVideoPlayer.TRANSPORTS:
+            raise ValueError(f'unknown transport "{transport}", one of {RtmvVideoPlayer.TRANSPORTS}')
+        self._transport = transport
+        self._feeder = None  # the feeder instance, or the reader in process
         self._frame_queue = None
 
         self._decode_thread = None
@@ -181,8 +200,10 @@ class RtmvVideoPlayer(QLabel):
                     if fake_pts:
                         pkt.dts =  int(total_duration / pkt.time_base)
                         pkt.pts = pkt.dts
-                    frames = pkt.decode()
+                    with _decode_seconds.time():
+                        frames = pkt.decode()
                     if len(frames) > 0:
+                        _frames_decoded.inc()
                         fr_cnt += 1
                         fr = frames[0]
                         fr_time_abs = start_time + (fr.time - first_fr_time)
@@ -194,6 +215,7 @@ class RtmvVideoPlayer(QLabel):
             # End of decoding, wait for refresh thread to quit
             self._decoding = False
             refresh_thread.join()
+            _playback_fps.set(fr_cnt/(time.time()-start_time))
             logger.info(f'Done with decoding, {fr_cnt} frames presented @ average '
                         f'frame rate {(fr_cnt)/(time.time()-start_time):.2f}fps')
             # TODO: safe stop here?
@@ -265,9 +287,11 @@ class RtmvVideoPlayer(QLabel):
         while self._decoding:
             try:
                 fr, present_time, duration = frame_queue.get_nowait()
+                _queue_depth.set(frame_queue.qsize())
                 if skip > 0 and not lastframe_skipped:
                     skip -= 1
                     lastframe_skipped = True
+                    _frames_skipped.inc()
                     continue
                 delay = present_time - time.time()
                 if int(self._speed) != 0:
@@ -279,9 +303,11 @@ class RtmvVideoPlayer(QLabel):
                         # skip n packets to catch up
                         skip = int(abs(delay//duration)) - 1
                         lastframe_skipped = True
+                        _frames_skipped.inc()
                         logger.debug(f'skip {skip} packets to catch up')
                         continue
                 # Render the frame
+                render_start = time.perf_counter()
                 if fr.format.name != 'rgb24':
                     fr = fr.to_rgb()
                 # TODO: no handling for interlaced video, progressive only
@@ -314,7 +340,10 @@ class RtmvVideoPlayer(QLabel):
                 self.setPixmap(pix_swap[pix_index])
                 # self.setText(f'frame index:{fr.index}\nframe size:{fr.width}x{fr.height}\nframe type:{fr.pict_type}')
                 pix_index = 0 if pix_index == 1 else 1
+                _render_seconds.observe(time.perf_counter() - render_start)
+                _frames_rendered.inc()
             except queue.Empty:
+                _queue_empty.inc()
                 logger.debug('Empty frame queue, wait 0.01s and try again')
                 time.sleep(0.01)
                 continue
@@ -334,15 +363,24 @@ class RtmvVideoPlayer(QLabel):
             self.resume()
             return
 
-        # start the feeder thread with socket model
-        self._feeder = RtmvVidPayloadFeeder(
-            self._payload_sec.rt, self._payload_sec.start, self._payload_sec.end,
-            tuple((None, None)), None, # callback = self._feederCallback,
-            autostart = True
-            )
+        sec = self._payload_sec
+        if self._transport == 'inproc':
+            self._feeder = RtmvPayloadReader(sec.rt, sec.start, sec.end)
+            addr = self._feeder
+        else:
+            # start the feeder thread with socket model
+            if self._transport == 'unix':
+                address = os.path.join(tempfile.gettempdir(), f'rtmv-{os.getpid()}-{id(self)}.sock')
+            else:
+                address = ('127.0.0.1', 0)
+            self._feeder = RtmvVidPayloadFeeder(
+                sec.rt, sec.start, sec.end,
+                tuple((None, None)), None, # callback = self._feederCallback,
+                autostart = True, address = address
+                )
+            addr = self._feeder.url
 
         # set up the av
-        addr = f'tcp://{self._feeder.hostaddr[0]}:{self._feeder.hostaddr[1]}'
         try:
             self._ct = av.open(addr, mode='r')
             self._stat = RtmvVideoPlayer.State.PLAYING
@@ -391,9 +429,9 @@ class RtmvVideoPlayer(QLabel):
             self._info_thread = None
             self._ct.close()
 
-            # Stop the feeder
-            if self._feeder.status != RtmvVidPayloadFeeder.State.IDLE:
-                self._feeder.stop()
+            # Stop the feeder, also when it is idle at the end of the stream:
+            # its wake up socket and the reader are released by stop() only
+            self._feeder.stop()
             # FIXME: No need to release feeder, can simply leave it there
             # self._feeder = None
 
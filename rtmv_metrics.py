@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   rtmv_metrics.py
+@Time    :   2026/10/18 12:10:00
+@Desc    :   Counters, gauges and latency histograms of the rtmv hot paths
+'''
+
+import os, sys, time
+import json
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import logging
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(funcName)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Counter(object):
+    '''
+    a value only going up, e.g. bytes sent
+    '''
+    kind = 'counter'
+
+    def __init__(self, name, doc=''):
+        self.name = name
+        self.doc = doc
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self._value += n
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+    def _exposition(self):
+        return [f'{self.name} {self._value}']
+
+
+class Gauge(Counter):
+    '''
+    a value going up and down, e.g. a queue depth
+    '''
+    kind = 'gauge'
+
+    def set(self, v):
+        self._value = v
+
+    def dec(self, n=1):
+        self.inc(-n)
+
+
+class Histogram(object):
+    '''
+    Observations counted into buckets by upper bound, plus their count and
+    sum. Buckets default to latencies from 0.1ms to 10s in seconds.
+    '''
+    kind = 'histogram'
+    LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                       0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, doc='', buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self._bounds = tuple(sorted(buckets))
+        self._counts = [0]*(len(self._bounds) + 1)   # the last one is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, v):
+        i = bisect.bisect_left(self._bounds, v)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += v
+            self._count += 1
+
+    def time(self):
+        '''
+        context manager observing the seconds spent in its block
+        '''
+        return _HistogramTimer(self)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def quantile(self, q):
+        '''
+        upper bound of the bucket holding the q quantile, inf if it is above
+        all bounds, None without observations.
+        '''
+        with self._lock:
+            counts, total = list(self._counts), self._count
+        if total == 0: return None
+        rank, acc = q*total, 0
+        for bound, n in zip(self._bounds + (float('inf'),), counts):
+            acc += n
+            if acc >= rank: return bound
+        return float('inf')
+
+    def snapshot(self):
+        with self._lock:
+            count, total = self._count, self._sum
+        return {'count': count, 'sum': total,
+                'mean': total/count if count else None,
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}
+
+    def _exposition(self):
+        with self._lock:
+            counts, count, total = list(self._counts), self._count, self._sum
+        lines, acc = [], 0
+        for bound, n in zip(self._bounds + (float('inf'),), counts):
+            acc += n
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{self.name}_bucket{{le="{le}"}} {acc}')
+        lines.append(f'{self.name}_sum {total}')
+        lines.append(f'{self.name}_count {count}')
+        return lines
+
+
+class _HistogramTimer(object):
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._t0
+        self._histogram.observe(self.elapsed)
+        return False
+
+
+class RtmvMetrics(object):
+    '''
+    Registry of metrics by name. counter(), gauge() and histogram() return
+    the metric of that name, made on the first call, so instrumented code
+    takes them at import time and pays a lock per update only.
+    snapshot() gives all values as a dict, startLogExporter() logs it as
+    json periodically and startHttpServer() serves the Prometheus text
+    format on localhost.
+    '''
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+        self._exporter_stop = None
+        self._httpd = None
+
+    def _get(self, cls, name, doc, **kw):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, doc, **kw)
+            elif type(m) is not cls:
+                raise ValueError(f'metric {name} is a {m.kind} already')
+            return m
+
+    def counter(self, name, doc='') -> Counter:
+        return self._get(Counter, name, doc)
+
+    def gauge(self, name, doc='') -> Gauge:
+        return self._get(Gauge, name, doc)
+
+    def histogram(self, name, doc='', buckets=Histogram.LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, doc, buckets=buckets)
+
+    def __getitem__(self, name):
+        return self._metrics[name]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: m.snapshot() for m in metrics}
+
+    def prometheus(self) -> str:
+        '''
+        all metrics in the Prometheus text exposition format
+        '''
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for m in metrics:
+            if m.doc: lines.append(f'# HELP {m.name} {m.doc}')
+            lines.append(f'# TYPE {m.name} {m.kind}')
+            lines.extend(m._exposition())
+        return '\n'.join(lines) + '\n'
+
+    def startLogExporter(self, interval=10.0, log=None):
+        '''
+        log the snapshot as one json line every interval seconds
+        '''
+        if self._exporter is not None: return
+        log = log or logger
+        self._exporter_stop = threading.Event()
+
+        def export():
+            while not self._exporter_stop.wait(interval):
+                log.info(json.dumps(self.snapshot(), default=str))
+        self._exporter = threading.Thread(target=export, name='Metrics Exporter', daemon=True)
+        self._exporter.start()
+
+    def stopLogExporter(self):
+        if self._exporter is None: return
+        self._exporter_stop.set()
+        self._exporter.join()
+        self._exporter = None
+
+    def startHttpServer(self, port=9108, host='127.0.0.1'):
+        '''
+        serve GET /metrics in the Prometheus text format from a daemon
+        thread, return the address bound (port 0 picks a free one).
+        '''
+        if self._httpd is not None: return self._httpd.server_address
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name='Metrics Server', daemon=True).start()
+        logger.info(f'Metrics served at http://{host}:{self._httpd.server_address[1]}/metrics')
+        return self._httpd.server_address
+
+    def stopHttpServer(self):
+        if self._httpd is None: return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._httpd = None
+
+
+# the registry the rtmv modules report to
+metrics = RtmvMetrics()
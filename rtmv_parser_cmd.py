@@ -36,17 +36,19 @@ class RtmvParserCmd(object):
         print('Total RTMV packages: ',len(rt.rtmvpackages))
         print('Video RTMV packages: ', rt.vpkg_cnt)
         print('Image RTMV packages: ', rt.ppkg_cnt)
-        print('The dataset was acquisited at: {}'.format(time.asctime( time.localtime(rt.starttime))))
+        print('The dataset was acquisited at: {}'.format(time.asctime( time.localtime(rt.start_time))))
         print('The duration of the dataset is {}s'.format(rt.duration))
-        print('The rtmv was acquisited around: ({0}, {1}, {2})'.format(rt.centerpos[0], rt.centerpos[1], rt.centerpos[2]))
+        print('The rtmv was acquisited around: ({0}, {1}, {2})'.format(rt.cetner_pos[0], rt.cetner_pos[1], rt.cetner_pos[2]))
 
     def load(self, arg: str):
         '''
         Brief: Load a rtmv file
-        Usage: load file_url 
-        Option: None
+        Usage: load file_url [--robust]
+        Option:
+            --robust   check the headers found too, for damaged recordings
         Example:
             load testdata.rtmv
+            load damaged.rtmv --robust
         '''
         rt = self.rt
         if arg == '':
@@ -55,14 +57,38 @@ class RtmvParserCmd(object):
 
         if rt.srcurl != '': rt.free()
 
+        robust = False
+        if arg.endswith(' --robust'):
+            arg, robust = arg[:-len(' --robust')].strip(), True
         url = arg
         if url != '':
-            if rt.load(url) is None:
+            # load() returns nothing, a file without packages is a failure too
+            if os.path.isfile(url): rt.load(url, robust=robust)
+            if len(rt.rtmvpackages) == 0:
                 print('Fail to load file: ', url)
             else:
                 print('Successfully loaded file ', url)
                 self.brief('')
 
+    def damage(self, arg: str):
+        '''
+        Brief: Report the damaged byte ranges of the current rtmv file.
+        Usage: damage
+        Option: None
+        '''
+        rt = self.rt
+        if (rt is None) | (rt.srcurl == ''):
+            print('Please load a rtmv file first.')
+            return
+        report = rt.damageReport()
+        print('Damage report of {0} (robust scan: {1}):'.format(report['file'], report['robust']))
+        print('Recovered packages: ', report['packages'], ' in ', len(report['segments']), ' segment(s)')
+        for r in report['damaged_ranges']:
+            print('bytes {0}-{1} ({2} bytes) after package {3}, lost {4:.3f}s'.format(
+                    r['start'], r['end'], r['bytes'], r['after'], r['lost_duration']))
+        print('Damaged bytes in total: ', report['damaged_bytes'])
+        print('Lost duration in total: {0:.3f}s'.format(report['lost_duration']))
+
     def free(self, arg:str):
         '''
         Breif:  Release a rtmv file
@@ -76,7 +102,7 @@ class RtmvParserCmd(object):
     def dump(self, arg: str):
         '''
         Brief: Dump data from the current rtmv file.
-        Usage: dump -o url [--option=OPTION] [-p pkg_scope]
+        Usage: dump -o url [--option=OPTION] [-p pkg_scope] [--exif]
         Options:
             -o url     specify the output file or folder (while the option is set as images)
             --option=OPTION
@@ -87,9 +113,11 @@ class RtmvParserCmd(object):
                 pkg_pic: dump image pakcage(s) only
                 payload_vid: dump video payload only
                 payload_pic: dump image payload oonly
-                route: dump flight route to a geojson file  
+                route: dump flight route to a geojson file, or kml/gpx/html map by the file extension
             -p 0-100
                 the index of start & end pakcages you want to dump. all packages count if it is not set.
+            --exif
+                add GPS EXIF tags to the jpeg images dumped by payload_pic
         Examples:
             dump -o testfile.rtmv --option=pkg_vid # dump all video package to the file testfile.rtmv
             dump -o test.h264 --option=payload_vid # dump all video payload to the fine test.h264
@@ -103,7 +131,8 @@ class RtmvParserCmd(object):
         url = ''
         pkgs = ()
         option = ''
-        args = getopt.getopt(arg.split(' '), '-o:-p:', ['option='])[0]
+        exif = False
+        args = getopt.getopt(arg.split(' '), '-o:-p:', ['option=', 'exif'])[0]
         for opt, val in args:
             if opt == '-o':
                 url = val
@@ -114,13 +143,150 @@ class RtmvParserCmd(object):
             if opt == '--option':
                 option = val
                 continue
+            if opt == '--exif':
+                exif = True
+                continue
 
         if url == '':
             print('please input the url for the command dump')
         elif option == '':
             print('please select an option for the command dump')
+        elif option not in rt.DUMP_OPTIONS:
+            print('unknown option {0}, please select one of {1}'.format(option, ', '.join(rt.DUMP_OPTIONS)))
+        else:
+            if option == 'payload_pic':
+                size = rt.extractImages(url, pkgs, exif=exif)
+            else:
+                size = rt.dump(url, option, pkgs)
+            if size is None:
+                print('Fail to dump to', url)
+            else:
+                print('Successfully dumped {0} bytes to {1}'.format(size, url))
+
+    def trim(self, arg: str):
+        '''
+        Brief: Cut a period out of the current rtmv file to a new rtmv file.
+        Usage: trim -o url [-t start-end] [-p pkg_scope] [--nosnap]
+        Options:
+            -o url     the output rtmv file
+            -t 60-180
+                the start & end in seconds from the beginning of the file, either may be left out
+            -p 0-100
+                the index of start & end packages instead of times
+            --nosnap
+                do not move the start back to a keyframe or section start
+        Examples:
+            trim -o cut.rtmv -t 60-180 # keep the packages from the 1st to the 3rd minute
+        '''
+        rt = self.rt
+        if (rt is None) | (rt.srcurl == ''):
+            print('Please load a rtmv file first.')
+            return
+        url = ''
+        times = (None, None)
+        pkgs = None
+        snap = True
+        args = getopt.getopt(arg.split(' '), '-o:-t:-p:', ['nosnap'])[0]
+        for opt, val in args:
+            if opt == '-o':
+                url = val
+            elif opt == '-t':
+                try:
+                    times = tuple(float(v) if v != '' else None for v in val.split('-'))
+                except ValueError:
+                    times = ()
+                if len(times) != 2:
+                    print('please input the times as start-end, e.g. -t 60-180 or -t 60-')
+                    return
+            elif opt == '-p':
+                try:
+                    pkgs = tuple(int(v) for v in val.split('-'))
+                except ValueError:
+                    pkgs = ()
+                if len(pkgs) != 2:
+                    print('please input the packages as start-end, e.g. -p 0-100')
+                    return
+            elif opt == '--nosnap':
+                snap = False
+
+        if url == '':
+            print('please input the url for the command trim')
+            return
+        size = rt.trim(url, times[0], times[1], pkgs, snap)
+        if size is None:
+            print('Fail to trim to', url)
+        else:
+            print('Successfully trimmed {0} bytes to {1}'.format(size, url))
+
+    def split(self, arg: str):
+        '''
+        Brief: Split the current rtmv file into parts by size or duration.
+        Usage: split -o prefix (-s size | -d seconds) [--nosnap]
+        Options:
+            -o prefix  the parts are written to prefix_000.rtmv, prefix_001.rtmv ...
+            -s 2G      the max size of a part, with an optional K/M/G suffix
+            -d 600     the max duration of a part in seconds
+            --nosnap
+                do not start the parts at keyframes or section starts
+        Examples:
+            split -o flight -s 4G # split into parts of 4GB at most
+        '''
+        rt = self.rt
+        if (rt is None) | (rt.srcurl == ''):
+            print('Please load a rtmv file first.')
+            return
+        prefix = ''
+        size = None
+        duration = None
+        snap = True
+        args = getopt.getopt(arg.split(' '), '-o:-s:-d:', ['nosnap'])[0]
+        for opt, val in args:
+            if opt == '-o':
+                prefix = val
+            elif opt == '-s':
+                unit = {'K': 1024, 'M': 1024**2, 'G': 1024**3}.get(val[-1:].upper(), 1)
+                size = int(float(val[:-1] if unit > 1 else val) * unit)
+            elif opt == '-d':
+                duration = float(val)
+            elif opt == '--nosnap':
+                snap = False
+
+        if prefix == '':
+            print('please input the prefix for the command split')
+            return
+        parts = rt.split(prefix, size, duration, snap)
+        if parts is None:
+            print('Fail to split the file')
+        else:
+            for url, n in parts:
+                print('{0:<32}{1} bytes'.format(url, n))
+
+    def concat(self, arg: str):
+        '''
+        Brief: Concatenate rtmv files into one.
+        Usage: concat -o url file1 file2 ...
+        Option: None
+        Examples:
+            concat -o whole.rtmv flight_000.rtmv flight_001.rtmv
+        '''
+        opts, sources = getopt.getopt(arg.split(' '), '-o:')
+        url = ''
+        for opt, val in opts:
+            if opt == '-o':
+                url = val
+        sources = [s for s in sources if s != '']
+        if url == '' or len(sources) == 0:
+            print('please input the url and the source files for the command concat')
+            return
+        for src in sources:
+            if not os.path.isfile(src):
+                print('Fail to load file: ', src)
+                return
+        size = RtmvParser.concat(url, sources)
+        if size is None:
+            print('Fail to concatenate to', url)
         else:
-            rt.dump(url, option, pkgs)
+            print('Successfully concatenated {0} bytes to {1}'.format(size, url))
 
     def header(self, arg: str):
         '''
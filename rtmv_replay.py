@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   rtmv_replay.py
+@Time    :   2026/10/18 13:30:00
+@Desc    :   Replay rtmv files as live UAV streams, paced by their timestamps
+'''
+
+import os, sys, time
+import json
+import heapq
+import random
+import socket
+import selectors
+import argparse
+import threading
+
+import numpy as np
+
+from rtmvfile import RtmvParser, _skipWritten, _IOV_MAX
+from rtmv_metrics import metrics
+
+import logging
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(funcName)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_lateness    = metrics.histogram('rtmv_replay_lateness_seconds', 'how late packages were sent against their schedule',
+                                 buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                                          0.01, 0.025, 0.05, 0.1, 1.0))
+_replay_bytes = metrics.counter('rtmv_replay_bytes_total', 'package bytes sent by the replay servers')
+_subscribers  = metrics.gauge('rtmv_replay_subscribers', 'receivers of the replayed streams')
+
+
+class _Sink(object):
+    '''
+    One receiver of the packages of a drone. A TCP socket is non-blocking,
+    what does not fit goes to a backlog sent ahead of the next package, and
+    the sink is closed when the backlog grows over max_backlog: a slow
+    subscriber must not hold up the pacing of the others. A UDP sink sends
+    a package as datagrams of MAX_DATAGRAM bytes at most, a full socket
+    buffer drops them.
+    '''
+    MAX_DATAGRAM = 65000
+
+    def __init__(self, name, sock, addr=None, max_backlog=8*1024*1024):
+        self.name = name
+        self._sock = sock
+        self._addr = addr   # the destination of a UDP sink
+        self._backlog = []
+        self._backlog_len = 0
+        self._max_backlog = max_backlog
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        _subscribers.inc()
+
+    def send(self, pkg) -> bool:
+        '''
+        send one package, False once the sink is closed
+        '''
+        try:
+            if self._addr is not None:
+                for i in range(0, len(pkg), _Sink.MAX_DATAGRAM):
+                    try:
+                        self.sent += self._sock.sendto(pkg[i:i + _Sink.MAX_DATAGRAM], self._addr)
+                    except BlockingIOError:
+                        self.dropped += 1
+                return True
+            self._backlog.append(pkg)
+            self._backlog_len += len(pkg)
+            self._flush()
+            if self._backlog_len > self._max_backlog:
+                logger.info(f'subscriber {self.name} is too slow, disconnect it.')
+                self.close()
+        except OSError as e:
+            logger.info(f'subscriber {self.name}: {e}')
+            self.close()
+        return not self.closed
+
+    def _flush(self):
+        i = 0
+        try:
+            while i < len(self._backlog):
+                n = self._sock.sendmsg(self._backlog[i:i + _IOV_MAX])
+                self.sent += n
+                self._backlog_len -= n
+                i = _skipWritten(self._backlog, i, n)
+        except BlockingIOError:
+            pass
+        del self._backlog[:i]
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        self._backlog = []
+        _subscribers.dec()
+        if self._addr is not None: return  # the UDP socket is the drone's
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+class _Lateness(object):
+    '''
+    Lateness of the packages sent in seconds, in bounded memory however long
+    the replay runs: count, mean, max and the count over 1ms are exact, the
+    percentiles come from a uniform reservoir sample of RESERVOIR values.
+    '''
+    RESERVOIR = 8192
+
+    def __init__(self, seed=0):
+        self._sample = np.empty(_Lateness.RESERVOIR, dtype=np.float64)
+        self._rng = random.Random(seed)
+        self.count = 0
+        self._sum = 0.0
+        self._max = None
+        self._over = 0
+
+    def add(self, late):
+        if self.count < _Lateness.RESERVOIR:
+            self._sample[self.count] = late
+        else:
+            j = self._rng.randrange(self.count + 1)
+            if j < _Lateness.RESERVOIR: self._sample[j] = late
+        self.count += 1
+        self._sum += late
+        self._max = late if self._max is None else max(self._max, late)
+        if late > 0.001: self._over += 1
+
+    def stats(self) -> dict:
+        '''
+        mean, median, p99 and max in seconds, and how many were over 1ms
+        '''
+        count = self.count
+        if count == 0:
+            return {'count': 0, 'mean': None, 'p50': None, 'p99': None, 'max': None, 'over_1ms': 0}
+        sample = self._sample[:min(count, _Lateness.RESERVOIR)]
+        return {'count': count, 'mean': self._sum / count, 'p50': float(np.percentile(sample, 50)),
+                'p99': float(np.percentile(sample, 99)), 'max': self._max, 'over_1ms': self._over}
+
+
+class RtmvReplayDrone(object):
+    '''
+    One recorded flight replayed as a live UAV. Package i is due at its
+    header timestamp from the first one, divided by speed, after the start.
+    Timestamps going backwards take no time and gaps are cut to max_gap
+    seconds. With loop the flight starts over after its end. offset delays
+    the start, to spread many drones replaying the same file.
+    '''
+    def __init__(self, url, name=None, speed=1.0, loop=False, max_gap=5.0, offset=0.0):
+        if speed <= 0: raise ValueError(f'speed must be positive: {speed}')
+        self.name = name or os.path.splitext(os.path.basename(url))[0]
+        self.loop = loop
+        self.offset = offset
+        self._rt = RtmvParser()
+        self._rt.load(url, use_mmap=True, use_index=False)  # no sidecar next to the recording
+        if len(self._rt.rtmvpackages) == 0:
+            self._rt.free()
+            raise ValueError(f'no packages found in {url}')
+        dt = np.diff(self._rt.headers['timestamp'].astype(np.float64))
+        dt = np.clip(np.where(np.isfinite(dt), dt, 0.0), 0.0, max_gap)
+        self._schedule = np.concatenate(([0.0], np.cumsum(dt))) / speed
+        # a loop starts over one usual interval after the last package
+        self._period = float(self._schedule[-1]) + (float(np.median(dt)) / speed if len(dt) > 0 else 0.0)
+        self._sinks = []
+        self._lock = threading.Lock()
+        self._udp = None
+        self._lateness = _Lateness()
+        self.packages = 0
+        self.bytes = 0
+        self.lost_sinks = 0
+
+    def __len__(self):
+        return len(self._schedule)
+
+    @property
+    def duration(self):
+        return float(self._schedule[-1])
+
+    @property
+    def sinks(self) -> list:
+        with self._lock:
+            return list(self._sinks)
+
+    def addSink(self, sink: _Sink):
+        with self._lock:
+            self._sinks.append(sink)
+
+    def _udpSocket(self) -> socket.socket:
+        # one source port per drone, so a receiver can tell the drones apart
+        if self._udp is None:
+            self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._udp.setblocking(False)
+        return self._udp
+
+    def _send(self, k, late):
+        pkg = self._rt.getPackage(k)
+        with self._lock:
+            sinks = list(self._sinks)
+        lost = [sink for sink in sinks if not sink.send(pkg)]
+        if lost:
+            with self._lock:
+                self._sinks = [sink for sink in self._sinks if sink not in lost]
+            self.lost_sinks += len(lost)
+        self.packages += 1
+        self.bytes += len(pkg)
+        _replay_bytes.inc(len(pkg) * (len(sinks) - len(lost)))
+        self._lateness.add(late)
+        _lateness.observe(late)
+
+    def close(self):
+        with self._lock:
+            sinks, self._sinks = self._sinks, []
+        for sink in sinks: sink.close()
+        if self._udp is not None: self._udp.close()
+        self._rt.free()
+
+    def stats(self) -> dict:
+        return dict(packages=self.packages, bytes=self.bytes, subscribers=len(self._sinks),
+                    lost_subscribers=self.lost_sinks, **self._lateness.stats())
+
+
+class RtmvReplayServer(object):
+    '''
+    Sends the whole packages of any number of drones, each on its own
+    schedule, from one scheduler thread. Package times are absolute from the
+    start, so the error of a wait never adds up. A wait sleeps until spin
+    seconds before the time and spins from there, for a low jitter at the
+    cost of some CPU. Drones are served to TCP subscribers connecting to
+    their own port, pushed to TCP servers (e.g. rtmv_ingest) and sent to
+    UDP addresses. Subscribers joining late get the next package on, as
+    they would from a live UAV.
+    '''
+    def __init__(self, host='127.0.0.1', spin=0.0005, max_backlog=8*1024*1024):
+        self._host = host
+        self._spin = spin
+        self._max_backlog = max_backlog
+        self._drones = []
+        self._listeners = {}   # listening socket: drone
+        self._stop = threading.Event()
+        self._threads = []
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._time_start = None
+        self._lateness = _Lateness()   # of all drones
+
+    @property
+    def drones(self) -> list:
+        return self._drones
+
+    def addDrone(self, drone: RtmvReplayDrone, port=None, push=(), udp=()):
+        '''
+        add a drone before start(). With port (0 for any) it listens for
+        subscribers, push is a list of (host, port) to connect to and udp
+        one of (host, port) to send to. return the address listened on.
+        '''
+        self._drones.append(drone)
+        for addr in push:
+            try:
+                sock = socket.create_connection(addr)
+            except OSError as e:
+                logger.warning(f'{drone.name}: fail to connect to {addr[0]}:{addr[1]}: {e}')
+                continue
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setblocking(False)
+            drone.addSink(_Sink(f'{drone.name}>{addr[0]}:{addr[1]}', sock, max_backlog=self._max_backlog))
+        for addr in udp:
+            drone.addSink(_Sink(f'{drone.name}>udp:{addr[0]}:{addr[1]}', drone._udpSocket(), addr))
+        if port is None: return None
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self._host, port))
+        sock.listen(16)
+        sock.setblocking(False)
+        self._listeners[sock] = drone
+        return sock.getsockname()
+
+    def start(self, delay=0.1):
+        '''
+        start replaying delay seconds from now
+        '''
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._run, args=(delay,), name='Replay Scheduler'),
+                         threading.Thread(target=self._accept, name='Replay Acceptor')]
+        for t in self._threads: t.start()
+
+    def join(self, timeout=None) -> bool:
+        '''
+        wait for the drones to finish, False on timeout
+        '''
+        self._threads[0].join(timeout)
+        return not self._threads[0].is_alive()
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads: t.join()
+
+    def close(self):
+        self.stop()
+        for drone in self._drones: drone.close()
+        self._wake_w.close()
+
+    def _waitUntil(self, due) -> bool:
+        # sleep until spin before due, then spin. False when stopped.
+        remaining = due - time.perf_counter()
+        if remaining > self._spin and self._stop.wait(remaining - self._spin):
+            return False
+        while time.perf_counter() < due:
+            pass
+        return not self._stop.is_set()
+
+    def _run(self, delay):
+        self._time_start = time.perf_counter() + delay
+        # (due, drone, package, the time the current round started at)
+        heap = [(self._time_start + d.offset, i, 0, self._time_start + d.offset)
+                for i, d in enumerate(self._drones)]
+        heapq.heapify(heap)
+        try:
+            while heap:
+                due, i, k, base = heap[0]
+                if not self._waitUntil(due): break
+                drone = self._drones[i]
+                late = time.perf_counter() - due
+                drone._send(k, late)
+                self._lateness.add(late)
+                k += 1
+                if k == len(drone):
+                    if not drone.loop:
+                        heapq.heappop(heap)
+                        logger.info(f'{drone.name} done: {drone.packages} packages')
+                        continue
+                    k, base = 0, base + drone._period
+                heapq.heapreplace(heap, (base + drone._schedule[k], i, k, base))
+        finally:
+            # the end of the streams for the subscribers
+            for drone in self._drones:
+                for sink in drone.sinks: sink.close()
+            try:
+                self._wake_w.send(b'\0')
+            except OSError:
+                pass
+
+    def _accept(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        for sock in self._listeners: selector.register(sock, selectors.EVENT_READ)
+        try:
+            while self._threads[0].is_alive():
+                for key, _ in selector.select():
+                    sock = key.fileobj
+                    if sock is self._wake_r: continue
+                    try:
+                        con, addr = sock.accept()
+                    except BlockingIOError:
+                        continue
+                    drone = self._listeners[sock]
+                    con.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    con.setblocking(False)
+                    drone.addSink(_Sink(f'{drone.name}<{addr[0]}:{addr[1]}', con, max_backlog=self._max_backlog))
+                    logger.info(f'{drone.name}: new subscriber {addr[0]}:{addr[1]}')
+        finally:
+            selector.close()
+            for sock in self._listeners: sock.close()
+            self._wake_r.close()
+
+    def stats(self) -> dict:
+        '''
+        what each drone sent and its lateness against the schedule, and the
+        lateness over all drones
+        '''
+        drones = {d.name: d.stats() for d in self._drones}
+        elapsed = time.perf_counter() - self._time_start if self._time_start is not None else 0.0
+        return {'drones': drones, 'seconds': max(elapsed, 0.0),
+                'all': dict(packages=sum(d.packages for d in self._drones),
+                            bytes=sum(d.bytes for d in self._drones), **self._lateness.stats())}
+
+
+def _addr(text):
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay rtmv files as live UAV streams.')
+    parser.add_argument('urls', nargs='+', help='rtmv files, each replayed as a drone')
+    parser.add_argument('-s', '--speed', type=float, default=1.0, help='replay speed factor')
+    parser.add_argument('-n', '--copies', type=int, default=1, help='drones replaying each file')
+    parser.add_argument('--stagger', type=float, default=0.0,
+                        help='start the copies of a file spread over these seconds')
+    parser.add_argument('--loop', action='store_true', help='start over at the end')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--listen', type=int, default=None,
+                        help='first port the drones listen on for subscribers, 0 for any')
+    parser.add_argument('--push', type=_addr, action='append', default=[],
+                        help='host:port of a TCP server every drone connects to, e.g. rtmv_ingest')
+    parser.add_argument('--udp', type=_addr, action='append', default=[],
+                        help='host:port every drone sends datagrams to')
+    parser.add_argument('--spin', type=float, default=0.0005, help='seconds spun before a package time')
+    parser.add_argument('--report', type=float, default=10.0, help='seconds between stats logs')
+    args = parser.parse_args()
+
+    listen = args.listen
+    if listen is None and not args.push and not args.udp:
+        listen = 0
+    server = RtmvReplayServer(args.host, args.spin)
+    for url in args.urls:
+        for c in range(args.copies):
+            name = os.path.splitext(os.path.basename(url))[0]
+            if args.copies > 1: name = f'{name}_{c:03d}'
+            drone = RtmvReplayDrone(url, name, args.speed, args.loop,
+                                    offset=args.stagger * c / args.copies)
+            port = None if listen is None else (listen and listen + len(server.drones))
+            addr = server.addDrone(drone, port, args.push, args.udp)
+            if addr is not None:
+                print(f'{drone.name:<24}tcp://{addr[0]}:{addr[1]}')
+
+    server.start()
+    try:
+        while not server.join(args.report):
+            logger.info(json.dumps(server.stats()['all']))
+    except KeyboardInterrupt:
+        pass
+    server.close()
+    print(json.dumps(server.stats(), indent=2))
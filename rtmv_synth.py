@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   rtmv_synth.py
+@Time    :   2026/10/18 11:40:00
+@Desc    :   Deterministic synthetic rtmv files for benchmarks and checks
+'''
+
+import os, sys
+import json
+import struct
+import argparse
+from fractions import Fraction
+
+import av
+import numpy as np
+
+from rtmvfile import RtmvParser
+
+import logging
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(funcName)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class RtmvSynth(object):
+    '''
+    Generator of rtmv files following RtmvParser.protocol. A file is a list of
+    sections, ('video', n) for n H.264 packages and ('image', n) for n jpeg
+    packages. Video payloads cycle through one GOP clip encoded by pyav, so
+    large files are cheap to make. The same seed and settings always give
+    the same bytes. The UAV flies a circle at a constant altitude.
+    '''
+    # the frame_type values of the Parrot PaVE header
+    FRAME_IDR = 1
+    FRAME_P = 3
+
+    def __init__(self, seed=0, width=320, height=240, fps=25, gop=25,
+                    image_width=640, image_height=480, image_interval=1.0,
+                    start_time=1600000000.0, uav_name='synth'):
+        self.seed = seed
+        self.width, self.height = width, height
+        self.fps = fps
+        self.gop = gop
+        self.image_width, self.image_height = image_width, image_height
+        self.image_interval = image_interval
+        self.start_time = start_time
+        self.uav_name = uav_name.encode('ascii')
+        self._clip = None
+        self._images = None
+
+    def _frames(self, n, w, h):
+        # moving gradient frames, something to code that is not flat
+        rng = np.random.default_rng(self.seed)
+        base = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        for i in range(n):
+            yield av.VideoFrame.from_ndarray(np.roll(base, i*4, axis=1), format='rgb24')
+
+    def _encoder(self, names, w, h, pix_fmt, **options):
+        for name in names:
+            try:
+                cc = av.CodecContext.create(name, 'w')
+                break
+            except (av.FFmpegError, ValueError):
+                continue
+        else:
+            raise RuntimeError(f'none of the encoders {names} is available')
+        cc.width, cc.height, cc.pix_fmt = w, h, pix_fmt
+        cc.time_base = Fraction(1, self.fps)
+        cc.framerate = Fraction(self.fps)
+        cc.options = dict(options, threads='1')  # threads make the output vary
+        return cc
+
+    def videoClip(self) -> list:
+        '''
+        one GOP of H.264 access units in Annex B, the first one IDR with
+        SPS/PPS, as (payload, frame_type) pairs
+        '''
+        if self._clip is None:
+            cc = self._encoder(('libx264', 'h264', 'libopenh264'), self.width, self.height, 'yuv420p',
+                               g=str(self.gop), bf='0', preset='veryfast', tune='zerolatency')
+            self._clip = []
+            for i, frame in enumerate(self._frames(self.gop, self.width, self.height)):
+                frame.pts = i
+                for p in cc.encode(frame):
+                    self._clip.append((bytes(p), self.FRAME_IDR if p.is_keyframe else self.FRAME_P))
+            for p in cc.encode():
+                self._clip.append((bytes(p), self.FRAME_IDR if p.is_keyframe else self.FRAME_P))
+        return self._clip
+
+    def images(self, n=8) -> list:
+        '''
+        n different jpeg images, cycled through by the image sections
+        '''
+        if self._images is None:
+            cc = self._encoder(('mjpeg',), self.image_width, self.image_height, 'yuvj420p')
+            self._images = []
+            for i, frame in enumerate(self._frames(n, self.image_width, self.image_height)):
+                frame = frame.reformat(format='yuvj420p')
+                frame.pts = i
+                self._images.append(b''.join(bytes(p) for p in cc.encode(frame)))
+        return self._images
+
+    def header(self, ts, payload_size, codec, frame_type, w, h) -> bytes:
+        t = (ts - self.start_time)/60.0   # a circle in a minute, 500m across
+        values = {'Signature': RtmvParser.protocol_sig.encode('ascii'),
+                  'Ver': 1, 'header_size': RtmvParser.header_len, 'timestamp': ts,
+                  'lat': 30.0 + 0.00225*np.sin(2*np.pi*t), 'long': 120.0 + 0.0026*np.cos(2*np.pi*t),
+                  'alt': 120.0, 'height': 100.0, 'satCount': 12, 'hdop_h': 0.8, 'hdop_v': 1.1,
+                  'uav_yaw': (360.0*t) % 360.0, 'cam_pitch': -90.0,
+                  'payload_size': payload_size, 'vid_codec': codec, 'frame_type': frame_type,
+                  'stream_w': w, 'stream_h': h, 'disp_w': w, 'disp_h': h,
+                  'uav_name': self.uav_name}
+        return struct.pack(RtmvParser._struct_fmt,
+                           *[values.get(fe.name, b'' if fe.type == 's' else 0) for fe in RtmvParser.protocol])
+
+    def packages(self, sections):
+        '''
+        yield (header, payload) of the sections
+        '''
+        clip, ts, k = None, self.start_time, 0
+        for kind, n in sections:
+            if kind == 'video':
+                clip = self.videoClip()
+                for i in range(n):
+                    payload, frame_type = clip[i % len(clip)]
+                    yield self.header(ts, len(payload), RtmvParser.PayloadType.VIDEO.value, frame_type,
+                                      self.width, self.height), payload
+                    ts += 1.0/self.fps
+            elif kind == 'image':
+                images = self.images()
+                for i in range(n):
+                    payload = images[k % len(images)]
+                    k += 1
+                    yield self.header(ts, len(payload), RtmvParser.PayloadType.IMAGE.value, 0,
+                                      self.image_width, self.image_height), payload
+                    ts += self.image_interval
+            else:
+                raise ValueError(f'unknown section kind "{kind}"')
+
+    def write(self, url, sections=(('video', 250), ('image', 10)), corrupt=0.0,
+                truncate=0) -> dict:
+        '''
+        Write the sections to url. A corrupt fraction of the packages is
+        damaged, by a broken signature, a bad payload size or garbage put in
+        front of them, the kind picked at random. truncate bytes are cut from
+        the end of the file. Return a manifest of what was written.
+        '''
+        rng = np.random.default_rng(self.seed + 1)
+        damaged = []
+        ends = []
+        with open(url, 'wb') as f:
+            for i, (header, payload) in enumerate(self.packages(sections)):
+                if corrupt > 0 and rng.random() < corrupt:
+                    kind = ('signature', 'size', 'garbage')[rng.integers(3)]
+                    damaged.append((i, kind))
+                    if kind == 'signature':
+                        header = b'\0\0' + header[2:]
+                    elif kind == 'size':
+                        off = RtmvParser._payload_offset
+                        header = header[:off] + struct.pack('!i', -1) + header[off+4:]
+                    else:
+                        f.write(rng.integers(0, 256, int(rng.integers(1, 512)), dtype=np.uint8).tobytes())
+                f.write(header)
+                f.write(payload)
+                ends.append(f.tell())
+            size = f.tell()
+            if truncate > 0:
+                size = max(size - truncate, 0)
+                f.truncate(size)
+        manifest = {'url': url, 'seed': self.seed, 'sections': [list(s) for s in sections],
+                    'packages': len(ends), 'size': size,
+                    'damaged': damaged, 'truncated': truncate,
+                    'complete': int(np.count_nonzero(np.asarray(ends) <= size))}
+        logger.info(f'Wrote {manifest["packages"]} packages, {size} bytes to {url}')
+        return manifest
+
+
+def parseSections(spec) -> list:
+    '''
+    "video:250,image:10,video:500" to [('video', 250), ('image', 10), ('video', 500)]
+    '''
+    sections = []
+    for item in spec.split(','):
+        kind, n = item.split(':')
+        sections.append((kind.strip(), int(n)))
+    return sections
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a synthetic rtmv file.')
+    parser.add_argument('url', help='the rtmv file to write')
+    parser.add_argument('-s', '--sections', default='video:250,image:10',
+                        help='sections as kind:count, e.g. video:250,image:10')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', default='320x240', help='video size')
+    parser.add_argument('--image-size', default='640x480', help='image size')
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--gop', type=int, default=25)
+    parser.add_argument('--corrupt', type=float, default=0.0, help='fraction of packages damaged')
+    parser.add_argument('--truncate', type=int, default=0, help='bytes cut from the end')
+    args = parser.parse_args()
+
+    w, h = (int(v) for v in args.size.split('x'))
+    iw, ih = (int(v) for v in args.image_size.split('x'))
+    synth = RtmvSynth(args.seed, w, h, args.fps, args.gop, iw, ih)
+    manifest = synth.write(args.url, parseSections(args.sections), args.corrupt, args.truncate)
+    print(json.dumps(manifest, indent=2))
@@ -9,17 +9,30 @@
 '''
 
 import os, sys, io
+import stat
 import struct
+import errno
+import csv
+import operator
+import mmap
+import hashlib
+import zipfile
+import bisect
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import queue
+from array import array
 from collections import namedtuple
 from enum import Enum, unique
+from fractions import Fraction
 import time
 import subprocess as sp
 import threading
 import socket
+import selectors
 
 import json
 import av
+import numpy as np
 
 import logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(funcName)s - %(message)s')
@@ -27,6 +40,20 @@ logger = logging.getLogger(__name__)
 # logger.setLevel(logging.DEBUG)
 logger.setLevel(logging.INFO)
 
+from rtmv_metrics import metrics
+_scan_seconds   = metrics.histogram('rtmv_scan_seconds', 'time to scan a file for its packages')
+_scan_bytes     = metrics.counter('rtmv_scan_bytes_total', 'bytes of the files scanned')
+_scan_rate      = metrics.gauge('rtmv_scan_bytes_per_second', 'scan rate of the last file scanned')
+_probe_seconds  = metrics.histogram('rtmv_probe_seconds', 'time to probe a video section')
+_feeder_bytes   = metrics.counter('rtmv_feeder_bytes_total', 'payload bytes sent by the feeders')
+_feeder_rate    = metrics.gauge('rtmv_feeder_bytes_per_second', 'average rate of the last feeding')
+_feeder_send    = metrics.histogram('rtmv_feeder_send_seconds', 'time of one send to the consumer')
+_feeder_stall   = metrics.counter('rtmv_feeder_stall_seconds_total',
+                                  'time the feeders were blocked by the consumer, sends over 1ms')
+_fanout_consumers   = metrics.gauge('rtmv_fanout_consumers', 'consumers attached to a payload ring')
+_fanout_dropped     = metrics.counter('rtmv_fanout_dropped_bytes_total', 'bytes skipped for slow consumers')
+_fanout_disconnects = metrics.counter('rtmv_fanout_disconnects_total', 'slow consumers disconnected')
+
 class RtmvParser(object):
     # the protocol: ("field name", len in bytes, type)
     _big_little = '!' # '<' for little endien while '!' for big
@@ -92,6 +119,37 @@ class RtmvParser(object):
             _payload_offset += fe.len
         else:
             break
+    # byte offset of every field in a header
+    _field_offsets = {}
+    _off = 0
+    for fe in protocol:
+        _field_offsets[fe.name] = _off
+        _off += fe.len
+    del _off
+
+    # Limits of the header sanity checks of the robust scan, see _saneHeader.
+    # Timestamps must be from 1970 to 2100 and payloads no larger than 64M.
+    SANE_TIME_RANGE = (0.0, 4102444800.0)
+    SANE_MAX_PAYLOAD = 64*1024*1024
+    _known_codecs = frozenset(t.value for t in PayloadType)
+
+    @classmethod
+    def _saneHeader(cls, buf, pos=0) -> bool:
+        '''
+        cheap plausibility checks of the header at pos of buf, beyond its
+        signature: the header size, a known payload type, a payload size and
+        a timestamp in range. Random bytes behind a signature found in
+        garbage or in a payload fail them almost always.
+        '''
+        off = cls._field_offsets
+        if buf[pos + off['header_size']] != cls.header_len: return False
+        if buf[pos + off['vid_codec']] not in cls._known_codecs: return False
+        payload_len, = struct.unpack_from(cls._big_little+'i', buf, pos + off['payload_size'])
+        if not 0 <= payload_len <= cls.SANE_MAX_PAYLOAD: return False
+        ts, = struct.unpack_from(cls._big_little+'d', buf, pos + off['timestamp'])
+        # a NaN fails the comparison as well
+        return cls.SANE_TIME_RANGE[0] <= ts <= cls.SANE_TIME_RANGE[1]
+
     def _getPkgSizeFromBuff(self, pos) -> int:
         payload_len, = struct.unpack(self._big_little+'i',
                 self._bytesbuff[pos + self._payload_offset :
@@ -103,16 +161,36 @@ class RtmvParser(object):
         if fe.type == 's': _struct_fmt += str(fe.len)
         _struct_fmt += fe.type
 
+    # numpy structured dtype matching the protocol, to decode headers in bulk
+    _np_types = {'b': 'i1', 'B': 'u1', 'h': 'i2', 'i': 'i4', 'f': 'f4', 'd': 'f8'}
+    _np_endian = '<' if _big_little == '<' else '>'
+    _np_fields = []
+    for fe in protocol:
+        if fe.type == 's': _np_fields.append((fe.name, f'S{fe.len}'))
+        else: _np_fields.append((fe.name, _np_endian + _np_types[fe.type]))
+    _np_dtype = np.dtype(_np_fields)            # the layout in file
+    header_dtype = _np_dtype.newbyteorder('=')  # the layout of rt.headers
+
     # initiliation
-    def __init__(self, url=''):
+    def __init__(self, url='', use_mmap=False):
+        self._lock = threading.RLock()  # see follow()
         self.free()
         if url != '':
-            self.load(url)
+            self.load(url, use_mmap)
 
     def free(self):
+        if getattr(self, '_follow_thread', None) is not None:
+            self._follow_stop.set()
+            self._follow_thread.join()
+        if getattr(self, '_index_dirty', False):
+            self._saveProbes()  # the sections probed lazily since load
+        self._releaseBuffer()
+        if getattr(self, '_file', None) is not None:
+            self._file.close()  # kept open in header only mode
         self._bytesbuff   = b''
+        self._payloadbuff = b''   # what payloads are sliced from
         self._file        = None
-        self._rtmvpackages = []
+        self._rtmvpackages = RtmvPackageTable()
         self.rtmv_sync    = []
         self._payload_sec = []
         self._srcurl       = ''
@@ -122,6 +200,29 @@ class RtmvParser(object):
         self._duration     = 0
         self._starttime    = None
         self._centerpos    = []
+        self._tseg         = None   # the timestamp index, see _buildTimeIndex
+        self._sindex       = None   # the spatial index, built on first use
+        self._use_index    = False
+        self._robust       = False  # sanity check headers while scanning
+        self._index_dirty  = False  # section metadata probed since index written
+        self._follow_thread = None
+        self._follow_callbacks = []
+
+    def _releaseBuffer(self):
+        if not isinstance(getattr(self, '_bytesbuff', None), mmap.mmap):
+            return
+        if isinstance(self._payloadbuff, memoryview):
+            self._payloadbuff.release()
+        try:
+            self._bytesbuff.close()
+        except BufferError:
+            # payload views handed out are still alive, the mapping will be
+            # released when the last of them is garbage collected.
+            logger.warning('payload views still in use, mapping not closed.')
+
+    @property
+    def lock(self):
+        return self._lock
 
     @property
     def payload_sections(self):
@@ -131,10 +232,29 @@ class RtmvParser(object):
     def rtmvpackages(self):
         return self._rtmvpackages
 
+    @property
+    def headers(self):
+        '''
+        headers of all packages as a numpy structured array in native byte
+        order, e.g. rt.headers['timestamp'] is the timestamp column.
+        '''
+        return self._rtmvpackages.headers
+
     @property
     def duration(self):
         return self._duration
 
+    @property
+    def spatial_index(self):
+        '''
+        RtmvSpatialIndex over the package positions, None for an empty file.
+        '''
+        with self._lock:
+            if self._sindex is None and len(self._rtmvpackages) > 0:
+                headers = self._rtmvpackages.headers
+                self._sindex = RtmvSpatialIndex(headers['lat'], headers['long'])
+            return self._sindex
+
     @property
     def start_time(self):
         return self._starttime
@@ -147,76 +267,96 @@ class RtmvParser(object):
     def srcurl(self):
         return self._srcurl
 
+    @property
+    def filesize(self):
+        return self._filesize
+
+    @property
+    def vpkg_cnt(self):
+        return self._vpkg_cnt
+
+    @property
+    def ppkg_cnt(self):
+        return self._ppkg_cnt
+
     # load rtmv packages from a rtmv file
-    def load(self, url):
+    # With use_mmap the file is mapped instead of read into memory, there is
+    # no size limit and payloads are returned as memoryview of the mapping.
+    # With use_index the package table and section metadata are taken from the
+    # sidecar index file (url + '.idx') when it is up to date, and the index
+    # is (re)written after a full scan otherwise.
+    # With scan_workers > 1 a large file is scanned by that many processes.
+    # Video sections are probed on the first access of their meta, or all at
+    # once by probe_workers threads if it is set.
+    # With header_only only the headers are read, following the package chain
+    # by reading header_len bytes at each package. The file is kept open and
+    # payloads are read from it on demand.
+    # With robust a package is accepted only if its header passes the sanity
+    # checks of _saneHeader too, for damaged recordings where signatures show
+    # up in garbage. See damageReport() for what was lost.
+    def load(self, url, use_mmap=False, use_index=True, scan_workers=1, probe_workers=0,
+                header_only=False, robust=False):
         # this is the case for local rtmv file
         if self._file is not None:
             logger.warning('Please release the current rtmv file first.')
             return None
         self._filesize = os.path.getsize(url)
-        if self._filesize > 2*1024*1024*1024:
+        self._srcmtime = os.stat(url).st_mtime_ns
+        if not (use_mmap or header_only) and self._filesize > 2*1024*1024*1024:
             logger.error(f'file size exceeds the 1G limit: {self._filesize}')
             self._filesize = 0
             return None
 
         # Load all packages
-        with open(url, 'rb') as self._file:
+        self._file = open(url, 'rb', buffering=0 if header_only else -1)
+        try:
             self._srcurl = url
-            self._bytesbuff = self._file.read()
-            totalsize = len(self._bytesbuff)
-            pos = 0
-            # pos = self._bytesbuff.find(self.protocol_sig, pos)
-            while totalsize - pos > self.header_len:
-                pos = self._bytesbuff.find(self.protocol_sig.encode('utf-8'), pos)
-                if pos == -1:
-                    break
-                if self._isRtmvPackage(pos):
-                    self.rtmv_sync.append(pos) # sync once
-
-                    while True:
-                        thisheader = RtmvParser.RtmvHeader(*struct.unpack(self._struct_fmt, self._bytesbuff[pos : pos+self.header_len]))
-                        self._rtmvpackages.append(RtmvParser.RtmvPackage(pos, thisheader, thisheader.payload_size + self.header_len))
-                        if thisheader.vid_codec == 4 : self._vpkg_cnt += 1
-                        else: self._ppkg_cnt += 1
-                        pos += self._rtmvpackages[-1].len
-                        if self._isRtmvPackage(pos) is not True: # no followed sync bytes
-                            pos += len(self.protocol_sig)
-                            break
-                else: # no followed sync bytes
-                    pos += len(self.protocol_sig)
-                    continue
-        if len(self._rtmvpackages) == 0: return # no packages found
-
-        # Load all payload sections
-        sec_start = 0
-        sec_end = 0
-        sec_type = self._rtmvpackages[0].header.vid_codec
-        for i, pkg in enumerate(self._rtmvpackages):
-            # generate the payload section
-            if pkg.header.vid_codec != sec_type: # the current section end
-                sec_end = i-1 # set the end for the current label
-                self._payload_sec.append(RtmvPayloadSection(self, sec_start, sec_end,
-                                                        RtmvParser.PayloadType(sec_type), None))
-                sec_start = i
-                sec_end = i
-                sec_type = pkg.header.vid_codec
+            self._robust = robust
+            if header_only:
+                self._bytesbuff = _PreadBuffer(self._file, self._filesize)
+                self._payloadbuff = self._bytesbuff
+            elif use_mmap and self._filesize > 0:
+                # the mapping holds its own file handle, so it stays valid
+                # after the file is closed.
+                self._bytesbuff = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._payloadbuff = memoryview(self._bytesbuff)
+            else:
+                self._bytesbuff = self._file.read()
+                self._payloadbuff = self._bytesbuff
+            index = self._readIndex() if use_index else None
+            if index is not None:
+                pkg_pos, pkg_len, raw = index['pkg_pos'], index['pkg_len'], index['headers']
+                self.rtmv_sync = index['sync'].tolist()
+            else:
+                with _scan_seconds.time() as timer:
+                    if header_only:
+                        pkg_pos, pkg_len, raw, self.rtmv_sync, _ = self._scanHeaders()
+                    else:
+                        pkg_pos, pkg_len = self._scanPackages(scan_workers)
+                        raw = self._gatherHeaders(pkg_pos)
+                _scan_bytes.inc(self._filesize)
+                _scan_rate.set(self._filesize/max(timer.elapsed, 1e-9))
+        finally:
+            if not header_only: self._file.close()
+        if len(pkg_pos) == 0: return # no packages found
+        self._buildPackages(pkg_pos, pkg_len, raw)
+        self._buildTimeIndex()
+
+        if index is not None:
+            self._loadSections(index['sections'])
         else:
-            sec_end = i-1 # reach to the last package, closing the section.
-            self._payload_sec.append(RtmvPayloadSection(self, sec_start, sec_end,
-                                                        RtmvParser.PayloadType(sec_type), None))
+            self._buildSections()
+        if probe_workers > 0:
+            self.probeSections(probe_workers)
 
-        # TODO: analyze the payload
-        for sec in self._payload_sec:
-            if sec.type == self.PayloadType.VIDEO:
-                # streams = self._probeVideoPkg(sec.start, sec.end)
-                # if streams is not None:
-                #    sec.meta.update(streams)
-                streams = self._probeVideoPkgAv(sec.start, sec.end)
-                if streams is not None:
-                    sec.meta = streams
-            else:
-                pass
+        self._use_index = use_index
+        if use_index and (index is None or self._index_dirty):
+            self._writeIndex()
+
+        self._setFileMeta()
+        return
 
+    def _setFileMeta(self):
         # set up meta data of the rtmvfile
         self._starttime = self._rtmvpackages[0].header.timestamp
         self._duration = self._rtmvpackages[-1].header.timestamp - self._starttime
@@ -225,34 +365,328 @@ class RtmvParser(object):
                             self._rtmvpackages[int(len(self._rtmvpackages)/2)].header.alt
                         ]
 
-        return
+    def _scanPackages(self, workers=1):
+        '''
+        scan the buffer for packages, return their offsets and sizes
+        '''
+        if workers > 1 and self._filesize >= 2*RtmvParser.PARALLEL_SCAN_MIN_RANGE:
+            pkg_pos, pkg_len, sync = self._scanParallel(workers)
+        else:
+            pkg_pos, pkg_len, sync, _, _ = self._scanRange(0)
+        self.rtmv_sync = sync.tolist()
+        return pkg_pos, pkg_len
 
-    def _probeVideoPkgAv(self, pkg_s, pkg_e, probesize = 1000000, retry = -1):
+    def _scanRange(self, pos=0, end=None, chained=False, join=None):
+        '''
+        scan packages from pos until the next one would start at or after end.
+        chained tells that pos is right behind an accepted package. If join (a
+        sorted offset array) is given, stop at the first candidate found in it.
+        return (offsets, sizes, sync offsets, pos, chained), the last two are
+        the state to resume the scan from.
+        '''
+        totalsize = len(self._bytesbuff)
+        if end is None: end = totalsize
+        sig = self.protocol_sig.encode('utf-8')
+        pkg_pos = array('q')
+        pkg_len = array('q')
+        sync = array('q')
+        while pos < end:
+            if not chained:
+                if totalsize - pos <= self.header_len:
+                    pos = totalsize
+                    break
+                pos = self._bytesbuff.find(sig, pos)
+                if pos == -1:
+                    pos = totalsize
+                    break
+                if pos >= end:
+                    break
+            if join is not None:
+                k = bisect.bisect_left(join, pos)
+                if k < len(join) and join[k] == pos:
+                    break
+            if self._isRtmvPackage(pos):
+                if not chained: sync.append(pos) # sync once
+                pkg_pos.append(pos)
+                pkg_len.append(self._getPkgSizeFromBuff(pos))
+                pos += pkg_len[-1]
+                chained = True
+            else: # no followed sync bytes
+                pos += len(sig)
+                chained = False
+        return pkg_pos, pkg_len, sync, pos, chained
+
+    # the smallest byte range handed to a scan worker
+    PARALLEL_SCAN_MIN_RANGE = 16*1024*1024
+
+    def _scanParallel(self, workers):
         '''
-        video probe implementation by pyav
+        Split the file into byte ranges scanned by a process pool, each worker
+        maps the file and scans its range from the first signature on. The
+        ranges are then stitched: going on from where the previous range ended,
+        the scan is run here until it hits a package the worker also found,
+        from there both scans are the same so the worker's result is taken.
+        This gives exactly the result of the serial scan.
         '''
-        pkgs = tuple(range(pkg_s, pkg_e+1))
-        times = 0
-        pos = 0
-        while pos < len(pkgs):
-            times += 1
-            buf = b''
-            for pkg in pkgs[pos:-1]:
-                buf += self.getPayload(pkg)
-                if len(buf) > probesize:
-                    pos = pkg
+        size = self._filesize
+        step = max(-(-size // (workers*4)), RtmvParser.PARALLEL_SCAN_MIN_RANGE)
+        starts = list(range(0, size, step))
+        ends = starts[1:] + [size]
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(_scanRangeWorker, [self._srcurl]*len(starts), starts, ends,
+                                        [self._robust]*len(starts)))
+
+        pkg_pos = array('q')
+        pkg_len = array('q')
+        sync = array('q')
+        pos, chained = 0, False
+        for end, (w_pos, w_len, w_sync, w_end, w_chained) in zip(ends, results):
+            if pos >= end: continue  # the range is covered by a package before
+            r_pos, r_len, r_sync, pos, chained = self._scanRange(pos, end, chained, join=w_pos)
+            pkg_pos.extend(r_pos)
+            pkg_len.extend(r_len)
+            sync.extend(r_sync)
+            if pos >= end: continue  # no common package found in the range
+            k = bisect.bisect_left(w_pos, pos)
+            if not chained: sync.append(pos)
+            sync.extend(w_sync[bisect.bisect_right(w_sync, pos):])
+            pkg_pos.extend(w_pos[k:])
+            pkg_len.extend(w_len[k:])
+            pos, chained = w_end, w_chained
+        return pkg_pos, pkg_len, sync
+
+    def _scanHeaders(self, pos=0, chained=False, live=False):
+        '''
+        The scan of _scanRange done by reading the file instead of searching a
+        buffer. While the package chain holds, reading the header of the next
+        package both confirms the current one and gets the next header, that
+        is one read of header_len bytes per package. Only when the chain
+        breaks the file is read in chunks to find the next signature.
+        In live mode the file is still being written, the scan stops at a
+        package that is not complete or not confirmed by the next signature
+        yet instead of skipping it.
+        return offsets, sizes, raw headers and sync offsets of the packages
+        found, and the (pos, chained) state to resume the scan from.
+        '''
+        size = self._filesize
+        hlen = self.header_len
+        sig = self.protocol_sig.encode('utf-8')
+        pread = self._bytesbuff.pread
+        pkg_pos = array('q')
+        pkg_len = array('q')
+        raw = bytearray()
+        sync = []
+        hdr = None
+        while True:
+            if not chained:
+                if size - pos <= hlen: break
+                found = self._bytesbuff.find(sig, pos)
+                if found == -1:
+                    if live: pos = max(pos, size - len(sig) + 1)
                     break
+                pos = found
+                hdr = None
+            if hdr is None: hdr = pread(pos, hlen)
+            if live:
+                if len(hdr) < hlen: break # wait for the header
+                payload_len, = struct.unpack_from(self._big_little+'i', hdr, self._payload_offset)
+                # wait for the payload and the next signature, unless the size
+                # is too big to be a real one
+                if size - pos < hlen + payload_len + len(sig) and \
+                        payload_len <= RtmvStreamParser.DEFAULT_MAX_PAYLOAD:
+                    break
+
+            valid, nexthdr = False, None
+            if len(hdr) == hlen and hdr[:len(sig)] == sig and \
+                    (not self._robust or self._saneHeader(hdr)):
+                psize = hlen + struct.unpack_from(self._big_little+'i', hdr, self._payload_offset)[0]
+                if psize < 0:
+                    valid = False
+                elif size - pos == psize: # the last package
+                    valid = True
+                elif size - pos >= psize + len(sig):
+                    nexthdr = pread(pos + psize, hlen)
+                    valid = nexthdr[:len(sig)] == sig or \
+                            (self._robust and len(nexthdr) == hlen and self._saneHeader(nexthdr))
+
+            if valid:
+                if not chained: sync.append(pos) # sync once
+                pkg_pos.append(pos)
+                pkg_len.append(psize)
+                raw += hdr
+                pos += psize
+                chained, hdr = True, nexthdr
+            else: # no followed sync bytes
+                pos += len(sig)
+                chained, hdr = False, None
+        return pkg_pos, pkg_len, np.frombuffer(raw, dtype=np.uint8).reshape(-1, hlen), \
+                sync, (pos, chained)
+
+    def _buildSections(self):
+        # Load all payload sections. When the file has grown (follow mode),
+        # unchanged sections are kept and a grown one keeps its metadata.
+        old = {(sec.start, sec.type): sec for sec in self._payload_sec}
+        secs = []
+        def close(sec_start, sec_end, sec_type):
+            if sec_type not in RtmvParser._known_codecs:
+                # a damaged header taken as a package, load with robust to skip it
+                logger.warning(f'Unknown payload type {sec_type} of packages {sec_start}-{sec_end}, '
+                               'section skipped.')
+                return
+            sec_type = RtmvParser.PayloadType(sec_type)
+            sec = old.get((sec_start, sec_type))
+            if sec is None:
+                secs.append(RtmvPayloadSection(self, sec_start, sec_end, sec_type, None))
+            elif sec.end == sec_end:
+                secs.append(sec)
+            else:
+                secs.append(RtmvPayloadSection(self, sec_start, sec_end, sec_type, sec._meta, sec.probed))
+
+        # a section ends where the payload type changes
+        codec = self._rtmvpackages.headers['vid_codec']
+        starts = np.concatenate(([0], np.flatnonzero(codec[1:] != codec[:-1]) + 1)).tolist() \
+                    if len(codec) > 0 else []
+        for sec_start, sec_next in zip(starts, starts[1:] + [len(codec)]):
+            close(sec_start, sec_next - 1, int(codec[sec_start]))
+        self._payload_sec = secs  # a new list, readers may hold the old one
+
+    # The sidecar index: package table, sync positions and section metadata
+    # of a rtmv file, validated by size, mtime and a fingerprint of its content.
+    INDEX_SUFFIX = '.idx'
+    _INDEX_VERSION = 3   # 3: the last section takes the last package
+    _FINGERPRINT_LEN = 64*1024
+
+    def _fingerprint(self) -> str:
+        buf = self._bytesbuff
+        n = RtmvParser._FINGERPRINT_LEN
+        h = hashlib.sha1(buf[:n])
+        h.update(buf[max(n, len(buf) - n):])
+        return h.hexdigest()
+
+    def _readIndex(self):
+        idxurl = self._srcurl + RtmvParser.INDEX_SUFFIX
+        if not os.path.exists(idxurl): return None
+        try:
+            with np.load(idxurl, allow_pickle=False) as idx:
+                if int(idx['version']) != RtmvParser._INDEX_VERSION \
+                        or int(idx['filesize']) != self._filesize \
+                        or int(idx['mtime']) != self._srcmtime \
+                        or str(idx['fingerprint']) != self._fingerprint() \
+                        or bool(idx['robust']) != self._robust:
+                    logger.info(f'Index {idxurl} is out of date, rescan the file.')
+                    return None
+                index = {k: idx[k] for k in ('pkg_pos', 'pkg_len', 'headers', 'sync')}
+                index['sections'] = json.loads(str(idx['sections']))
+                if len(index['pkg_pos']) > 0 and len(index['sections']) == 0:
+                    logger.info(f'Index {idxurl} has packages but no sections, rescan the file.')
+                    return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            logger.warning(f'Fail to read index {idxurl}: {e}')
+            return None
+        logger.info(f'Loaded {len(index["pkg_pos"])} packages from index {idxurl}')
+        return index
+
+    def _writeIndex(self):
+        idxurl = self._srcurl + RtmvParser.INDEX_SUFFIX
+        sections = [{'start': sec.start, 'end': sec.end, 'type': sec.type.value,
+                     'meta': sec.meta if sec.probed else None, 'probed': sec.probed}
+                    for sec in self._payload_sec]
+        pkg_pos = self._rtmvpackages.offsets
+        pkg_len = self._rtmvpackages.sizes
+        raw = self._rtmvpackages.headers.astype(self._np_dtype).view(np.uint8).reshape(-1, self.header_len)
+        try:
+            # write a temp file and swap it in, a reader never sees half an index
+            with open(idxurl + '.tmp', 'wb') as f:
+                np.savez(f, version = RtmvParser._INDEX_VERSION,
+                            filesize = self._filesize,
+                            mtime = self._srcmtime,
+                            fingerprint = self._fingerprint(),
+                            robust = self._robust,
+                            pkg_pos = pkg_pos,
+                            pkg_len = pkg_len,
+                            headers = raw,
+                            sync = np.asarray(self.rtmv_sync, dtype=np.int64),
+                            sections = json.dumps(sections, default=str))
+            os.replace(idxurl + '.tmp', idxurl)
+            self._index_dirty = False
+        except OSError as e:
+            logger.warning(f'Fail to write index {idxurl}: {e}')
+
+    def _loadSections(self, sections: list):
+        for sec in sections:
+            meta = sec['meta']
+            if meta is not None and meta.get('framerate') is not None:
+                meta['framerate'] = Fraction(meta['framerate'])
+            self._payload_sec.append(RtmvPayloadSection(self, sec['start'], sec['end'],
+                                                        RtmvParser.PayloadType(sec['type']), meta,
+                                                        sec.get('probed', True)))
+
+    def _gatherHeaders(self, pkg_pos, chunk=8192) -> np.ndarray:
+        '''
+        copy the raw headers at pkg_pos out of the buffer into a
+        (n, header_len) uint8 array, in chunks to bound the index array.
+        '''
+        buf = np.frombuffer(self._bytesbuff, dtype=np.uint8)
+        pkg_pos = np.asarray(pkg_pos, dtype=np.int64)
+        raw = np.empty((len(pkg_pos), self.header_len), dtype=np.uint8)
+        offsets = np.arange(self.header_len, dtype=np.int64)
+        for s in range(0, len(pkg_pos), chunk):
+            raw[s:s+chunk] = buf[pkg_pos[s:s+chunk, None] + offsets]
+        return raw
+
+    def _buildPackages(self, pkg_pos, pkg_len, raw: np.ndarray, append=False):
+        '''
+        decode the raw headers in one pass and set up the package table, or
+        add to it with append.
+        '''
+        headers = np.ascontiguousarray(raw).reshape(-1).view(self._np_dtype).astype(self.header_dtype)
+        if append:
+            self._rtmvpackages.extend(pkg_pos, pkg_len, headers)
+        else:
+            self._rtmvpackages = RtmvPackageTable(pkg_pos, pkg_len, headers)
+        vid_codec = self._rtmvpackages.headers['vid_codec']
+        self._vpkg_cnt = int(np.count_nonzero(vid_codec == self.PayloadType.VIDEO.value))
+        self._ppkg_cnt = len(vid_codec) - self._vpkg_cnt
 
-            f_buf = io.BytesIO(buf)
+    def probeSections(self, workers=4, probesize=1000000, budget=8000000):
+        '''
+        probe the video sections not probed yet concurrently by a thread pool,
+        see _probeVideoPkgAv for probesize and budget.
+        '''
+        secs = [sec for sec in self._payload_sec if not sec.probed]
+        if len(secs) == 0: return
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(lambda sec: sec.probe(probesize, budget), secs))
+        self._saveProbes()
+
+    def _saveProbes(self):
+        # keep the probe results in the index, written once per batch of
+        # probes: after probeSections() and on free()/unfollow()
+        if self._index_dirty and self._use_index and self._srcurl != '':
+            self._writeIndex()
+
+    def _probeVideoPkgAv(self, pkg_s, pkg_e, probesize = 1000000, budget = 8000000):
+        '''
+        video probe implementation by pyav. The first probesize bytes of the
+        section are probed, the size is doubled on failure until it reaches
+        budget or the end of the section.
+        '''
+        ct = None
+        pkg = pkg_s
+        bufs = []
+        buflen = 0
+        while ct is None:
+            while pkg <= pkg_e and buflen <= probesize:
+                bufs.append(self.getPayload(pkg))
+                buflen += len(bufs[-1])
+                pkg += 1
             try:
-                ct = av.open(f_buf)
-                break
+                ct = av.open(io.BytesIO(b''.join(bufs)))
             except av.InvalidDataError:
-                if retry == -1 or times < retry:
-                    continue
-                else:
-                    ct.close()
+                if pkg > pkg_e or probesize >= budget:
+                    logger.info(f'Fail to probe video in packages {pkg_s}-{pkg_e}')
                     return None
+                probesize = min(probesize*2, budget)
         # to simplify the things, we only include codec, size,
         # pixel format and framerate to the metadata of video stream detected
         vid_meta = None
@@ -268,21 +702,41 @@ class RtmvParser(object):
 
     def getPayloads(self, pkgs:tuple) -> list:
         '''
-        get the payload data
+        get the payload data, memoryview items are returned in mmap mode
         '''
         bufflist = []
+        pkg_pos, pkg_len = self._rtmvpackages.offsets, self._rtmvpackages.sizes
         try:
             for i in pkgs:
-                pkg = self._rtmvpackages[i]
-                bufflist.append(self._bytesbuff[pkg.pos+RtmvParser.header_len : pkg.pos+pkg.len])
+                pos, size = int(pkg_pos[i]), int(pkg_len[i])
+                bufflist.append(self._payloadbuff[pos+RtmvParser.header_len : pos+size])
         except IndexError:
             logger.error(f'Invalid package index passed in.')
         return bufflist
 
+    def iterPayloadViews(self, pkgs):
+        '''
+        yield the payloads of pkgs without copying them, as memoryview of
+        the buffer. In header only mode they are read from the file.
+        '''
+        buf = self._payloadbuff
+        if isinstance(buf, (bytes, mmap.mmap)): buf = memoryview(buf)
+        pkg_pos, pkg_len = self._rtmvpackages.offsets, self._rtmvpackages.sizes
+        hlen = RtmvParser.header_len
+        for i in pkgs:
+            pos = int(pkg_pos[i])
+            yield buf[pos+hlen : pos+int(pkg_len[i])]
+
+    def getPackage(self, i:int) -> bytes:
+        '''
+        the whole package, header included, as it is in the file
+        '''
+        pos, size = int(self._rtmvpackages.offsets[i]), int(self._rtmvpackages.sizes[i])
+        return self._payloadbuff[pos : pos+size]
+
     def getPayload(self, i:int) -> bytes:
-        buf = b''
-        pkg = self._rtmvpackages[i]
-        return self._bytesbuff[pkg[0]+RtmvParser.header_len : pkg[0]+pkg[2]]
+        pos, size = int(self._rtmvpackages.offsets[i]), int(self._rtmvpackages.sizes[i])
+        return self._payloadbuff[pos+RtmvParser.header_len : pos+size]
 
     def getDuration(self, start = 0, end = -1): # get the duration in sec between pkgs (start, end)
         if end > len(self._rtmvpackages): end = -1
@@ -290,10 +744,61 @@ class RtmvParser(object):
         return self._rtmvpackages[end].header.timestamp \
                 - self._rtmvpackages[start].header.timestamp
 
+    def damageReport(self) -> dict:
+        '''
+        What the scan had to skip: the byte ranges not covered by a package,
+        before the first, between two not chained and after the last one.
+        For a range between packages lost_duration is the time across it
+        beyond the usual interval of the packages. segments are the (first,
+        last) package index of the unbroken package chains recovered.
+        '''
+        pkgs = self._rtmvpackages
+        n = len(pkgs)
+        report = {'file': self._srcurl, 'filesize': self._filesize, 'robust': self._robust,
+                  'packages': n, 'syncs': len(self.rtmv_sync), 'damaged_ranges': [],
+                  'damaged_bytes': 0, 'lost_duration': 0.0, 'segments': []}
+        if n == 0:
+            if self._filesize > 0:
+                report['damaged_ranges'].append({'start': 0, 'end': self._filesize,
+                        'bytes': self._filesize, 'lost_duration': 0.0, 'after': None, 'before': None})
+                report['damaged_bytes'] = self._filesize
+            return report
+
+        pos, size = pkgs.offsets, pkgs.sizes
+        ts = pkgs.headers['timestamp']
+        ends = pos + size
+        step = np.diff(ts)
+        step = step[step > 0]
+        interval = float(np.median(step)) if len(step) > 0 else 0.0
+
+        ranges = []
+        if pos[0] > 0:
+            ranges.append((0, int(pos[0]), None, 0))
+        for i in np.flatnonzero(ends[:-1] < pos[1:]).tolist():
+            ranges.append((int(ends[i]), int(pos[i + 1]), i, i + 1))
+        if ends[-1] < self._filesize:
+            ranges.append((int(ends[-1]), self._filesize, n - 1, None))
+
+        first = 0
+        for start, end, after, before in ranges:
+            lost = 0.0
+            if after is not None and before is not None:
+                lost = max(float(ts[before] - ts[after]) - interval, 0.0)
+                report['segments'].append((first, after))
+                first = before
+            report['damaged_ranges'].append({'start': start, 'end': end, 'bytes': end - start,
+                    'lost_duration': lost, 'after': after, 'before': before})
+            report['damaged_bytes'] += end - start
+            report['lost_duration'] += lost
+        report['segments'].append((first, n - 1))
+        return report
+
     def _isRtmvPackage(self, pos):
         if self._filesize - pos < self.header_len: return False
-        if self._bytesbuff[pos : pos + len(self.protocol_sig)].decode() != self.protocol_sig:
+        # compare bytes, decoding garbage may raise
+        if self._bytesbuff[pos : pos + len(self.protocol_sig)] != self.protocol_sig.encode('ascii'):
             return False
+        if self._robust and not self._saneHeader(self._bytesbuff, pos): return False
 
         psize = self._getPkgSizeFromBuff(pos)
         if psize < 0: return False
@@ -302,12 +807,509 @@ class RtmvParser(object):
             return True
         elif self._filesize - pos < psize + len(self.protocol_sig): # incomplete ending
             return False
+        elif self._bytesbuff[pos + psize : pos + psize + len(self.protocol_sig)] == \
+                    self.protocol_sig.encode('ascii'):
+            return True
+        # in robust mode a sane next header with a damaged signature confirms
+        # this package as well
+        return self._robust and self._filesize - pos >= psize + self.header_len and \
+                self._saneHeader(self._bytesbuff, pos + psize)
+
+    @classmethod
+    def iter_packages(cls, fileobj, chunk_size=1024*1024, max_payload=None):
+        '''
+        stream packages from a file object (a pipe, stdin, socket file...)
+        without loading it, yield (header, payload) pairs. Memory is bounded by
+        chunk_size plus the largest package.
+        '''
+        parser = RtmvStreamParser(max_payload)
+        while True:
+            data = fileobj.read(chunk_size)
+            if not data:
+                break
+            yield from parser.feed(data)
+        yield from parser.close()
+
+    # Dump options writing byte ranges: (payload only, payload type or None for all)
+    _DUMP_RANGES = {'payload':      (True, None),
+                    'payload_vid':  (True, PayloadType.VIDEO),
+                    'pkg_all':      (False, None),
+                    'pkg_vid':      (False, PayloadType.VIDEO),
+                    'pkg_pic':      (False, PayloadType.IMAGE),
+                    }
+    DUMP_OPTIONS = tuple(_DUMP_RANGES) + ('payload_pic', 'header', 'route')
+    DUMP_KERNEL_COPY_MIN = 256*1024   # runs from this size on are copied in kernel
+    _DUMP_BATCH = 8*1024*1024         # bytes gathered for one writev
+    DUMP_ROUTE_TOLERANCE = 1.0        # metres, see rtmv_gis.RtmvRoute.simplify
+
+    def dump(self, url, option, pkgs=(), progress=None) -> int:
+        '''
+        Dump data of the packages pkgs (package indices, all if empty) to url,
+        see RtmvParserCmd.dump for the options. Byte ranges adjacent in the
+        file are merged into runs, large runs are copied file to file in
+        kernel, small ones are gathered into writev calls. progress(done,
+        total) is called about every second, the throughput is logged
+        otherwise. Return the number of bytes written, None on failure.
+        '''
+        if option not in RtmvParser.DUMP_OPTIONS:
+            logger.error(f'Unknown dump option "{option}", one of {RtmvParser.DUMP_OPTIONS}')
+            return None
+        if option == 'route':
+            idx = self._selectPackages(pkgs)
+            if idx is None: return None
+            import rtmv_gis  # folium and friends are only needed here
+            route = rtmv_gis.RtmvRoute.fromHeaders(self._rtmvpackages.headers[idx])
+            try:
+                return route.simplify(RtmvParser.DUMP_ROUTE_TOLERANCE).save(url)
+            except (OSError, ValueError, ImportError) as e:
+                logger.error(f'Fail to dump the route to {url}: {e}')
+                return None
+        if option == 'header':
+            idx = self._selectPackages(pkgs)
+            return None if idx is None else self._dumpHeaders(url, idx, progress)
+        if option == 'payload_pic':
+            return self.extractImages(url, pkgs, progress=progress)
+
+        payload, p_type = RtmvParser._DUMP_RANGES[option]
+        idx = self._selectPackages(pkgs, p_type)
+        if idx is None: return None
+
+        run_s, run_e = self._packageRuns(idx, payload)
+        return self._dumpRanges(url, run_s, run_e, progress)
+
+    def _packageRuns(self, idx, payload=False):
+        '''
+        byte ranges of the packages (or their payloads) idx, the ones adjacent
+        in the file merged into runs, as lists of run starts and ends
+        '''
+        starts = self._rtmvpackages.offsets[idx]
+        ends = starts + self._rtmvpackages.sizes[idx]
+        if payload: starts = starts + RtmvParser.header_len
+        if len(idx) == 0: return [], []
+        brk = np.flatnonzero(starts[1:] != ends[:-1]) + 1
+        run_s = starts[np.concatenate(([0], brk))]
+        run_e = ends[np.concatenate((brk - 1, [len(idx) - 1]))]
+        return run_s.tolist(), run_e.tolist()
+
+    def _selectPackages(self, pkgs, p_type=None):
+        '''
+        indices of the packages pkgs (all if empty) of the payload type p_type
+        (any if None), None if pkgs is out of range.
+        '''
+        n = len(self._rtmvpackages)
+        if isinstance(pkgs, range):
+            idx = np.arange(pkgs.start, pkgs.stop, pkgs.step, dtype=np.int64)
+        else:
+            idx = np.asarray(list(pkgs), dtype=np.int64)
+        if len(idx) == 0:
+            idx = np.arange(n, dtype=np.int64)
+        elif idx.min() < 0 or idx.max() >= n:
+            logger.error(f'Package index out of range 0-{n-1}')
+            return None
+        if p_type is not None:
+            idx = idx[self._rtmvpackages.headers['vid_codec'][idx] == p_type.value]
+        return idx
+
+    def _dumpRanges(self, url, run_s, run_e, progress=None, append=False) -> int:
+        '''
+        write the byte ranges to url, or to its end with append
+        '''
+        meter = _DumpMeter(f'dump {url}', sum(run_e) - sum(run_s), callback=progress)
+        src = None
+        try:
+            # copy from the file in kernel as long as it holds what was loaded
+            src = open(self._srcurl, 'rb', buffering=0)
+            if len(run_e) == 0 or os.fstat(src.fileno()).st_size < max(run_e):
+                src.close()
+                src = None
+        except OSError as e:
+            logger.info(f'Fail to open {self._srcurl} for copying, write from memory: {e}')
+        try:
+            # not O_APPEND, copy_file_range refuses to write to such a file
+            with open(url, 'r+b' if append else 'wb', buffering=0) as out:
+                out.seek(0, os.SEEK_END)
+                copier = _RangeCopier(src, out) if src is not None else None
+                fd = out.fileno()
+                bufs, buflen = [], 0
+                for s, e in zip(run_s, run_e):
+                    if copier is not None and copier.available and e - s >= RtmvParser.DUMP_KERNEL_COPY_MIN:
+                        if bufs:  # keep the order of the output
+                            _writevAll(fd, bufs)
+                            meter.add(buflen)
+                            bufs, buflen = [], 0
+                        pos = copier.copy(s, e)
+                        meter.add(pos - s)
+                        s = pos
+                        if s == e: continue
+                    bufs.append(self._payloadbuff[s:e])
+                    buflen += e - s
+                    if buflen >= RtmvParser._DUMP_BATCH or len(bufs) >= _IOV_MAX:
+                        _writevAll(fd, bufs)
+                        meter.add(buflen)
+                        bufs, buflen = [], 0
+                if bufs:
+                    _writevAll(fd, bufs)
+                    meter.add(buflen)
+        except OSError as e:
+            logger.error(f'Fail to dump to {url}: {e}')
+            return None
+        finally:
+            if src is not None: src.close()
+        meter.finish()
+        return meter.done
+
+    def _dumpHeaders(self, url, idx, progress=None) -> int:
+        '''
+        write the headers as csv rows, streamed in chunks of packages
+        '''
+        meter = _DumpMeter(f'dump {url}', len(idx), unit='packages', callback=progress)
+        try:
+            with open(url, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['index', 'pos', 'len'] + [fe.name for fe in self.protocol])
+                for i, pkg in zip(idx.tolist(), self._rtmvpackages.take(idx)):
+                    writer.writerow([i, pkg.pos, pkg.len] +
+                                    [v.rstrip(b'\0').decode('ascii', 'replace') if isinstance(v, bytes) else v
+                                     for v in pkg.header])
+                    meter.add(1)
+                size = f.tell()
+        except OSError as e:
+            logger.error(f'Fail to dump to {url}: {e}')
+            return None
+        meter.finish()
+        return size
+
+    IMAGE_POS_FILE = 'pos.csv'
+    _IMAGE_POS_FIELDS = ('timestamp', 'lat', 'long', 'alt', 'height',
+                         'cam_roll', 'cam_pitch', 'cam_yaw', 'uav_roll', 'uav_pitch', 'uav_yaw')
+
+    def extractImages(self, folder, pkgs=(), workers=4, exif=False, progress=None) -> int:
+        '''
+        Write the image payloads of the packages pkgs (all if empty) to folder
+        as <package index>.jpg by a pool of writer threads, plus a position
+        file (IMAGE_POS_FILE) mapping every image to the time, position and
+        attitude in its header. With exif, a GPS EXIF segment is added to
+        jpeg images without one, the image data is copied as it is. Return
+        the number of payload bytes written, None on failure.
+        '''
+        idx = self._selectPackages(pkgs, RtmvParser.PayloadType.IMAGE)
+        if idx is None: return None
+        headers = self._rtmvpackages.headers[idx]
+        meter = _DumpMeter(f'extract {folder}', int(self._rtmvpackages.sizes[idx].sum())
+                                                  - len(idx)*RtmvParser.header_len, callback=progress)
+        names = [f'{i:0>6}.jpg' for i in idx.tolist()]
+
+        def write(chunk):
+            size = 0
+            for k in chunk:
+                payload = self.getPayload(int(idx[k]))
+                segment = b''
+                if exif:
+                    h = headers[k]
+                    segment = _exifGpsSegment(float(h['lat']), float(h['long']),
+                                              float(h['alt']), float(h['timestamp']))
+                with open(os.path.join(folder, names[k]), 'wb') as f:
+                    at = _exifInsertPos(payload) if segment else None
+                    if at is None:
+                        f.write(payload)
+                    else:
+                        f.write(payload[:at])
+                        f.write(segment)
+                        f.write(payload[at:])
+                size += len(payload)
+            return size
+
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, RtmvParser.IMAGE_POS_FILE), 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(('file', 'index') + RtmvParser._IMAGE_POS_FIELDS)
+                columns = [headers[name].tolist() for name in RtmvParser._IMAGE_POS_FIELDS]
+                writer.writerows(zip(names, idx.tolist(), *columns))
+            chunks = [range(s, min(s + 64, len(idx))) for s in range(0, len(idx), 64)]
+            with ThreadPoolExecutor(max(workers, 1)) as executor:
+                for size in executor.map(write, chunks):
+                    meter.add(size)
+        except OSError as e:
+            logger.error(f'Fail to extract images to {folder}: {e}')
+            return None
+        meter.finish()
+        return meter.done
+
+    # Editing: trim, split and concat copy whole packages file to file, see
+    # _dumpRanges. A cut is snapped back to a point the output decodes from.
+    KEYFRAME_TYPES = (1, 2)   # frame_type of IDR and I frames
+
+    def cutPoints(self) -> np.ndarray:
+        '''
+        indices of the packages a file can start at: section starts, image
+        packages and video keyframes. Every package of a video section with
+        no keyframe flagged counts, as frame_type is not filled in there.
+        '''
+        headers = self._rtmvpackages.headers
+        video = headers['vid_codec'] == RtmvParser.PayloadType.VIDEO.value
+        cut = ~video | np.isin(headers['frame_type'], RtmvParser.KEYFRAME_TYPES)
+        for sec in self._payload_sec:
+            e = sec.end + 1
+            cut[sec.start] = True
+            if sec.type == RtmvParser.PayloadType.VIDEO and \
+                    not np.isin(headers['frame_type'][sec.start:e], RtmvParser.KEYFRAME_TYPES).any():
+                logger.info(f'No keyframe flagged in packages {sec.start}-{e-1}, cut anywhere.')
+                cut[sec.start:e] = True
+        return np.flatnonzero(cut)
+
+    def _snap(self, cuts, i) -> int:
+        return int(cuts[max(np.searchsorted(cuts, i, side='right') - 1, 0)])
+
+    def trim(self, url, t0=None, t1=None, pkgs=None, snap=True, progress=None) -> int:
+        '''
+        Write the packages from t0 to t1 seconds from start_time (None for
+        the start or the end of the file), or the packages pkgs=(start, end)
+        inclusive, to url as a rtmv file. With snap the start moves back to
+        the nearest cut point. Return the bytes written, None on failure.
+        '''
+        n = len(self._rtmvpackages)
+        if n == 0: return None
+        if pkgs is not None:
+            s, e = pkgs
+        else:
+            ranges = self.getRangeFromTimes(-np.inf if t0 is None else t0,
+                                            np.inf if t1 is None else t1)
+            ranges = [(rs, re) for rs, re in ranges if rs <= re]
+            if len(ranges) == 0:
+                logger.error(f'No package between {t0}s and {t1}s')
+                return None
+            s, e = min(r[0] for r in ranges), max(r[1] for r in ranges)
+        if not 0 <= s <= e < n:
+            logger.error(f'Package range {s}-{e} out of 0-{n-1}')
+            return None
+        if snap: s = self._snap(self.cutPoints(), s)
+        run_s, run_e = self._packageRuns(np.arange(s, e + 1))
+        logger.info(f'Trim packages {s}-{e} to {url}')
+        return self._dumpRanges(url, run_s, run_e, progress)
+
+    def split(self, prefix, max_size=None, duration=None, snap=True, progress=None) -> list:
+        '''
+        Split the file into parts of at most max_size bytes or duration
+        seconds, written to prefix_000.rtmv, prefix_001.rtmv... With snap the
+        parts start at cut points, a part gets longer than the limit only if
+        there is no cut point inside it. Return [(url, bytes written)].
+        '''
+        n = len(self._rtmvpackages)
+        if n == 0 or (max_size is None) == (duration is None):
+            logger.error('Give either max_size or duration to split a loaded file.')
+            return None
+        cuts = self.cutPoints() if snap else np.arange(n)
+        if max_size is not None:
+            key = self._rtmvpackages.offsets
+            key_end = int(key[-1] + self._rtmvpackages.sizes[-1])
+            limit = max_size
+        else:
+            key = np.maximum.accumulate(self._rtmvpackages.headers['timestamp'])
+            key_end = key[-1]
+            limit = duration
+        # every part runs from a cut point to the last cut point within the limit
+        cut_key = key[cuts]
+        starts = [int(cuts[0])]
+        while key_end - key[starts[-1]] > limit:
+            k = int(np.searchsorted(cut_key, key[starts[-1]] + limit, side='right')) - 1
+            k = max(k, int(np.searchsorted(cuts, starts[-1], side='right')))
+            if k >= len(cuts): break
+            starts.append(int(cuts[k]))
+        ends = starts[1:] + [n]
+        parts = []
+        for k, (s, e) in enumerate(zip(starts, ends)):
+            url = f'{prefix}_{k:03d}.rtmv'
+            run_s, run_e = self._packageRuns(np.arange(s, e))
+            size = self._dumpRanges(url, run_s, run_e, progress)
+            if size is None: return None
+            parts.append((url, size))
+        logger.info(f'Split {self._srcurl} into {len(parts)} parts')
+        return parts
+
+    @staticmethod
+    def concat(url, sources, progress=None) -> int:
+        '''
+        Write the packages of the rtmv files sources one after another to
+        url, leaving out any bytes between packages and incomplete packages
+        at the ends. Return the bytes written, None on failure.
+        '''
+        total = 0
+        for k, src in enumerate(sources):
+            rt = RtmvParser()
+            try:
+                rt.load(src, use_index=False, header_only=True)
+                run_s, run_e = rt._packageRuns(np.arange(len(rt.rtmvpackages)))
+                size = rt._dumpRanges(url, run_s, run_e, progress, append=k > 0)
+            finally:
+                rt.free()
+            if size is None: return None
+            total += size
+        return total
+
+    # Follow mode: parse the packages appended to a file being recorded.
+    def follow(self, callback=None, interval=0.5):
+        '''
+        Start following the loaded file, new packages are parsed every
+        interval seconds in a thread and callback(rt, first, last) is called
+        from that thread with the index range of the packages added. More
+        callbacks can be added by calling follow again. Payloads are read
+        from the file from now on.
+        The thread adds the packages, rtmv_sync and payload_sections under
+        lock. The rows already in the package table never change and
+        rtmv_sync and payload_sections are replaced, not changed, so a
+        reader taking one of them once, e.g. headers = rt.headers, has a
+        consistent snapshot. A reader using several of them together holds
+        lock meanwhile.
+        '''
+        if callback is not None:
+            self._follow_callbacks.append(callback)
+        if self._follow_thread is not None or self._srcurl == '':
+            return
+        if not isinstance(self._bytesbuff, _PreadBuffer):
+            self._releaseBuffer()
+            self._file = open(self._srcurl, 'rb', buffering=0)
+            self._bytesbuff = _PreadBuffer(self._file, self._filesize)
+            self._payloadbuff = self._bytesbuff
+        self._use_index = False  # no index for a file being written
+        if len(self._rtmvpackages) > 0:  # go on right behind the last package
+            self._follow_state = (self._rtmvpackages[-1].pos + self._rtmvpackages[-1].len, True)
         else:
-            return self._bytesbuff[pos + psize : pos + psize + len(self.protocol_sig)] == \
-                    self.protocol_sig.encode('ascii')
+            self._follow_state = (0, False)
+        self._follow_stop = threading.Event()
+        self._follow_thread = threading.Thread(target=self._follow, name='Follow Thread',
+                                               args=[interval])
+        self._follow_thread.start()
+
+    def unfollow(self):
+        '''
+        stop following, the package at the end of file is taken if complete
+        '''
+        if self._follow_thread is None: return
+        self._follow_stop.set()
+        self._follow_thread.join()
+        self._follow_thread = None
+        self._followOnce(live=False)
+        self._saveProbes()
+
+    @property
+    def following(self):
+        return self._follow_thread is not None
+
+    def _follow(self, interval):
+        while not self._follow_stop.wait(interval):
+            try:
+                self._followOnce(live=True)
+            except OSError as e:
+                logger.warning(f'Fail to follow {self._srcurl}: {e}')
+
+    def _followOnce(self, live):
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self._filesize:
+            logger.warning(f'{self._srcurl} was truncated, stop following.')
+            self._follow_stop.set()
+            return
+        self._filesize = size
+        self._bytesbuff._size = size
+        pkg_pos, pkg_len, raw, sync, self._follow_state = self._scanHeaders(*self._follow_state, live=live)
+        if len(pkg_pos) == 0: return
+        with self._lock:
+            first = len(self._rtmvpackages)
+            self._buildPackages(pkg_pos, pkg_len, raw, append=True)
+            self.rtmv_sync = self.rtmv_sync + list(sync)
+            self._buildSections()
+            self._setFileMeta()
+            self._tseg = None     # rebuilt on the next time lookup
+            self._sindex = None   # rebuilt on the next access
+        for callback in self._follow_callbacks:
+            callback(self, first, len(self._rtmvpackages) - 1)
+
+    def _buildTimeIndex(self):
+        '''
+        Split the packages into segments with non-decreasing timestamps, a new
+        segment starts at every sync and wherever the clock goes backwards.
+        Lookups binary search inside the segments, plus a sorted copy of all
+        timestamps for nearest package queries.
+        '''
+        ts = self._rtmvpackages.headers['timestamp']
+        pkg_pos = self._rtmvpackages.offsets
+        seg_s = np.unique(np.concatenate((
+                    [0],
+                    np.flatnonzero(np.diff(ts) < 0) + 1,
+                    np.searchsorted(pkg_pos, self.rtmv_sync)
+                ))).astype(np.int64)
+        seg_e = np.append(seg_s[1:], len(ts))  # exclusive
+        self._tseg = (seg_s, seg_e, ts[seg_s], ts[seg_e - 1])
+        self._torder = np.argsort(ts, kind='stable')
+        self._tsorted = ts[self._torder]
+        if len(seg_s) > len(self.rtmv_sync):
+            logger.info(f'Timestamps go backwards {len(seg_s) - len(self.rtmv_sync)} time(s)')
+
+    def _timeIndex(self):
+        # a snapshot of the index with the timestamps and start time it was
+        # built on, the index is dropped when packages are added in follow mode
+        with self._lock:
+            if len(self._rtmvpackages) == 0: return None
+            if self._tseg is None: self._buildTimeIndex()
+            return self._tseg + (self._torder, self._tsorted,
+                                 self._rtmvpackages.headers['timestamp'], self._starttime)
+
+    @property
+    def time_segments(self) -> list:
+        '''
+        (start, end) package index of the segments with monotonic timestamps
+        '''
+        index = self._timeIndex()
+        if index is None: return []
+        return [(int(s), int(e) - 1) for s, e in zip(index[0], index[1])]
 
     def getPosFromTime(self, sec) -> int:
-        pass # seek to the position where time equals to sec
+        '''
+        index of the package at sec seconds from start_time, i.e. the last
+        package not later than it in the first segment covering that time.
+        The nearest package is taken if no segment covers it.
+        '''
+        index = self._timeIndex()
+        if index is None: return None
+        seg_s, seg_e, seg_t0, seg_t1, _, _, ts, start = index
+        t = start + sec
+        covered = np.flatnonzero((seg_t0 <= t) & (seg_t1 >= t))
+        if len(covered) == 0:
+            return self.getNearestPackage(sec)
+        s, e = seg_s[covered[0]], seg_e[covered[0]]
+        return int(s + np.searchsorted(ts[s:e], t, side='right') - 1)
+
+    def getRangeFromTimes(self, t0, t1) -> list:
+        '''
+        packages between t0 and t1 seconds from start_time, inclusive, as one
+        (start, end) package index pair per segment overlapping the period.
+        '''
+        index = self._timeIndex()
+        if index is None: return []
+        seg_s, seg_e, seg_t0, seg_t1, _, _, ts, start = index
+        t0, t1 = start + t0, start + t1
+        ranges = []
+        for i in np.flatnonzero((seg_t0 <= t1) & (seg_t1 >= t0)):
+            s, e = seg_s[i], seg_e[i]
+            r_s = int(s + np.searchsorted(ts[s:e], t0, side='left'))
+            r_e = int(s + np.searchsorted(ts[s:e], t1, side='right') - 1)
+            if r_s <= r_e:  # else the period falls between two packages
+                ranges.append((r_s, r_e))
+        return ranges
+
+    def getNearestPackage(self, sec) -> int:
+        '''
+        index of the package whose timestamp is the nearest to sec seconds
+        from start_time, regardless of segments.
+        '''
+        index = self._timeIndex()
+        if index is None: return None
+        torder, tsorted, start = index[4], index[5], index[7]
+        t = start + sec
+        k = int(np.searchsorted(tsorted, t))
+        if k == len(tsorted) or (k > 0 and t - tsorted[k-1] <= tsorted[k] - t):
+            k -= 1
+        return int(torder[k])
 
     # TODO: Using this function ro replace payloadfeeder constructor, to be completed
     def getPayloadFeeder(self, pkg_s, pkg_e, consumer = None, callback=None, autostart=False):
@@ -315,6 +1317,432 @@ class RtmvParser(object):
         self._feeders.append(feeder)
         return feeder
 
+class _PreadBuffer(object):
+    '''
+    Read only, buffer like access to an open file by positional reads, for
+    the header only mode. Slicing reads the bytes from the file.
+    '''
+    _CHUNK = 1024*1024
+
+    def __init__(self, file, size):
+        self._fd = file.fileno()
+        self._file = file
+        self._size = size
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def pread(self, pos, n) -> bytes:
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, n, pos)
+        with self._lock:  # seek & read is not thread safe
+            self._file.seek(pos)
+            return self._file.read(n)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError('only contiguous slices are supported')
+        start, stop, _ = key.indices(self._size)
+        return self.pread(start, max(stop - start, 0))
+
+    def find(self, sub, start=0) -> int:
+        # read on in chunks, overlapping by len(sub)-1 bytes for a match
+        # across the chunk border
+        while start < self._size:
+            chunk = self.pread(start, self._CHUNK + len(sub) - 1)
+            i = chunk.find(sub)
+            if i != -1: return start + i
+            if len(chunk) < self._CHUNK + len(sub) - 1: break
+            start += self._CHUNK
+        return -1
+
+
+class RtmvPackageTable(object):
+    '''
+    The package table of a rtmv file kept as columns, offsets and sizes as
+    int64 arrays plus the headers as a structured array, about 144 bytes a
+    package. Items are RtmvPackage(pos, header, len) tuples made on access,
+    so rtmvpackages[i].header.timestamp and pkg[0]/pkg[2] work as with a
+    list of tuples. The header tuples are unpacked from the file layout,
+    same values as struct gives on the raw bytes.
+    '''
+    _ITER_CHUNK = 4096
+
+    def __init__(self, pos=(), length=(), headers=None):
+        self._pos = np.asarray(pos, dtype=np.int64)
+        self._len = np.asarray(length, dtype=np.int64)
+        if headers is None:
+            headers = np.empty(0, dtype=RtmvParser.header_dtype)
+        self._headers = headers
+        self._n = len(self._pos)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._pos[:self._n]
+
+    @property
+    def sizes(self) -> np.ndarray:
+        return self._len[:self._n]
+
+    @property
+    def headers(self) -> np.ndarray:
+        return self._headers[:self._n]
+
+    def _rows(self, sel):
+        # sel is a slice or an index array inside the first _n rows
+        raw = self._headers[sel].astype(RtmvParser._np_dtype).tobytes()
+        for p, h, l in zip(self._pos[sel].tolist(),
+                           struct.iter_unpack(RtmvParser._struct_fmt, raw),
+                           self._len[sel].tolist()):
+            yield RtmvParser.RtmvPackage(p, RtmvParser.RtmvHeader._make(h), l)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            s, e, step = i.indices(self._n)
+            if step == 1:
+                return list(self._rows(slice(s, e))) if s < e else []
+            return [self[k] for k in range(s, e, step)]
+        i = operator.index(i)
+        if i < 0: i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError('package index out of range')
+        return next(self._rows(slice(i, i + 1)))
+
+    def __iter__(self):
+        # unpack in chunks rather than row by row
+        for s in range(0, self._n, self._ITER_CHUNK):
+            yield from self._rows(slice(s, min(s + self._ITER_CHUNK, self._n)))
+
+    def take(self, indices):
+        '''
+        iterate the rows of the packages at indices, unpacked in chunks
+        '''
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) > 0 and (indices.min() < -self._n or indices.max() >= self._n):
+            raise IndexError('package index out of range')
+        indices = np.where(indices < 0, indices + self._n, indices)
+        for s in range(0, len(indices), self._ITER_CHUNK):
+            yield from self._rows(indices[s:s + self._ITER_CHUNK])
+
+    def extend(self, pos, length, headers):
+        '''
+        append packages, the columns grow by doubling as in a list
+        '''
+        n = self._n + len(pos)
+        if n > len(self._pos):
+            cap = max(n, 2*len(self._pos))
+            for name in ('_pos', '_len', '_headers'):
+                col = getattr(self, name)
+                grown = np.empty(cap, dtype=col.dtype)
+                grown[:self._n] = col[:self._n]
+                setattr(self, name, grown)
+        self._pos[self._n:n] = pos
+        self._len[self._n:n] = length
+        self._headers[self._n:n] = headers
+        self._n = n
+
+
+class _RangeCopier(object):
+    '''
+    Copy byte ranges from one file to another in kernel, by copy_file_range
+    or by sendfile where it is not available. A method failing for the pair
+    of files (cross device on old kernels, unsupported file system...) is
+    dropped for good. copy() returns where it stopped, the caller writes
+    the rest itself when that is before the end.
+    '''
+    _MAX_CHUNK = 1024*1024*1024
+    _FALLBACK_ERRNO = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP,
+                       errno.ENOTSUP, errno.EBADF, errno.ESPIPE}
+
+    def __init__(self, src, out):
+        self._src = src.fileno()
+        self._out = out.fileno()
+        self._methods = []
+        if hasattr(os, 'copy_file_range'): self._methods.append(self._copyFileRange)
+        if hasattr(os, 'sendfile'): self._methods.append(self._sendfile)
+
+    @property
+    def available(self):
+        return len(self._methods) > 0
+
+    def _copyFileRange(self, pos, n):
+        return os.copy_file_range(self._src, self._out, n, pos)
+
+    def _sendfile(self, pos, n):
+        return os.sendfile(self._out, self._src, pos, n)
+
+    def copy(self, pos, end) -> int:
+        while self._methods:
+            try:
+                while pos < end:
+                    n = self._methods[0](pos, min(end - pos, self._MAX_CHUNK))
+                    if n == 0: return pos  # source shorter than expected
+                    pos += n
+                return pos
+            except OSError as e:
+                if e.errno not in self._FALLBACK_ERRNO: raise
+                logger.debug(f'{self._methods[0].__name__} not usable: {e}')
+                self._methods.pop(0)
+        return pos
+
+
+_IOV_MAX = 1024  # the writev limit on linux
+
+def _writevAll(fd, bufs):
+    '''
+    write all buffers by writev, taking care of partial writes
+    '''
+    if not hasattr(os, 'writev'):
+        os.write(fd, b''.join(bufs))
+        return
+    i = 0
+    while i < len(bufs):
+        i = _skipWritten(bufs, i, os.writev(fd, bufs[i:i + _IOV_MAX]))
+
+
+def _sendAll(sock, bufs, wait=None) -> int:
+    '''
+    send all buffers by sendmsg scatter-gather, taking care of partial sends,
+    return the bytes sent. For a non-blocking socket wait() is called when
+    it is full, to block until it is writable again or return False to give
+    up the rest.
+    '''
+    if not hasattr(sock, 'sendmsg'): bufs = [b''.join(bufs)]
+    sent, i = 0, 0
+    while i < len(bufs):
+        try:
+            n = sock.sendmsg(bufs[i:i + _IOV_MAX]) if hasattr(sock, 'sendmsg') \
+                    else sock.send(bufs[i])
+        except BlockingIOError:
+            if wait is None or not wait(): break
+            continue
+        sent += n
+        i = _skipWritten(bufs, i, n)
+    return sent
+
+
+def _skipWritten(bufs, i, n) -> int:
+    # drop n bytes written from the buffers from i on, a buffer written in
+    # part is replaced by the view of its rest. return the first one left.
+    while i < len(bufs) and n >= len(bufs[i]):
+        n -= len(bufs[i])
+        i += 1
+    if n > 0:
+        bufs[i] = memoryview(bufs[i])[n:]
+    return i
+
+
+class _DumpMeter(object):
+    '''
+    progress and throughput of a dump, reported every interval seconds to
+    callback(done, total) or to the log.
+    '''
+    def __init__(self, what, total, unit='bytes', callback=None, interval=1.0):
+        self.what = what
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self._callback = callback
+        self._interval = interval
+        self._t0 = time.monotonic()
+        self._next = self._t0 + interval
+
+    def _rate(self, elapsed):
+        rate = self.done / max(elapsed, 1e-9)
+        if self.unit == 'bytes':
+            return f'{rate/1024/1024:.1f} MB/s'
+        return f'{rate:.0f} {self.unit}/s'
+
+    def add(self, n):
+        self.done += n
+        now = time.monotonic()
+        if now < self._next: return
+        self._next = now + self._interval
+        if self._callback is not None:
+            self._callback(self.done, self.total)
+        else:
+            logger.info(f'{self.what}: {self.done}/{self.total} {self.unit} '
+                        f'({100*self.done/max(self.total, 1):.0f}%), {self._rate(now - self._t0)}')
+
+    def finish(self):
+        elapsed = time.monotonic() - self._t0
+        if self._callback is not None:
+            self._callback(self.done, self.total)
+        logger.info(f'{self.what}: {self.done} {self.unit} in {elapsed:.2f}s, {self._rate(elapsed)}')
+
+
+def _exifGpsSegment(lat, lon, alt, timestamp) -> bytes:
+    '''
+    a jpeg APP1 segment with an EXIF GPS IFD: position, altitude and the UTC
+    time stamp, big endian TIFF.
+    '''
+    def dms(v):  # degrees, minutes and seconds as 3 rationals
+        # round first, then carry, so the seconds never come out as 60
+        d, s = divmod(round(abs(v)*3600*10000), 3600*10000)
+        m, s = divmod(s, 60*10000)
+        return struct.pack('>6I', d, 1, m, 1, s, 10000)
+    # to the millisecond, carried into the second, minute, hour and date
+    secs, msecs = divmod(round(timestamp*1000), 1000)
+    t = time.gmtime(secs)
+    # (tag, type, count, value), type 1 BYTE, 2 ASCII, 5 RATIONAL
+    entries = [(0x0000, 1, 4, bytes((2, 3, 0, 0))),
+               (0x0001, 2, 2, b'N\0' if lat >= 0 else b'S\0'),
+               (0x0002, 5, 3, dms(lat)),
+               (0x0003, 2, 2, b'E\0' if lon >= 0 else b'W\0'),
+               (0x0004, 5, 3, dms(lon)),
+               (0x0005, 1, 1, bytes((0 if alt >= 0 else 1,))),
+               (0x0006, 5, 1, struct.pack('>2I', round(abs(alt)*1000), 1000)),
+               (0x0007, 5, 3, struct.pack('>6I', t.tm_hour, 1, t.tm_min, 1,
+                                          t.tm_sec*1000 + msecs, 1000)),
+               (0x001D, 2, 11, time.strftime('%Y:%m:%d', t).encode('ascii') + b'\0')]
+    # TIFF header, IFD0 with the GPS IFD pointer only, the GPS IFD, its data
+    gps_ifd = 8 + 2 + 12 + 4
+    data_pos = gps_ifd + 2 + 12*len(entries) + 4
+    ifd, data = [], []
+    for tag, typ, count, value in entries:
+        if len(value) <= 4:
+            ifd.append(struct.pack('>HHI', tag, typ, count) + value.ljust(4, b'\0'))
+        else:
+            ifd.append(struct.pack('>HHII', tag, typ, count, data_pos))
+            data.append(value)
+            data_pos += len(value)
+    tiff = b'MM\0\x2a' + struct.pack('>I', 8) \
+            + struct.pack('>HHHII', 1, 0x8825, 4, 1, gps_ifd) + struct.pack('>I', 0) \
+            + struct.pack('>H', len(entries)) + b''.join(ifd) + struct.pack('>I', 0) \
+            + b''.join(data)
+    body = b'Exif\0\0' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(body) + 2) + body
+
+def _exifInsertPos(jpeg):
+    '''
+    where to insert an EXIF segment in jpeg: right after SOI, or after a
+    leading JFIF APP0. None if it is not a jpeg or has EXIF already.
+    '''
+    if bytes(jpeg[:2]) != b'\xff\xd8': return None
+    pos, at = 2, 2
+    while pos + 4 <= len(jpeg) and jpeg[pos] == 0xff and 0xe0 <= jpeg[pos + 1] <= 0xef:
+        if jpeg[pos + 1] == 0xe1 and bytes(jpeg[pos + 4:pos + 10]) == b'Exif\0\0':
+            return None
+        seg_end = pos + 2 + struct.unpack('>H', jpeg[pos + 2:pos + 4])[0]
+        if pos == 2 and jpeg[pos + 1] == 0xe0:
+            at = seg_end
+        pos = seg_end
+    return at
+
+
+def _scanRangeWorker(url, start, end, robust=False):
+    '''
+    process pool worker of RtmvParser._scanParallel
+    '''
+    rt = RtmvParser()
+    rt._robust = robust
+    with open(url, 'rb') as f:
+        rt._bytesbuff = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    rt._filesize = len(rt._bytesbuff)
+    try:
+        return rt._scanRange(start, end)
+    finally:
+        rt._bytesbuff.close()
+
+
+class RtmvStreamParser(object):
+    '''
+    Incremental parser of a RTMV byte stream. Bytes are pushed in by feed() and
+    complete packages come out as (header, payload) pairs. A package is only
+    released once the signature of the next package or the end of the stream
+    confirms it, the same rule RtmvParser.load applies to a whole file.
+    '''
+    # A garbage candidate may claim a huge payload, cap it so that waiting for
+    # its end cannot take unbounded memory.
+    DEFAULT_MAX_PAYLOAD = 64*1024*1024
+
+    def __init__(self, max_payload=None):
+        self._max_payload = RtmvStreamParser.DEFAULT_MAX_PAYLOAD \
+                                if max_payload is None else max_payload
+        self._buf       = bytearray()
+        self._pos       = 0      # where to continue in _buf
+        self._chained   = False  # _pos is right behind an accepted package
+        self._eof       = False
+        self._sync_cnt  = 0
+        self._pkg_cnt   = 0
+
+    @property
+    def sync_cnt(self):
+        return self._sync_cnt
+
+    @property
+    def pkg_cnt(self):
+        return self._pkg_cnt
+
+    def feed(self, data) -> list:
+        if self._eof:
+            raise ValueError('feed() called after close()')
+        if self._pos > 0: # drop consumed bytes
+            del self._buf[:self._pos]
+            self._pos = 0
+        self._buf += data
+        return list(self._parse())
+
+    def close(self) -> list:
+        '''
+        mark the end of the stream, return the packages it confirms.
+        '''
+        self._eof = True
+        pkgs = list(self._parse())
+        self._buf = bytearray()
+        self._pos = 0
+        return pkgs
+
+    def _parse(self):
+        sig = RtmvParser.protocol_sig.encode('ascii')
+        siglen = len(sig)
+        hlen = RtmvParser.header_len
+        buf = self._buf
+        while True:
+            pos = self._pos
+            if not self._chained:
+                if self._eof and len(buf) - pos <= hlen:
+                    return
+                pos = buf.find(sig, pos)
+                if pos == -1:
+                    # keep the tail, a signature may span two chunks
+                    self._pos = max(self._pos, len(buf) - siglen + 1)
+                    return
+                self._pos = pos
+
+            # validate the candidate at pos
+            avail = len(buf) - pos
+            if avail < hlen:
+                if not self._eof: return # wait for the header
+                valid = False
+            else:
+                payload_len, = struct.unpack_from(RtmvParser._big_little+'i', buf,
+                                                  pos + RtmvParser._payload_offset)
+                psize = hlen + payload_len
+                if payload_len < 0 or payload_len > self._max_payload:
+                    valid = False
+                elif avail < psize + siglen:
+                    if not self._eof: return # wait for the next signature
+                    valid = avail == psize   # the last package
+                else:
+                    valid = buf[pos + psize : pos + psize + siglen] == sig
+
+            if valid:
+                if not self._chained: self._sync_cnt += 1
+                self._pkg_cnt += 1
+                header = RtmvParser.RtmvHeader(*struct.unpack_from(RtmvParser._struct_fmt, buf, pos))
+                yield header, bytes(buf[pos + hlen : pos + psize])
+                self._pos = pos + psize
+                self._chained = True
+            else: # resync from the next byte after the signature
+                self._pos = pos + siglen
+                self._chained = False
+
+
 class RtmvVidPayloadFeeder(object):
     class State(Enum):
         IDLE = 0
@@ -325,14 +1753,25 @@ class RtmvVidPayloadFeeder(object):
         FINISHED = 0
         FLUSH = 1
 
+    # bytes of payloads sent by one sendmsg, and the batches between two
+    # debug logs of the progress
+    SEND_BATCH = 1024*1024
+    LOG_EVERY = 64
+
+    # address is where the feeder listens, a (host, port) tuple or the path
+    # of a unix domain socket. By default it is the first free port from
+    # 15000 on the address of the host name.
     def __init__(self, rt:RtmvParser, pkg_s, pkg_e, io_consumer = None,
-                    callback=None, autostart=False):
+                    callback=None, autostart=False, address=None):
         self._rt          = rt # the rtmv file
         self._consumer    = io_consumer
-        self._pkgs        = tuple(range(pkg_s, pkg_e+1))
+        self._pkgs        = range(pkg_s, pkg_e+1)
+        self._address     = address
         self._thread      = None
         self._sentbytes   = 0
         self._status      = RtmvVidPayloadFeeder.State.IDLE
+        self._cond        = threading.Condition()  # guards the state
+        self._wake_w      = None
         self._cur_pkg     = -1
 
         if callback is not None and callable(callback):
@@ -361,6 +1800,15 @@ class RtmvVidPayloadFeeder(object):
     def hostaddr(self):
         return self._hostaddr
 
+    @property
+    def url(self):
+        '''
+        the url for av.open or ffmpeg to read from the feeder
+        '''
+        if isinstance(self._hostaddr, str):
+            return f'unix:{self._hostaddr}'
+        return f'tcp://{self._hostaddr[0]}:{self._hostaddr[1]}'
+
     '''
     # Three implementations were tested against different scenarios.
     # Eventually the socket one was kept as it has more flexibility.
@@ -371,53 +1819,133 @@ class RtmvVidPayloadFeeder(object):
     '''
     def _feedVideoPayloadSocket(self):
         self._cur_pkg = self._pkgs[0]
-        # Wait for connection from consumer end
-        while self._status == RtmvVidPayloadFeeder.State.SENDING:
+        # Wait for connection from consumer end, or a wake up by stop()
+        con = None
+        while con is None and self._waitFor(self._socket, selectors.EVENT_READ):
             try:
                 con, addr = self._socket.accept()
-                logger.info(f'Got one connection in. addr:port = {addr[0]}:{addr[1]}')
-                break
-            except socket.timeout:
+                if isinstance(self._hostaddr, str):
+                    logger.info(f'Got one connection in at {self._hostaddr}')
+                else:
+                    logger.info(f'Got one connection in. addr:port = {addr[0]}:{addr[1]}')
+            except BlockingIOError:
                 continue
 
-        # Start to feed packages
+        # Start to feed packages, runs of payloads are sent in batches by one
+        # sendmsg. While the consumer is not reading the feeder waits on the
+        # socket and the wake up socket, so the state changes take effect
+        # within a batch.
         time_start = time.time()
+        debug = logger.isEnabledFor(logging.DEBUG)
+        payloads = self._rt.iterPayloadViews(self._pkgs)
+        pkg, batches = self._pkgs[0], 0
         try:
-            for self._cur_pkg in self._pkgs:
-                if self._status == RtmvVidPayloadFeeder.State.SENDING:
-                    buf = self._rt.getPayload(self._cur_pkg)
-                    self._sentbytes += con.send(buf)
-                    logger.debug(f'write {self._sentbytes} bytes in')
-                elif self._status == RtmvVidPayloadFeeder.State.PAUSE:
-                    while self._status == RtmvVidPayloadFeeder.State.PAUSE:
-                        # wait until status changed
-                        time.sleep(0.1)
-                    continue
-                else:
-                    con.close()
-                    break
-            else:
-                con.close()
-        # FIXME: specify the exception type
-        except Exception as e:
-            logger.info(e)  # For debug, catch exception when the socket is closed
-
+            if con is not None: con.setblocking(False)
+            wait = lambda: self._waitFor(con, selectors.EVENT_WRITE)
+            while con is not None and pkg <= self._pkgs[-1] and self._waitWhilePaused():
+                bufs, buflen = [], 0
+                while pkg <= self._pkgs[-1] and buflen < self.SEND_BATCH and len(bufs) < _IOV_MAX:
+                    bufs.append(next(payloads))
+                    buflen += len(bufs[-1])
+                    pkg += 1
+                with _feeder_send.time() as timer:
+                    sent = _sendAll(con, bufs, wait)
+                self._sentbytes += sent
+                _feeder_bytes.inc(sent)
+                if timer.elapsed > 0.001: _feeder_stall.inc(timer.elapsed)
+                if sent < buflen: break  # stopped
+                self._cur_pkg = pkg - 1
+                batches += 1
+                if debug and batches % self.LOG_EVERY == 0:
+                    logger.debug(f'write {self._sentbytes} bytes in, {pkg - self._pkgs[0]} packages')
+        except OSError as e:
+            logger.info(e)  # the consumer closed the connection
         finally:
+            if con is not None: con.close()
             self._socket.close()
+            self._selector.close()
+            self._wake_r.close()
+            if isinstance(self._hostaddr, str): _unlinkSocket(self._hostaddr)
 
-        self._status = RtmvVidPayloadFeeder.State.IDLE
+        with self._cond:
+            self._status = RtmvVidPayloadFeeder.State.IDLE
+            self._cond.notify_all()
         self._cur_pkg = -1
         if self._callback is not None:
             self._callback(RtmvVidPayloadFeeder.Event.FINISHED, [self._sentbytes])
             self._callback = None
 
+        _feeder_rate.set(self._sentbytes/max(time.time()-time_start, 1e-9))
         logger.info(f'Finish feeding data {self._sentbytes} bytes at average '
-                    f'rate {self._sentbytes/(time.time()-time_start):.2f}Bytes per sec')
+                    f'rate {self._sentbytes/max(time.time()-time_start, 1e-9):.2f}Bytes per sec')
+
+    def _waitWhilePaused(self) -> bool:
+        # block while paused, False once stopped
+        with self._cond:
+            while self._status == RtmvVidPayloadFeeder.State.PAUSE:
+                self._cond.wait()
+            return self._status == RtmvVidPayloadFeeder.State.SENDING
+
+    def _waitFor(self, sock, event) -> bool:
+        '''
+        block until sock is ready for event, without a timeout. A state change
+        wakes it up by the wake up socket, pausing blocks here until resumed.
+        False once stopped.
+        '''
+        key = self._selector.register(sock, event)
+        try:
+            while True:
+                ready = [k.fileobj for k, _ in self._selector.select()]
+                if self._wake_r in ready:
+                    try:
+                        while self._wake_r.recv(4096): pass
+                    except BlockingIOError:
+                        pass
+                if not self._waitWhilePaused(): return False
+                if sock in ready: return True
+        finally:
+            self._selector.unregister(key.fileobj)
+
+    def _setStatus(self, status):
+        with self._cond:
+            self._status = status
+            self._cond.notify_all()
+        if self._wake_w is None: return  # not started
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass  # a wake up is pending already, or the feeder is gone
 
     def start(self):
         self._sentbytes = 0
         self._status = RtmvVidPayloadFeeder.State.SENDING
 
+        if isinstance(self._address, str):
+            _unlinkSocket(self._address)  # left by a feeder not stopped
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.bind(self._address)
+        elif self._address is not None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._socket.bind(self._address)
+        else:
+            self._bindHostname()
+        self._hostaddr = self._socket.getsockname()
+        self._socket.listen(1)  # only one connection is allowed
+        self._socket.setblocking(False)
+        # stop(), pause() and resume() write a byte to wake the feeder up
+        # from waiting on the sockets
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        target = self._feedVideoPayloadSocket
+
+        self._thread = threading.Thread(target=target, name='Feeder Thread', args=[])
+        self._thread.start()
+
+    def _bindHostname(self):
         # FIXME: default port should be a setting item
         port = 15000
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -439,37 +1967,715 @@ class RtmvVidPayloadFeeder(object):
                 logger.info(f'the port number {port} is occupied, try {port+1}')
                 port += 1
                 continue
+
+    def stop(self):
+        self._setStatus(RtmvVidPayloadFeeder.State.IDLE)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._wake_w is not None: self._wake_w.close()
+
+    def pause(self):
+        if self._status == RtmvVidPayloadFeeder.State.SENDING:
+            self._setStatus(RtmvVidPayloadFeeder.State.PAUSE)
+
+    def resume(self):
+        if self._status == RtmvVidPayloadFeeder.State.PAUSE:
+            self._setStatus(RtmvVidPayloadFeeder.State.SENDING)
+
+    def seek(self, percent):
+        pass
+
+
+class _RingCursor(object):
+    # the read position of one consumer of a RtmvPayloadRing, None while it
+    # waits for the next package start
+    def __init__(self, name, pos, on_detach):
+        self.name = name
+        self.pos = pos
+        self.inflight = 0   # the end of what is taken but not done yet
+        self.dropped = 0
+        self.detached = False
+        self.on_detach = on_detach
+
+
+class RtmvPayloadRing(object):
+    '''
+    Bounded byte ring shared by one producer and any number of consumers,
+    each reading at its own cursor. put() copies a payload in once and
+    publishes it when it is complete, so the consumers see whole packages
+    only (but for one larger than the ring, published in parts). When a
+    consumer is too slow to make room for a payload, the policy decides:
+    block waits for the consumer. With drop and disconnect the producer
+    only waits for the leading consumer, one falling a whole ring behind
+    has its cursor moved on to the oldest package left in the ring (drop)
+    or is detached (disconnect). A consumer attached late, or dropped
+    behind all packages in the ring, starts at the next package.
+    Positions are absolute byte counts since the first put().
+    '''
+    POLICIES = ('block', 'drop', 'disconnect')
+
+    def __init__(self, capacity=32*1024*1024, policy='block'):
+        if policy not in RtmvPayloadRing.POLICIES:
+            raise ValueError(f'unknown policy "{policy}", one of {RtmvPayloadRing.POLICIES}')
+        self.capacity = capacity
+        self.policy = policy
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._head = 0         # the end of the data published
+        self._wpos = 0         # the end of the data written
+        self._starts = []      # package starts published, ascending
+        self._cursors = []
+        self._closed = False   # no more put()
+        self._cond = threading.Condition()
+
+    @property
+    def head(self):
+        return self._head
+
+    @property
+    def cursors(self) -> list:
+        with self._cond:
+            return list(self._cursors)
+
+    def attach(self, name='', on_detach=None) -> _RingCursor:
+        '''
+        add a consumer reading from the next package on, on_detach() is
+        called when the ring detaches it
+        '''
+        with self._cond:
+            cursor = _RingCursor(name, None, on_detach)
+            if self._closed:
+                cursor.detached = True
+            else:
+                self._cursors.append(cursor)
+                _fanout_consumers.inc()
+            self._cond.notify_all()
+            return cursor
+
+    def detach(self, cursor):
+        with self._cond:
+            self._detach(cursor)
+
+    def _detach(self, cursor):
+        if cursor.detached: return
+        cursor.detached = True
+        self._cursors.remove(cursor)
+        _fanout_consumers.dec()
+        if cursor.on_detach is not None:
+            cursor.on_detach()
+        self._cond.notify_all()
+
+    def close(self, drain=True):
+        '''
+        end the stream, the consumers read what is left unless drain is False
+        '''
+        with self._cond:
+            self._closed = True
+            if not drain:
+                for cursor in list(self._cursors):
+                    self._detach(cursor)
+            self._cond.notify_all()
+
+    def put(self, payload) -> bool:
+        '''
+        append a payload as one package, False if the ring is closed
+        '''
+        payload = memoryview(payload).cast('B')
+        n, done = len(payload), 0
+        start, parts = self._wpos, n > self.capacity
+        with self._cond:
+            if self._closed: return False
+            if n == 0: self._publish(start)
+        while done < n:
+            with self._cond:
+                room = self._makeRoom(n - done)
+                if room == 0: return False
+                at = self._wpos % self.capacity
+            # the room is free of every cursor, copy without the lock
+            k = min(room, n - done)
+            first = min(k, self.capacity - at)
+            self._view[at:at + first] = payload[done:done + first]
+            self._view[:k - first] = payload[done + first:done + k]
+            done += k
+            with self._cond:
+                self._wpos += k
+                if done == n or parts: self._publish(start)
+        return True
+
+    def _publish(self, start):
+        # make the data written visible, called with the lock held
+        if not self._starts or self._starts[-1] != start:
+            self._starts.append(start)
+            for cursor in self._cursors:
+                if cursor.pos is None: cursor.pos = start
+            k = bisect.bisect_left(self._starts, self._wpos - self.capacity)
+            if k > 1024: del self._starts[:k]
+        self._head = self._wpos
+        self._cond.notify_all()
+
+    def _makeRoom(self, want) -> int:
+        # bytes that can be written now, at most want, 0 once closed. Called
+        # with the lock held. The producer is paced by the slowest consumer
+        # with the block policy and by the leading one otherwise, the
+        # consumers a whole ring behind that get the policy.
+        want = min(want, self.capacity)
+        while not self._closed:
+            live = [c.pos for c in self._cursors if c.pos is not None]
+            if not live: return want
+            bound = min(live) if self.policy == 'block' else max(live)
+            room = min(want, bound + self.capacity - self._wpos)
+            if room <= 0:
+                self._cond.wait()
+                continue
+            tail = self._wpos + room - self.capacity
+            slow = [c for c in self._cursors if c.pos is not None and c.pos < tail]
+            if self.policy == 'drop':
+                for c in slow:
+                    # go on behind what the consumer is sending already
+                    done = max(c.pos, c.inflight)
+                    k = bisect.bisect_left(self._starts, max(tail, done))
+                    start = self._starts[k] if k < len(self._starts) else None
+                    skipped = (self._head if start is None else start) - done
+                    c.dropped += skipped
+                    _fanout_dropped.inc(skipped)
+                    c.pos = start
+            else:
+                for c in slow:
+                    logger.info(f'consumer {c.name} is too slow, disconnect it.')
+                    _fanout_disconnects.inc()
+                    self._detach(c)
+            return room
+        return 0
+
+    def _waitData(self, cursor) -> bool:
+        # wait with the lock held until cursor has data, False at its end
+        while not cursor.detached and (cursor.pos is None or cursor.pos >= self._head):
+            if self._closed: return False
+            self._cond.wait()
+        return not cursor.detached
+
+    def _segments(self, cursor, limit) -> list:
+        # views of the data at cursor in one or two parts, whole packages up
+        # to limit bytes, or the one package at cursor if it is larger
+        pos = cursor.pos
+        end = self._head
+        if end - pos > limit:
+            k = bisect.bisect_right(self._starts, pos + limit) - 1
+            if k < 0 or self._starts[k] <= pos:
+                k = bisect.bisect_right(self._starts, pos)
+                end = self._starts[k] if k < len(self._starts) else self._head
+            else:
+                end = self._starts[k]
+        at = pos % self.capacity
+        first = min(end - pos, self.capacity - at)
+        segs = [self._view[at:at + first]]
+        if end - pos > first: segs.append(self._view[:end - pos - first])
+        return segs
+
+    def _advance(self, cursor, pos, n):
+        # move cursor on by n bytes read from pos, unless it was dropped meanwhile
+        with self._cond:
+            cursor.inflight = 0
+            if cursor.pos == pos:
+                cursor.pos += n
+                self._cond.notify_all()
+
+
+class RtmvRingReader(io.RawIOBase):
+    '''
+    An in-process consumer of a RtmvPayloadRing as a read only raw stream,
+    e.g. to be opened by av.open. read() blocks until data arrives and
+    returns b'' at the end of the stream or once detached. Whole packages
+    are taken from the ring, the part not fitting the caller's buffer is
+    kept for the next read.
+    '''
+    def __init__(self, ring: RtmvPayloadRing, name='reader'):
+        super().__init__()
+        self._ring = ring
+        self._cursor = ring.attach(name)
+        self._pending = b''
+        self._pending_pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        b = memoryview(b).cast('B')
+        if self._pending_pos < len(self._pending):
+            n = min(len(b), len(self._pending) - self._pending_pos)
+            b[:n] = self._pending[self._pending_pos:self._pending_pos + n]
+            self._pending_pos += n
+            return n
+        ring, cursor = self._ring, self._cursor
+        with ring._cond:
+            if not ring._waitData(cursor): return 0
+            segs = ring._segments(cursor, len(b))
+            size = sum(len(seg) for seg in segs)
+            if size > len(b):
+                self._pending, self._pending_pos = b''.join(segs), 0
+            else:
+                n = 0
+                for seg in segs:
+                    b[n:n + len(seg)] = seg
+                    n += len(seg)
+            cursor.pos += size
+            ring._cond.notify_all()
+        return self.readinto(b) if size > len(b) else size
+
+    @property
+    def dropped(self):
+        return self._cursor.dropped
+
+    @property
+    def detached(self):
+        return self._cursor.detached
+
+    def close(self):
+        self._ring.detach(self._cursor)
+        super().close()
+
+
+class RtmvFanoutFeeder(object):
+    '''
+    Feeds the payloads of packages pkg_s to pkg_e to many consumers at once.
+    Every payload is read once into a RtmvPayloadRing of capacity bytes, the
+    memory used whatever the number of consumers. Socket consumers connect
+    to hostaddr and are served by a thread each, in-process ones are
+    RtmvRingReader from attach(). The feeding starts when min_consumers are
+    attached, slow consumers are handled by the policy of the ring. States
+    and events are the ones of RtmvVidPayloadFeeder.
+    '''
+    SEND_CHUNK = 1024*1024   # the most sent to a consumer by one sendmsg
+
+    def __init__(self, rt:RtmvParser, pkg_s, pkg_e, capacity=32*1024*1024, policy='block',
+                    min_consumers=1, host='127.0.0.1', port=0, callback=None, autostart=False):
+        self._rt          = rt
+        self._pkgs        = range(pkg_s, pkg_e+1)
+        self._ring        = RtmvPayloadRing(capacity, policy)
+        self._cond        = self._ring._cond   # guards the state as well
+        self._min_consumers = min_consumers
+        self._addr        = (host, port)
+        self._hostaddr    = None
+        self._status      = RtmvVidPayloadFeeder.State.IDLE
+        self._cur_pkg     = -1
+        self._sentbytes   = 0   # bytes put in the ring
+        self._threads     = []
+        self._serving     = []  # consumer threads
+        self._wake_w      = None
+        self._callback    = callback if callable(callback) else None
+        if autostart:
+            self.start()
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def hostaddr(self):
+        return self._hostaddr
+
+    @property
+    def ring(self):
+        return self._ring
+
+    @property
+    def progress(self):
+        if self._cur_pkg >= self._pkgs[0]:
+            return (self._cur_pkg - self._pkgs[0]) / len(self._pkgs)
+        return None
+
+    def consumers(self) -> list:
+        '''
+        name, bytes behind the producer and bytes dropped of every consumer
+        '''
+        head = self._ring.head
+        return [{'name': c.name, 'lag': head - c.pos if c.pos is not None else 0,
+                 'dropped': c.dropped} for c in self._ring.cursors]
+
+    def attach(self, name='reader') -> RtmvRingReader:
+        return RtmvRingReader(self._ring, name)
+
+    def start(self):
+        self._status = RtmvVidPayloadFeeder.State.SENDING
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(self._addr)
         self._hostaddr = self._socket.getsockname()
-        self._socket.listen(1)  # only one connection is allowed
-        self._socket.settimeout(5)  # set 5s timeout FIXME: could be a setting item
-        target = self._feedVideoPayloadSocket
+        self._socket.listen(16)
+        self._socket.setblocking(False)
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._threads = [threading.Thread(target=self._accept, name='Fanout Acceptor'),
+                         threading.Thread(target=self._produce, name='Fanout Producer')]
+        for t in self._threads: t.start()
+
+    def _produce(self):
+        State = RtmvVidPayloadFeeder.State
+        time_start = time.time()
+        with self._cond:
+            while self._status != State.IDLE and len(self._ring._cursors) < self._min_consumers:
+                self._cond.wait()
+        for self._cur_pkg, payload in zip(self._pkgs, self._rt.iterPayloadViews(self._pkgs)):
+            with self._cond:
+                while self._status == State.PAUSE:
+                    self._cond.wait()
+                if self._status == State.IDLE: break
+            if not self._ring.put(payload): break
+            self._sentbytes += len(payload)
+        self._ring.close()
+        self._wake()   # no more consumers to accept
+        for t in list(self._serving): t.join()
+
+        with self._cond:
+            self._status = State.IDLE
+            self._cond.notify_all()
+        self._cur_pkg = -1
+        if self._callback is not None:
+            self._callback(RtmvVidPayloadFeeder.Event.FINISHED, [self._sentbytes])
+            self._callback = None
+        _feeder_rate.set(self._sentbytes/max(time.time()-time_start, 1e-9))
+        logger.info(f'Finish feeding data {self._sentbytes} bytes to the ring at average '
+                    f'rate {self._sentbytes/max(time.time()-time_start, 1e-9):.2f}Bytes per sec')
+
+    def _accept(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._socket, selectors.EVENT_READ)
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        try:
+            while True:
+                ready = [k.fileobj for k, _ in selector.select()]
+                if self._wake_r in ready:
+                    try:
+                        while self._wake_r.recv(4096): pass
+                    except BlockingIOError:
+                        pass
+                with self._cond:
+                    if self._status == RtmvVidPayloadFeeder.State.IDLE or self._ring._closed:
+                        break
+                if self._socket not in ready: continue
+                try:
+                    con, addr = self._socket.accept()
+                except BlockingIOError:
+                    continue
+                con.setblocking(True)
+                logger.info(f'Got one connection in. addr:port = {addr[0]}:{addr[1]}')
+                # shutting the socket down breaks a send blocked on it
+                cursor = self._ring.attach(f'{addr[0]}:{addr[1]}',
+                                           on_detach=lambda con=con: _shutdown(con))
+                t = threading.Thread(target=self._serve, args=(con, cursor), name='Fanout Consumer')
+                self._serving.append(t)
+                t.start()
+        finally:
+            selector.close()
+            self._socket.close()
+            self._wake_r.close()
+
+    def _serve(self, con, cursor):
+        ring = self._ring
+        # with the block policy nothing is written over what a consumer has
+        # not read, so it is sent from the ring, otherwise from a copy
+        zero_copy = ring.policy == 'block'
+        sent = 0
+        try:
+            while True:
+                with self._cond:
+                    if not ring._waitData(cursor): break
+                    pos = cursor.pos
+                    segs = ring._segments(cursor, RtmvFanoutFeeder.SEND_CHUNK)
+                    if not zero_copy: segs = [bytes(s) for s in segs]
+                    cursor.inflight = pos + sum(len(s) for s in segs)
+                n = _sendAll(con, segs)
+                sent += n
+                _feeder_bytes.inc(n)
+                ring._advance(cursor, pos, n)
+        except OSError as e:
+            logger.info(f'consumer {cursor.name}: {e}')
+        finally:
+            ring.detach(cursor)
+            con.close()
+        logger.info(f'consumer {cursor.name} done, {sent} bytes sent, {cursor.dropped} dropped')
 
-        self._thread = threading.Thread(target=target, name='Feeder Thread', args=[])
-        self._thread.start()
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass  # a wake up is pending already, or the acceptor is gone
 
-    def stop(self):
-        self._status = RtmvVidPayloadFeeder.State.IDLE
-        self._thread.join()
+    def _setStatus(self, status):
+        with self._cond:
+            self._status = status
+            self._cond.notify_all()
 
+    def stop(self):
+        '''
+        stop feeding, the consumers are disconnected without the rest
+        '''
+        if self._wake_w is None: return  # not started
+        self._setStatus(RtmvVidPayloadFeeder.State.IDLE)
+        self._ring.close(drain=False)
+        self._wake()
+        for t in self._threads:
+            if t is not threading.current_thread(): t.join()
+        self._wake_w.close()
 
     def pause(self):
-        self._status = RtmvVidPayloadFeeder.State.PAUSE
+        if self._status == RtmvVidPayloadFeeder.State.SENDING:
+            self._setStatus(RtmvVidPayloadFeeder.State.PAUSE)
 
     def resume(self):
-        self._status = RtmvVidPayloadFeeder.State.SENDING
+        if self._status == RtmvVidPayloadFeeder.State.PAUSE:
+            self._setStatus(RtmvVidPayloadFeeder.State.SENDING)
 
-    def seek(self, percent):
+
+def _unlinkSocket(path):
+    # remove a unix domain socket file, nothing else
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode): os.unlink(path)
+    except OSError:
         pass
 
 
+class RtmvPayloadReader(io.RawIOBase):
+    '''
+    The payloads of packages pkg_s to pkg_e as a read only raw stream, pulled
+    from the parser on demand, for av.open in the same process. No thread,
+    no socket and no copy but the one into the caller's buffer. It has the
+    status, progress, pause(), resume() and stop() of RtmvVidPayloadFeeder,
+    so a player can take either. Data only flows when it is read, pausing
+    just marks the state.
+    '''
+    def __init__(self, rt:RtmvParser, pkg_s, pkg_e):
+        super().__init__()
+        self._pkgs = range(pkg_s, pkg_e+1)
+        self._payloads = rt.iterPayloadViews(self._pkgs)
+        self._payload = memoryview(b'')
+        self._cur_pkg = pkg_s - 1
+        self._sentbytes = 0
+        self._status = RtmvVidPayloadFeeder.State.SENDING
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def cur_pkg(self):
+        return self._cur_pkg
+
+    @property
+    def progress(self):
+        if self._cur_pkg >= self._pkgs[0]:
+            return (self._cur_pkg - self._pkgs[0]) / len(self._pkgs)
+        return None
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        b = memoryview(b).cast('B')
+        n = 0
+        while n < len(b):
+            if len(self._payload) == 0:
+                payload = next(self._payloads, None)
+                if payload is None:
+                    self._status = RtmvVidPayloadFeeder.State.IDLE
+                    break
+                self._payload = memoryview(payload)
+                self._cur_pkg += 1
+            k = min(len(b) - n, len(self._payload))
+            b[n:n + k] = self._payload[:k]
+            self._payload = self._payload[k:]
+            n += k
+        self._sentbytes += n
+        _feeder_bytes.inc(n)
+        return n
+
+    def pause(self):
+        if self._status == RtmvVidPayloadFeeder.State.SENDING:
+            self._status = RtmvVidPayloadFeeder.State.PAUSE
+
+    def resume(self):
+        if self._status == RtmvVidPayloadFeeder.State.PAUSE:
+            self._status = RtmvVidPayloadFeeder.State.SENDING
+
+    def stop(self):
+        self.close()
+
+    def close(self):
+        # drop the views, a mapping cannot be closed while they are alive
+        self._payload = memoryview(b'')
+        self._payloads.close()
+        self._status = RtmvVidPayloadFeeder.State.IDLE
+        super().close()
+
+
+def _shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass  # not connected any more
+
+
+class RtmvSpatialIndex(object):
+    '''
+    Uniform grid over package positions. Packages are sorted by grid cell, so
+    the packages of a run of cells in one row are a slice found by binary
+    search. Queries collect the cells around the target and only check the
+    exact distance or containment on the packages in them.
+    Query results are package indices in ascending order.
+    '''
+    EARTH_RADIUS = 6371008.8  # mean radius in metres
+    _PKGS_PER_CELL = 16       # aimed when the cell size is not given
+
+    def __init__(self, lat, lon, cell_deg=None):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        # (0, 0) is what we get without gps fix
+        valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) \
+                & (np.abs(lon) <= 180) & ((lat != 0) | (lon != 0))
+        self._pkgs = np.flatnonzero(valid)
+        self._lat = lat[valid]
+        self._lon = lon[valid]
+        n = len(self._pkgs)
+        if n == 0:
+            self._lat0 = self._lon0 = 0.0
+            self._cell = 1.0 if cell_deg is None else cell_deg
+            self._nrows = self._ncols = 1
+            self._keys = self._order = np.empty(0, dtype=np.int64)
+            return
+
+        self._lat0, self._lon0 = self._lat.min(), self._lon.min()
+        if cell_deg is None:
+            span = max(np.ptp(self._lat), np.ptp(self._lon))
+            cell_deg = span / max(1.0, np.sqrt(n / self._PKGS_PER_CELL))
+        self._cell = max(cell_deg, 1e-7)
+        rows = self._row(self._lat)
+        cols = self._col(self._lon)
+        self._nrows = int(rows.max()) + 1
+        self._ncols = int(cols.max()) + 1
+        keys = rows * self._ncols + cols
+        self._order = np.argsort(keys, kind='stable')
+        self._keys = keys[self._order]
+
+    @property
+    def cell_deg(self):
+        return self._cell
+
+    def __len__(self):
+        return len(self._pkgs)
+
+    def _row(self, lat):
+        return np.floor((np.asarray(lat) - self._lat0) / self._cell).astype(np.int64)
+
+    def _col(self, lon):
+        return np.floor((np.asarray(lon) - self._lon0) / self._cell).astype(np.int64)
+
+    def _candidates(self, lat_min, lat_max, lon_min, lon_max) -> np.ndarray:
+        '''
+        positions (in the valid arrays) of the packages in the cells
+        touched by the box
+        '''
+        r0, r1 = np.clip(self._row([lat_min, lat_max]), 0, self._nrows - 1)
+        c0, c1 = np.clip(self._col([lon_min, lon_max]), 0, self._ncols - 1)
+        if lat_max < self._lat0 or lon_max < self._lon0 or len(self._keys) == 0:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(r0, r1 + 1, dtype=np.int64) * self._ncols
+        lo = np.searchsorted(self._keys, rows + c0, side='left')
+        hi = np.searchsorted(self._keys, rows + c1, side='right')
+        return np.concatenate([self._order[a:b] for a, b in zip(lo, hi)]
+                              + [np.empty(0, dtype=np.int64)])
+
+    def distance(self, lat, lon, lat2, lon2):
+        '''
+        haversine distance in metres, numpy broadcasting applies
+        '''
+        lat, lon, lat2, lon2 = map(np.radians, (lat, lon, lat2, lon2))
+        a = np.sin((lat2 - lat) / 2)**2 + np.cos(lat) * np.cos(lat2) * np.sin((lon2 - lon) / 2)**2
+        return 2 * self.EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def within(self, lat, lon, radius) -> np.ndarray:
+        '''
+        packages within radius metres of (lat, lon)
+        '''
+        dlat = np.degrees(radius / self.EARTH_RADIUS)
+        coslat = np.cos(np.radians(min(abs(lat) + dlat, 90.0)))
+        dlon = 180.0 if coslat < 1e-9 else min(dlat / coslat, 180.0)
+        cand = np.unique(np.concatenate([self._candidates(lat - dlat, lat + dlat, lon_min, lon_max)
+                                         for lon_min, lon_max in self._lonRanges(lon - dlon, lon + dlon)]))
+        d = self.distance(lat, lon, self._lat[cand], self._lon[cand])
+        return np.sort(self._pkgs[cand[d <= radius]])
+
+    @staticmethod
+    def _lonRanges(lon_min, lon_max) -> list:
+        # the longitude range split in two where it crosses the antimeridian
+        if lon_max - lon_min >= 360.0:
+            return [(-180.0, 180.0)]
+        if lon_min < -180.0:
+            return [(lon_min + 360.0, 180.0), (-180.0, lon_max)]
+        if lon_max > 180.0:
+            return [(lon_min, 180.0), (-180.0, lon_max - 360.0)]
+        return [(lon_min, lon_max)]
+
+    def inside(self, polygon) -> np.ndarray:
+        '''
+        packages inside the polygon given as a sequence of (lat, lon) vertices.
+        An edge spanning more than 180 degrees of longitude is taken the other
+        way round, across the antimeridian.
+        '''
+        poly = np.array(polygon, dtype=np.float64)
+        # unwrap the longitudes along the edges, the polygon may go past
+        # +-180 then and the candidates are shifted into its range
+        dlon = np.diff(poly[:, 1])
+        dlon = np.where(dlon > 180.0, dlon - 360.0, np.where(dlon < -180.0, dlon + 360.0, dlon))
+        poly[1:, 1] = poly[0, 1] + np.cumsum(dlon)
+        lon_min, lon_max = poly[:, 1].min(), poly[:, 1].max()
+        lat_min, lat_max = poly[:, 0].min(), poly[:, 0].max()
+        cand = np.unique(np.concatenate([self._candidates(lat_min, lat_max, lo, hi)
+                                         for lo, hi in self._lonRanges(lon_min, lon_max)]))
+        y, x = self._lat[cand], lon_min + (self._lon[cand] - lon_min) % 360.0
+        inside = np.zeros(len(cand), dtype=bool)
+        # ray casting, one edge at a time over all candidates
+        for (y1, x1), (y2, x2) in zip(poly, np.roll(poly, -1, axis=0)):
+            crossing = (y1 > y) != (y2 > y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                xcross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crossing & (x < xcross)
+        return np.sort(self._pkgs[cand[inside]])
+
+    def nearest(self, lat, lon):
+        '''
+        (package index, distance in metres) of the package nearest to
+        (lat, lon), None if no package has a position.
+        '''
+        if len(self._pkgs) == 0: return None
+        r = int(np.clip(self._row(lat), 0, self._nrows - 1))
+        c = int(np.clip(self._col(lon), 0, self._ncols - 1))
+        # grow a ring of cells around the target until it holds a package,
+        # which bounds the distance, then collect everything in that distance
+        for k in range(max(self._nrows, self._ncols)):
+            cand = self._candidates(self._lat0 + (r - k) * self._cell, self._lat0 + (r + k) * self._cell,
+                                    self._lon0 + (c - k) * self._cell, self._lon0 + (c + k) * self._cell)
+            if len(cand) > 0: break
+        best = self.distance(lat, lon, self._lat[cand], self._lon[cand]).min()
+        cand = self.within(lat, lon, best * (1 + 1e-9) + 1e-6)
+        if len(cand) == 0:
+            cand = self._pkgs  # should not happen, check them all rather than fail
+        pos = np.searchsorted(self._pkgs, cand)
+        d = self.distance(lat, lon, self._lat[pos], self._lon[pos])
+        return int(cand[np.argmin(d)]), float(d.min())
+
+
 class RtmvPayloadSection(object):
-    def __init__(self, rt: RtmvParser, start: int, end: int, p_type: RtmvParser.PayloadType, meta: dict=None):
+    def __init__(self, rt: RtmvParser, start: int, end: int, p_type: RtmvParser.PayloadType,
+                    meta: dict=None, probed=False):
         self._rt = rt
         self._start = start
         self._end = end
         self._p_type = p_type
         self._duration = self._rt.getDuration(self._start, self._end)
         self._meta = None if meta is None else dict(meta)
+        # only video sections are probed, and only once
+        self._probed = probed or meta is not None or p_type != RtmvParser.PayloadType.VIDEO
+        self._probe_lock = threading.Lock()
 
     @property
     def rt(self):
@@ -492,12 +2698,28 @@ class RtmvPayloadSection(object):
         return self._p_type
 
     @property
-    def meta(self):
+    def probed(self):
+        return self._probed
+
+    def probe(self, probesize=1000000, budget=8000000) -> dict:
+        with self._probe_lock:
+            if not self._probed:
+                with _probe_seconds.time():
+                    meta = self._rt._probeVideoPkgAv(self._start, self._end, probesize, budget)
+                self._meta = None if meta is None else dict(meta)
+                self._probed = True
+                self._rt._index_dirty = True
         return self._meta
 
+    @property
+    def meta(self):
+        # probed on first access
+        return self._meta if self._probed else self.probe()
+
     @meta.setter
     def meta(self, meta: dict):
         self._meta = dict(meta)
+        self._probed = True
 
 if __name__ == "__main__":
     url = ''
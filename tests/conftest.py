@@ -0,0 +1,28 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rtmv_synth import RtmvSynth
+
+
+@pytest.fixture(scope='session')
+def synth_file(tmp_path_factory):
+    '''
+    a clean synthetic file with a few sections, and its manifest
+    '''
+    url = str(tmp_path_factory.mktemp('synth') / 'clean.rtmv')
+    manifest = RtmvSynth(seed=1).write(url, (('video', 300), ('image', 12), ('video', 300)))
+    return url, manifest
+
+
+@pytest.fixture(scope='session')
+def damaged_file(tmp_path_factory):
+    '''
+    a synthetic file with some packages damaged and its end cut off
+    '''
+    url = str(tmp_path_factory.mktemp('synth') / 'damaged.rtmv')
+    manifest = RtmvSynth(seed=2).write(url, (('video', 300), ('image', 12), ('video', 300)),
+                                       corrupt=0.03, truncate=1000)
+    return url, manifest
@@ -0,0 +1,30 @@
+import os
+import shutil
+
+from rtmvfile import RtmvParser
+from rtmv_catalog import RtmvCatalog
+
+
+def test_scan_and_failed_rescan(synth_file, tmp_path, monkeypatch):
+    root = tmp_path / 'flights'
+    root.mkdir()
+    url = str(root / 'a.rtmv')
+    shutil.copyfile(synth_file[0], url)
+    catalog = RtmvCatalog(str(tmp_path / 'catalog.db'))
+    assert catalog.scan(str(root), workers=1) == (1, 0, 0)
+    files = catalog.query()
+    assert [f['pkg_cnt'] for f in files] == [synth_file[1]['packages']]
+    assert len(catalog.sections(url)) == 3
+    assert not os.path.exists(url + RtmvParser.INDEX_SUFFIX)  # no sidecar written
+    assert catalog.scan(str(root), workers=1) == (0, 1, 0)
+
+    # the file changes and cannot be read any more: its old row must go
+    with open(url, 'ab') as f:
+        f.write(b'\0'*100)
+    def fail(self, url, *args, **kw):
+        raise OSError('unreadable')
+    monkeypatch.setattr(RtmvParser, 'load', fail)
+    assert catalog.scan(str(root), workers=1) == (0, 0, 0)
+    assert catalog.query() == []
+    assert catalog.sections(url) == []
+    catalog.close()
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from rtmvfile import RtmvParser
+
+
+@pytest.fixture(params=['clean', 'damaged'])
+def parser(request, synth_file, damaged_file):
+    url = (synth_file if request.param == 'clean' else damaged_file)[0]
+    rt = RtmvParser()
+    rt.load(url, use_index=False)
+    yield rt
+    rt.free()
+
+
+@pytest.mark.parametrize('option', ['pkg_all', 'pkg_vid', 'pkg_pic', 'payload', 'payload_vid'])
+def test_dump_returns_bytes_written(parser, tmp_path, option):
+    url = str(tmp_path / 'out.bin')
+    size = parser.dump(url, option)
+    assert size == os.path.getsize(url)
+
+
+def test_dump_package_range(parser, tmp_path):
+    url = str(tmp_path / 'part.rtmv')
+    size = parser.dump(url, 'pkg_all', range(10, 200))
+    assert size == os.path.getsize(url)
+    assert size == int(parser.rtmvpackages.sizes[10:200].sum())
+
+
+def test_trim_returns_bytes_written(parser, tmp_path):
+    url = str(tmp_path / 'cut.rtmv')
+    size = parser.trim(url, 2.0, 14.0)
+    assert size == os.path.getsize(url)
+    size = parser.trim(url, pkgs=(5, 400), snap=False)
+    assert size == os.path.getsize(url)
+    assert size == int(parser.rtmvpackages.sizes[5:401].sum())
+
+
+@pytest.mark.parametrize('limit', [{'max_size': 512*1024}, {'duration': 5.0}])
+def test_split_returns_bytes_written(parser, tmp_path, limit):
+    parts = parser.split(str(tmp_path / 'sd'), **limit)
+    assert len(parts) > 1
+    for url, size in parts:
+        assert size == os.path.getsize(url)
+    assert sum(size for _, size in parts) == int(parser.rtmvpackages.sizes.sum())
+
+
+def test_concat_returns_bytes_written(synth_file, damaged_file, tmp_path):
+    url = str(tmp_path / 'whole.rtmv')
+    size = RtmvParser.concat(url, [synth_file[0], damaged_file[0]])
+    assert size == os.path.getsize(url)
+    counts = []
+    for u in (synth_file[0], damaged_file[0], url):
+        rt = RtmvParser()
+        rt.load(u, use_index=False)
+        counts.append(len(rt.rtmvpackages))
+        rt.free()
+    assert counts[2] == counts[0] + counts[1]
@@ -0,0 +1,32 @@
+import struct
+
+import pytest
+
+from rtmvfile import _exifGpsSegment
+
+
+def _rationals(seg, tag):
+    # the 3 rationals of a tag of the GPS IFD, as floats
+    tiff = seg[10:]
+    gps_ifd = struct.unpack('>I', tiff[18:22])[0]
+    for k in range(struct.unpack('>H', tiff[gps_ifd:gps_ifd + 2])[0]):
+        e = gps_ifd + 2 + 12*k
+        t, _, count, pos = struct.unpack('>HHII', tiff[e:e + 12])
+        if t == tag:
+            v = struct.unpack(f'>{2*count}I', tiff[pos:pos + 8*count])
+            return [v[i]/v[i + 1] for i in range(0, len(v), 2)]
+    raise KeyError(tag)
+
+
+def test_timestamp_carries_into_the_minute():
+    # 1600000019.9996 is 12:26:59.9996 UTC, 12:27:00.000 to the millisecond
+    seg = _exifGpsSegment(30.0, 120.0, 100.0, 1600000019.9996)
+    assert _rationals(seg, 0x0007) == [12, 27, 0]
+    seg = _exifGpsSegment(30.0, 120.0, 100.0, 1600000019.25)
+    assert _rationals(seg, 0x0007) == [12, 26, 59.25]
+
+
+@pytest.mark.parametrize('v, expected', [(30.99999999, [31, 0, 0]), (-10.5, [10, 30, 0]),
+                                         (29.999999999, [30, 0, 0]), (12.25, [12, 15, 0])])
+def test_dms_never_has_60_seconds(v, expected):
+    assert _rationals(_exifGpsSegment(v, 120.0, 0.0, 1600000000.0), 0x0002) == pytest.approx(expected)
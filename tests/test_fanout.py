@@ -0,0 +1,128 @@
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from rtmvfile import RtmvParser, RtmvPayloadRing, RtmvRingReader, RtmvFanoutFeeder
+
+
+def _package(i):
+    # a package telling its index and size, with a body to check
+    size = 200 + (i*7919) % 3000
+    return struct.pack('>II', i, size) + bytes([i % 251])*size
+
+
+def _unpack(data):
+    # the packages in data, failing on anything not a whole package
+    pkgs, pos = [], 0
+    while pos < len(data):
+        i, size = struct.unpack_from('>II', data, pos)
+        assert data[pos:pos + 8 + size] == _package(i), f'package {i} torn'
+        pkgs.append(i)
+        pos += 8 + size
+    return pkgs
+
+
+def _consume(reader, out, delay=0.0):
+    buf = bytearray()
+    while True:
+        data = reader.read(4096)
+        if not data: break
+        buf += data
+        if delay: time.sleep(delay)
+    out.append(bytes(buf))
+
+
+N = 600
+
+
+def _run(policy, capacity=64*1024):
+    ring = RtmvPayloadRing(capacity, policy)
+    fast, slow = RtmvRingReader(ring, 'fast'), RtmvRingReader(ring, 'slow')
+    got = {'fast': [], 'slow': []}
+    threads = [threading.Thread(target=_consume, args=(fast, got['fast'])),
+               threading.Thread(target=_consume, args=(slow, got['slow'], 0.002))]
+    for t in threads: t.start()
+    starts = []
+    for i in range(N):
+        assert ring.put(_package(i))
+        starts.append(len(ring._starts))
+        assert len(ring._buf) == capacity
+    ring.close()
+    for t in threads: t.join(30)
+    # the package starts kept are bounded too
+    assert max(starts) <= 1024 + capacity // 208 + 1
+    return ring, fast, slow, _unpack(got['fast'][0]), _unpack(got['slow'][0])
+
+
+def test_block_policy():
+    ring, fast, slow, f, s = _run('block')
+    assert f == s == list(range(N))
+    assert fast.dropped == slow.dropped == 0
+
+
+def test_drop_policy():
+    ring, fast, slow, f, s = _run('drop')
+    assert f == list(range(N))
+    # whole packages in order, with gaps
+    assert s == sorted(set(s)) and len(s) < N
+    assert slow.dropped == sum(len(_package(i)) for i in set(range(s[0], s[-1] + 1)) - set(s))
+    assert s[-1] == N - 1   # it catches up with the end
+
+
+def test_disconnect_policy():
+    ring, fast, slow, f, s = _run('disconnect')
+    assert f == list(range(N))
+    # a gapless start, then the end
+    assert slow.detached and s == list(range(len(s))) and len(s) < N
+
+
+@pytest.fixture(scope='module')
+def video(synth_file):
+    rt = RtmvParser()
+    rt.load(synth_file[0], use_index=False)
+    sec = rt.payload_sections[0]
+    yield rt, sec.start, sec.end
+    rt.free()
+
+
+def _recv(addr, out, delay=0.0):
+    with socket.create_connection(addr) as s:
+        buf = bytearray()
+        while True:
+            data = s.recv(64*1024)
+            if not data: break
+            buf += data
+            if delay: time.sleep(delay)
+    out.append(bytes(buf))
+
+
+@pytest.mark.parametrize('policy', RtmvPayloadRing.POLICIES)
+def test_fanout_feeder_sockets(video, policy):
+    rt, s, e = video
+    payloads = [bytes(p) for p in rt.getPayloads(range(s, e + 1))]
+    feeder = RtmvFanoutFeeder(rt, s, e, capacity=128*1024, policy=policy, min_consumers=2,
+                              autostart=True)
+    got = {'fast': [], 'slow': []}
+    threads = [threading.Thread(target=_recv, args=(feeder.hostaddr, got['fast'])),
+               threading.Thread(target=_recv, args=(feeder.hostaddr, got['slow'], 0.01))]
+    for t in threads: t.start()
+    for t in threads: t.join(60)
+    feeder.stop()
+    for data in (got['fast'][0], got['slow'][0]):
+        if policy == 'block':
+            assert data == b''.join(payloads)
+            continue
+        # a subsequence of whole payloads, from the start with no gap for
+        # disconnect. Which consumer falls a ring behind depends on the
+        # socket buffers, the gaps themselves are checked on the ring above.
+        pos, k, taken = 0, 0, []
+        while pos < len(data):
+            while not data.startswith(payloads[k], pos): k += 1
+            taken.append(k)
+            pos += len(payloads[k])
+            k += 1
+        if policy == 'disconnect':
+            assert taken == list(range(len(taken)))
@@ -0,0 +1,142 @@
+import socket
+import time
+
+import pytest
+
+from rtmv_synth import RtmvSynth
+from rtmvfile import RtmvParser, RtmvVidPayloadFeeder
+
+# stop, pause and resume are meant to take effect within a millisecond, the
+# bound leaves room for a loaded CI machine
+PROMPT = 0.05
+
+
+@pytest.fixture(scope='module')
+def rt(tmp_path_factory):
+    # larger than the socket buffers, so a consumer not reading blocks the feeder
+    url = str(tmp_path_factory.mktemp('feeder') / 'long.rtmv')
+    RtmvSynth(seed=3).write(url, (('video', 3000),))
+    rt = RtmvParser()
+    rt.load(url, use_index=False)
+    yield rt
+    rt.free()
+
+
+def _feeder(rt):
+    sec = rt.payload_sections[0]
+    return RtmvVidPayloadFeeder(rt, sec.start, sec.end, autostart=True, address=('127.0.0.1', 0))
+
+
+def _connect(feeder):
+    con = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    con.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8192)
+    con.connect(feeder.hostaddr)
+    return con
+
+
+def _blocked(feeder, timeout=5.0):
+    # wait until the feeder stops making progress on the full socket
+    sent, deadline = -1, time.monotonic() + timeout
+    while sent != feeder._sentbytes:
+        assert time.monotonic() < deadline, 'the feeder never blocked'
+        sent = feeder._sentbytes
+        time.sleep(0.1)
+    assert sent > 0 and feeder._thread.is_alive()
+
+
+def _timed(call):
+    t = time.monotonic()
+    call()
+    return time.monotonic() - t
+
+
+def _drain(con, timeout=0.2):
+    con.settimeout(timeout)
+    got = 0
+    try:
+        while True:
+            data = con.recv(1 << 20)
+            if not data: break
+            got += len(data)
+    except socket.timeout:
+        pass
+    return got
+
+
+def test_stop_blocked_on_full_socket(rt):
+    feeder = _feeder(rt)
+    con = _connect(feeder)
+    try:
+        _blocked(feeder)
+        assert feeder.status == RtmvVidPayloadFeeder.State.SENDING
+        assert _timed(feeder.stop) < PROMPT
+        assert feeder.status == RtmvVidPayloadFeeder.State.IDLE
+        assert not feeder._thread.is_alive()
+    finally:
+        con.close()
+
+
+def test_stop_without_consumer(rt):
+    feeder = _feeder(rt)
+    time.sleep(0.1)  # waiting for a connection
+    assert _timed(feeder.stop) < PROMPT
+    assert feeder.status == RtmvVidPayloadFeeder.State.IDLE
+    assert not feeder._thread.is_alive()
+    assert feeder._sentbytes == 0
+
+
+def test_pause_blocked_on_full_socket(rt):
+    feeder = _feeder(rt)
+    con = _connect(feeder)
+    try:
+        _blocked(feeder)
+        assert _timed(feeder.pause) < PROMPT
+        assert feeder.status == RtmvVidPayloadFeeder.State.PAUSE
+        # what was sent before the pause is still readable, nothing after it
+        got = _drain(con)
+        sent = feeder._sentbytes
+        assert got > 0
+        assert _drain(con) == 0
+        assert feeder._sentbytes == sent
+        assert _timed(feeder.resume) < PROMPT
+        assert _drain(con) > 0
+        assert _timed(feeder.stop) < PROMPT
+        assert not feeder._thread.is_alive()
+    finally:
+        con.close()
+
+
+def test_pause_without_consumer(rt):
+    feeder = _feeder(rt)
+    time.sleep(0.1)
+    assert _timed(feeder.pause) < PROMPT
+    assert feeder.status == RtmvVidPayloadFeeder.State.PAUSE
+    # stopping a paused feeder does not wait for a resume
+    assert _timed(feeder.stop) < PROMPT
+    assert not feeder._thread.is_alive()
+
+
+def test_start_after_stop(rt):
+    sec = rt.payload_sections[0]
+    feeder = RtmvVidPayloadFeeder(rt, sec.start, sec.end, address=('127.0.0.1', 0))
+    for _ in range(2):
+        feeder.start()
+        con = _connect(feeder)
+        try:
+            _blocked(feeder)
+            assert _timed(feeder.stop) < PROMPT
+        finally:
+            con.close()
+    # a feeder stopped twice feeds the whole section a third time
+    feeder.start()
+    con = socket.create_connection(feeder.hostaddr)
+    got = bytearray()
+    while True:
+        data = con.recv(1 << 20)
+        if not data: break
+        got += data
+    con.close()
+    feeder._thread.join(5)
+    assert bytes(got) == b''.join(rt.iterPayloadViews(range(sec.start, sec.end + 1)))
+    assert feeder.status == RtmvVidPayloadFeeder.State.IDLE
+    feeder.stop()
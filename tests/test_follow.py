@@ -0,0 +1,79 @@
+import threading
+import time
+
+import numpy as np
+
+from rtmvfile import RtmvParser
+
+
+def _assertSameTable(a: RtmvParser, b: RtmvParser):
+    assert np.array_equal(a.rtmvpackages.offsets, b.rtmvpackages.offsets)
+    assert np.array_equal(a.rtmvpackages.sizes, b.rtmvpackages.sizes)
+    assert a.headers.tobytes() == b.headers.tobytes()
+    assert list(a.rtmv_sync) == list(b.rtmv_sync)
+    assert [(s.start, s.end, s.type) for s in a.payload_sections] == \
+           [(s.start, s.end, s.type) for s in b.payload_sections]
+
+
+def _read(rt, stop, errors):
+    # what a GUI or feeder thread does meanwhile
+    while not stop.is_set():
+        try:
+            with rt.lock:
+                n = len(rt.rtmvpackages)
+                assert len(rt.headers) == n
+                secs = rt.payload_sections
+                assert secs[0].start == 0 and secs[-1].end == n - 1
+            headers = rt.headers  # a snapshot without the lock
+            last = rt.getPosFromTime(float(headers['timestamp'][-1] - rt.start_time))
+            assert 0 <= last < len(rt.rtmvpackages)
+            assert sum(e - s + 1 for s, e in rt.getRangeFromTimes(-1.0, 1e9)) >= len(headers)
+        except Exception as e:  # failed in this thread, reported by the test
+            errors.append(e)
+            return
+
+
+def test_follow_a_growing_file(synth_file, tmp_path):
+    src, manifest = synth_file
+    with open(src, 'rb') as f:
+        data = f.read()
+    url = str(tmp_path / 'growing.rtmv')
+    with open(url, 'wb') as f:
+        f.write(data[:100000])  # ends inside a package
+
+    rt = RtmvParser()
+    rt.load(url, use_index=False)
+    first_cnt = len(rt.rtmvpackages)
+    added = []
+    rt.follow(lambda rt, first, last: added.append((first, last)), interval=0.02)
+    stop, errors = threading.Event(), []
+    reader = threading.Thread(target=_read, args=(rt, stop, errors))
+    reader.start()
+    with open(url, 'ab') as f:
+        for pos in range(100000, len(data), 37000):
+            f.write(data[pos:pos + 37000])
+            f.flush()
+            time.sleep(0.01)
+    # the last package is taken by unfollow, nothing tells it is complete before
+    deadline = time.monotonic() + 5
+    while len(rt.rtmvpackages) < manifest['packages'] - 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert rt.following and len(rt.rtmvpackages) == manifest['packages'] - 1
+    rt.unfollow()
+    stop.set()
+    reader.join()
+    assert errors == []
+
+    # the packages were added in order, each once
+    assert len(added) > 1
+    assert added[0][0] == first_cnt and added[-1][1] == manifest['packages'] - 1
+    assert all(a[1] + 1 == b[0] for a, b in zip(added, added[1:]))
+    fresh = RtmvParser()
+    fresh.load(url, use_index=False)
+    _assertSameTable(rt, fresh)
+    assert rt.duration == fresh.duration
+    assert rt.getRangeFromTimes(0, rt.duration) == fresh.getRangeFromTimes(0, fresh.duration)
+    pkgs = range(len(fresh.rtmvpackages))
+    assert b''.join(rt.iterPayloadViews(pkgs)) == b''.join(fresh.iterPayloadViews(pkgs))
+    fresh.free()
+    rt.free()
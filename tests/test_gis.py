@@ -0,0 +1,33 @@
+import json
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+from rtmv_gis import RtmvRoute
+
+
+@pytest.fixture
+def route():
+    return RtmvRoute(np.array([1600000000.0, 1600000001.0, 1600000002.0]),
+                     np.array([30.0, 30.001, 30.002]), np.array([120.0, 120.001, 120.002]),
+                     np.array([100.0, np.nan, 102.0]), name='A&B <test>')
+
+
+def test_geojson_is_valid_json(route, tmp_path):
+    url = str(tmp_path / 'route.geojson')
+    route.save(url)
+    with open(url) as f:
+        doc = json.load(f, parse_constant=lambda c: pytest.fail(f'{c} in the output'))
+    feature = doc['features'][0]
+    assert feature['properties']['name'] == 'A&B <test>'
+    assert [len(c) for c in feature['geometry']['coordinates']] == [3, 2, 3]
+
+
+@pytest.mark.parametrize('ext', ['.kml', '.gpx'])
+def test_xml_is_well_formed(route, tmp_path, ext):
+    url = str(tmp_path / ('route' + ext))
+    route.save(url)
+    names = [e.text for e in ET.parse(url).iter() if e.tag.endswith('name')]
+    assert names == ['A&B <test>']
+    assert 'nan' not in open(url).read()
@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+import pytest
+
+from rtmvfile import RtmvParser
+from rtmv_ingest import RtmvIngestServer, replay
+from rtmv_synth import RtmvSynth
+
+
+@pytest.fixture(scope='module')
+def small_file(tmp_path_factory):
+    url = str(tmp_path_factory.mktemp('ingest') / 'small.rtmv')
+    RtmvSynth(seed=3).write(url, (('video', 30), ('image', 3)))
+    return url
+
+
+def _count(url):
+    rt = RtmvParser()
+    rt.load(url, use_index=False)
+    n = len(rt.rtmvpackages)
+    rt.free()
+    return n
+
+
+async def _wait(cond, timeout=5.0):
+    for _ in range(int(timeout/0.01)):
+        if cond(): return
+        await asyncio.sleep(0.01)
+    pytest.fail('timed out')
+
+
+def _ingest(url, udp, tmp_path, consume=True, **kw):
+    '''
+    replay url to a server on the loopback, return the streams seen as
+    (stream, packages taken from its queue) and the queues left over
+    '''
+    async def main():
+        streams, tasks = [], []
+
+        async def eat(stream):
+            n = 0
+            while await stream.queue.get() is not None: n += 1
+            streams.append((stream, n))
+
+        def on_stream(stream):
+            if consume:
+                tasks.append(asyncio.ensure_future(eat(stream)))
+            else:
+                streams.append((stream, None))
+
+        server = RtmvIngestServer('127.0.0.1', 0, udp_port=0 if udp else None, record_dir=str(tmp_path),
+                                  on_stream=on_stream, **kw)
+        await server.start()
+        port = server._udp_transport.get_extra_info('sockname')[1] if udp else server.hostaddr[1]
+        sent = await replay(url, '127.0.0.1', port, udp=udp, chunk_size=8000)
+        await _wait(lambda: len(server.streams) == 0 and all(t.done() for t in tasks))
+        await server.stop()
+        return sent, streams
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('udp', [False, True])
+def test_replay_loopback(small_file, tmp_path, udp):
+    sent, streams = _ingest(small_file, udp, tmp_path, udp_timeout=0.2)
+    assert sent == os.path.getsize(small_file)
+    assert len(streams) == 1
+    stream, n = streams[0]
+    assert n == stream.stats['packages'] == _count(small_file)
+    assert stream.stats['bytes'] == sent and stream.stats['dropped'] == 0
+    # the file holds packages only, so the recording is the same bytes
+    records = os.listdir(tmp_path)
+    assert len(records) == 1
+    with open(tmp_path / records[0], 'rb') as a, open(small_file, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_tcp_full_queue_does_not_hold_the_end(small_file, tmp_path):
+    # the queue takes all but the last package, released at the end of the
+    # stream, and nobody reads it: the stream still ends and is dropped
+    n = _count(small_file)
+    sent, streams = _ingest(small_file, False, tmp_path, consume=False, queue_size=n - 1)
+    stream, _ = streams[0]
+    assert stream.closed and stream.stats['packages'] == n
+    # the last package did not fit, an old one made room for the end mark
+    assert stream.stats['dropped'] == 2
+    q = stream.queue
+    items = [q.get_nowait() for _ in range(q.qsize())]
+    assert items[-1] is None and len(items) == n - 1
+
+
+def test_udp_full_queue_drops(small_file, tmp_path):
+    n = _count(small_file)
+    sent, streams = _ingest(small_file, True, tmp_path, consume=False, queue_size=5, udp_timeout=0.2)
+    stream, _ = streams[0]
+    assert stream.stats['packages'] == n
+    assert stream.stats['dropped'] == n - 5 + 1
+    assert stream.queue.qsize() == 5
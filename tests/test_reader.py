@@ -0,0 +1,48 @@
+import av
+import pytest
+
+from rtmvfile import RtmvParser, RtmvPayloadReader, RtmvVidPayloadFeeder
+
+
+@pytest.fixture(scope='module')
+def rt(synth_file):
+    rt = RtmvParser()
+    rt.load(synth_file[0], use_index=False)
+    yield rt
+    rt.free()
+
+
+def _videoSections(rt):
+    return [sec for sec in rt.payload_sections if sec.type == RtmvParser.PayloadType.VIDEO]
+
+
+def _decode(source):
+    ct = av.open(source, mode='r')
+    try:
+        return sum(1 for _ in ct.decode(video=0))
+    finally:
+        ct.close()
+
+
+def test_reader_reads_the_payloads(rt):
+    sec = _videoSections(rt)[0]
+    reader = RtmvPayloadReader(rt, sec.start, sec.end)
+    data = bytearray()
+    while True:
+        chunk = reader.read(10000)
+        if not chunk: break
+        data += chunk
+    assert bytes(data) == b''.join(rt.iterPayloadViews(range(sec.start, sec.end + 1)))
+
+
+@pytest.mark.parametrize('k', [0, 1])
+def test_reader_decodes_as_the_feeder(rt, k):
+    # the player takes either, in process or over tcp
+    sec = _videoSections(rt)[k]
+    frames = _decode(RtmvPayloadReader(rt, sec.start, sec.end))
+    feeder = RtmvVidPayloadFeeder(rt, sec.start, sec.end, autostart=True, address=('127.0.0.1', 0))
+    try:
+        assert frames == _decode(feeder.url)
+    finally:
+        feeder.stop()
+    assert frames == sec.end - sec.start + 1
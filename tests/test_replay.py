@@ -0,0 +1,68 @@
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from rtmvfile import RtmvParser
+from rtmv_replay import RtmvReplayServer, RtmvReplayDrone, _Lateness
+from rtmv_synth import RtmvSynth
+
+
+@pytest.fixture(scope='module')
+def flight(tmp_path_factory):
+    url = str(tmp_path_factory.mktemp('replay') / 'flight.rtmv')
+    RtmvSynth(seed=5).write(url, (('video', 50), ('image', 2), ('video', 50)))
+    return url
+
+
+def _receive(addr, out):
+    with socket.create_connection(addr) as s:
+        buf = bytearray()
+        while True:
+            data = s.recv(1024*1024)
+            if not data: break
+            buf += data
+    out.append(bytes(buf))
+
+
+def test_replay_loopback(flight):
+    speed = 4.0
+    server = RtmvReplayServer()
+    drone = RtmvReplayDrone(flight, speed=speed)
+    addr = server.addDrone(drone, port=0)
+    got = []
+    subscriber = threading.Thread(target=_receive, args=(addr, got))
+    subscriber.start()
+    time.sleep(0.05)
+    t0 = time.perf_counter()
+    server.start(delay=0.1)
+    assert server.join(30)
+    wall = time.perf_counter() - t0
+    subscriber.join(5)
+    stats = server.stats()
+    server.close()
+
+    with open(flight, 'rb') as f:
+        assert got == [f.read()]
+    assert not os.path.exists(flight + RtmvParser.INDEX_SUFFIX)
+    # the whole flight took its duration over speed, and no package was much late
+    assert wall == pytest.approx(0.1 + drone.duration, abs=0.25)
+    assert stats['all']['count'] == stats['all']['packages'] == len(drone)
+    assert stats['all']['p50'] < 0.002
+    assert stats['all']['max'] < 0.1
+
+
+def test_lateness_memory_is_bounded():
+    late = _Lateness()
+    values = np.random.default_rng(0).exponential(0.001, 100000)
+    for v in values: late.add(float(v))
+    stats = late.stats()
+    assert len(late._sample) == _Lateness.RESERVOIR
+    assert stats['count'] == len(values)
+    assert stats['max'] == values.max()
+    assert stats['mean'] == pytest.approx(values.mean())
+    assert stats['over_1ms'] == np.count_nonzero(values > 0.001)
+    assert stats['p50'] == pytest.approx(np.median(values), rel=0.1)
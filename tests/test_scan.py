@@ -0,0 +1,163 @@
+import shutil
+import struct
+
+import numpy as np
+import pytest
+
+from rtmvfile import RtmvParser
+from rtmv_synth import RtmvSynth
+
+
+def _load(url, **kw):
+    rt = RtmvParser()
+    rt.load(url, **dict({'use_index': False}, **kw))
+    return rt
+
+
+def _assertSameTable(a: RtmvParser, b: RtmvParser):
+    assert np.array_equal(a.rtmvpackages.offsets, b.rtmvpackages.offsets)
+    assert np.array_equal(a.rtmvpackages.sizes, b.rtmvpackages.sizes)
+    assert a.headers.tobytes() == b.headers.tobytes()
+    assert list(a.rtmv_sync) == list(b.rtmv_sync)
+    assert [(s.start, s.end, s.type) for s in a.payload_sections] == \
+           [(s.start, s.end, s.type) for s in b.payload_sections]
+
+
+@pytest.fixture(params=['clean', 'damaged'])
+def url(request, synth_file, damaged_file):
+    return (synth_file if request.param == 'clean' else damaged_file)[0]
+
+
+def test_synth_manifest(synth_file):
+    url, manifest = synth_file
+    rt = _load(url)
+    assert len(rt.rtmvpackages) == manifest['packages'] == 612
+    assert int(rt.rtmvpackages.sizes.sum()) == manifest['size']
+    assert [s.type for s in rt.payload_sections] == [RtmvParser.PayloadType.VIDEO,
+                                                     RtmvParser.PayloadType.IMAGE,
+                                                     RtmvParser.PayloadType.VIDEO]
+    rt.free()
+
+
+@pytest.mark.parametrize('robust', [False, True])
+def test_parallel_scan_equals_serial(url, monkeypatch, robust):
+    serial = _load(url, robust=robust)
+    # small ranges, so that range boundaries fall inside packages
+    monkeypatch.setattr(RtmvParser, 'PARALLEL_SCAN_MIN_RANGE', 64*1024)
+    calls = []
+    scan = RtmvParser._scanParallel
+    monkeypatch.setattr(RtmvParser, '_scanParallel', lambda self, w: calls.append(w) or scan(self, w))
+    parallel = _load(url, scan_workers=3, robust=robust)
+    assert calls == [3]
+    _assertSameTable(serial, parallel)
+    serial.free()
+    parallel.free()
+
+
+@pytest.mark.parametrize('mode', [{'use_mmap': True}, {'header_only': True}])
+def test_load_modes_agree(url, mode):
+    a, b = _load(url), _load(url, **mode)
+    _assertSameTable(a, b)
+    assert bytes(b.getPackage(len(b.rtmvpackages) - 1)) == bytes(a.getPackage(len(a.rtmvpackages) - 1))
+    a.free()
+    b.free()
+
+
+@pytest.mark.parametrize('chunk_size', [1000, 4096, 1024*1024])
+def test_iter_packages_equals_load(url, chunk_size):
+    rt = _load(url)
+    with open(url, 'rb') as f:
+        pkgs = list(RtmvParser.iter_packages(f, chunk_size))
+    assert len(pkgs) == len(rt.rtmvpackages)
+    for i, (header, payload) in enumerate(pkgs):
+        assert struct.pack(RtmvParser._struct_fmt, *header) + bytes(payload) == bytes(rt.getPackage(i))
+    rt.free()
+
+
+@pytest.mark.parametrize('robust', [False, True])
+def test_index_equals_scan(url, tmp_path, monkeypatch, robust):
+    copy = str(tmp_path / 'copy.rtmv')
+    shutil.copyfile(url, copy)
+    fresh = _load(copy, robust=robust)
+    _load(copy, use_index=True, robust=robust).free()   # writes the index
+    monkeypatch.setattr(RtmvParser, '_scanPackages', lambda *a: pytest.fail('scanned, index not used'))
+    indexed = _load(copy, use_index=True, robust=robust)
+    _assertSameTable(fresh, indexed)
+    fresh.free()
+    indexed.free()
+
+
+def test_index_keeps_probed_sections(synth_file, tmp_path):
+    copy = str(tmp_path / 'copy.rtmv')
+    shutil.copyfile(synth_file[0], copy)
+    rt = _load(copy, use_index=True)
+    rt.probeSections()
+    metas = [s.meta for s in rt.payload_sections]
+    rt.payload_sections.clear()   # as the GUI used to do before free()
+    rt.free()
+    rt = _load(copy, use_index=True)
+    assert [s.probed for s in rt.payload_sections] == [True]*3
+    assert [s.meta for s in rt.payload_sections] == metas
+    rt.free()
+
+
+def test_robust_recovers_from_damage(damaged_file):
+    url, manifest = damaged_file
+    sections = [tuple(s) for s in manifest['sections']]
+    originals = [header + payload for header, payload in RtmvSynth(seed=manifest['seed']).packages(sections)]
+    damaged = dict(manifest['damaged'])
+    # a package is lost if its own header is broken, or if garbage behind it
+    # leaves nothing to confirm it
+    expected = [i for i in range(manifest['complete'])
+                if damaged.get(i) not in ('signature', 'size') and damaged.get(i + 1) != 'garbage']
+
+    plain, robust = _load(url), _load(url, robust=True)
+    assert len(robust.rtmvpackages) > len(plain.rtmvpackages)
+    assert [bytes(robust.getPackage(i)) for i in range(len(robust.rtmvpackages))] == \
+           [originals[i] for i in expected]
+
+    report = robust.damageReport()
+    assert report['packages'] == len(expected)
+    assert report['damaged_bytes'] + int(robust.rtmvpackages.sizes.sum()) == manifest['size']
+    plain.free()
+    robust.free()
+
+
+def test_lazy_probes_write_the_index_once(synth_file, tmp_path, monkeypatch):
+    copy = str(tmp_path / 'copy.rtmv')
+    shutil.copyfile(synth_file[0], copy)
+    _load(copy, use_index=True).free()
+    writes = []
+    write = RtmvParser._writeIndex
+    monkeypatch.setattr(RtmvParser, '_writeIndex', lambda self: writes.append(1) or write(self))
+    rt = _load(copy, use_index=True)
+    metas = [s.meta for s in rt.payload_sections]
+    assert writes == []
+    rt.free()
+    assert writes == [1]
+    rt = _load(copy, use_index=True)
+    assert [s.probed for s in rt.payload_sections] == [True]*3
+    assert [s.meta for s in rt.payload_sections] == metas
+    rt.free()
+    assert writes == [1]
+
+
+def test_sections_cover_every_package(synth_file):
+    rt = _load(synth_file[0])
+    secs = rt.payload_sections
+    assert secs[0].start == 0 and secs[-1].end == len(rt.rtmvpackages) - 1
+    assert all(a.end + 1 == b.start for a, b in zip(secs, secs[1:]))
+    rt.free()
+
+
+@pytest.mark.parametrize('kind', ['video', 'image'])
+def test_one_package_file(tmp_path, kind):
+    url = str(tmp_path / 'one.rtmv')
+    RtmvSynth().write(url, ((kind, 1),))
+    rt = _load(url)
+    assert len(rt.rtmvpackages) == 1
+    assert [(s.start, s.end) for s in rt.payload_sections] == [(0, 0)]
+    assert rt.cutPoints().tolist() == [0]
+    out = str(tmp_path / 'cut.rtmv')
+    assert rt.trim(out) == rt.rtmvpackages.sizes[0]
+    rt.free()
@@ -0,0 +1,50 @@
+import numpy as np
+
+from rtmvfile import RtmvSpatialIndex
+
+
+def test_within_across_antimeridian():
+    ix = RtmvSpatialIndex([30.0, 30.0, -10.0], [179.99, 170.0, -179.995])
+    assert ix.within(30.0, -179.99, 5000).tolist() == [0]
+    assert ix.nearest(30.0, -179.99)[0] == 0
+    assert ix.nearest(-10.0, 179.999)[0] == 2
+
+
+def test_queries_match_full_scan():
+    rng = np.random.default_rng(0)
+    lat, lon = rng.uniform(-80, 80, 2000), rng.uniform(-180, 180, 2000)
+    ix = RtmvSpatialIndex(lat, lon)
+    for _ in range(100):
+        qlat, qlon, radius = rng.uniform(-89, 89), rng.uniform(-180, 180), rng.uniform(1e4, 2e6)
+        d = ix.distance(qlat, qlon, lat, lon)
+        assert np.array_equal(ix.within(qlat, qlon, radius), np.flatnonzero(d <= radius))
+        i, dist = ix.nearest(qlat, qlon)
+        assert np.isclose(dist, d.min())
+
+
+def test_inside_across_antimeridian():
+    lat = [15.0, 15.0, 15.0, 15.0, 15.0, 25.0, 12.0]
+    lon = [179.0, -179.0, 170.0, -170.0, 0.0, 179.0, -179.9]
+    ix = RtmvSpatialIndex(lat, lon)
+    box = [(10.0, 175.0), (10.0, -175.0), (20.0, -175.0), (20.0, 175.0)]
+    assert ix.inside(box).tolist() == [0, 1, 6]
+    # the same box from the other side of the antimeridian
+    assert ix.inside([(la, lo - 360.0 if lo > 0 else lo) for la, lo in box]).tolist() == [0, 1, 6]
+
+
+def test_inside_does_not_depend_on_the_meridian():
+    rng = np.random.default_rng(1)
+    lat, lon = rng.uniform(-60, 60, 3000), rng.uniform(-180, 180, 3000)
+    wrap = lambda lon: (lon + 180.0) % 360.0 - 180.0
+    for _ in range(20):
+        # a star shaped polygon around a centre, and the same rotated in
+        # longitude so that it crosses the antimeridian
+        clat, clon = rng.uniform(-30, 30), rng.uniform(-150, 150)
+        ang = np.sort(rng.uniform(0, 2*np.pi, 7))
+        r = rng.uniform(5, 25, 7)
+        poly = np.stack((clat + r*np.sin(ang), clon + r*np.cos(ang)), axis=1)
+        shift = 180.0 - clon
+        moved = np.stack((poly[:, 0], wrap(poly[:, 1] + shift)), axis=1)
+        expect = RtmvSpatialIndex(lat, lon).inside(poly)
+        assert len(expect) > 0
+        assert np.array_equal(RtmvSpatialIndex(lat, wrap(lon + shift)).inside(moved), expect)
@@ -0,0 +1,86 @@
+import struct
+
+import numpy as np
+import pytest
+
+from rtmvfile import RtmvParser
+from rtmv_synth import RtmvSynth
+
+# four runs of 20 packages 0.5s apart. The clock goes back from the 1st run
+# to the 2nd so they overlap in time, jumps forward to the 3rd in the same
+# segment, and the 4th starts a segment after a sync, with garbage in front
+# of it.
+RUNS = (100.0, 105.0, 200.0, 300.0)
+
+
+@pytest.fixture(scope='module')
+def rt(tmp_path_factory):
+    url = str(tmp_path_factory.mktemp('time') / 'segments.rtmv')
+    k = [fe.name for fe in RtmvParser.protocol].index('timestamp')
+    with open(url, 'wb') as f:
+        for i, (header, payload) in enumerate(RtmvSynth(seed=4).packages((('video', 80),))):
+            run, j = divmod(i, 20)
+            values = list(struct.unpack(RtmvParser._struct_fmt, header))
+            values[k] = RUNS[run] + 0.5*j
+            if i == 60: f.write(b'\x55'*100)
+            f.write(struct.pack(RtmvParser._struct_fmt, *values))
+            f.write(payload)
+    rt = RtmvParser()
+    rt.load(url, use_index=False)
+    yield rt
+    rt.free()
+
+
+def test_segments(rt):
+    # the package in front of the garbage goes with it
+    assert len(rt.rtmvpackages) == 79
+    assert rt.start_time == 100.0
+    assert rt.time_segments == [(0, 19), (20, 58), (59, 78)]
+
+
+@pytest.mark.parametrize('sec, pkg', [
+    (0.0, 0), (1.2, 2), (2.0, 4),       # the last package not later than it
+    (6.2, 12),                          # both of the first runs, the first one wins
+    (12.0, 34),                         # only in the 2nd run
+    (109.0, 58), (200.0, 59),           # the ends around the sync
+    (30.0, 39), (90.0, 39),             # in a gap of a segment, the package before
+    (150.0, 58), (195.0, 59),           # between the segments, the nearest package
+    (-10.0, 0), (500.0, 78),            # before the start, after the end
+])
+def test_pos_from_time(rt, sec, pkg):
+    assert rt.getPosFromTime(sec) == pkg
+
+
+@pytest.mark.parametrize('t0, t1, ranges', [
+    (6.0, 7.0, [(12, 14), (22, 24)]),   # overlapping runs, one range each
+    (105.0, 201.0, [(50, 58), (59, 61)]),  # split at the sync
+    (-10.0, 0.5, [(0, 1)]),
+    (205.0, 300.0, [(69, 78)]),
+    (-60.0, 1000.0, [(0, 19), (20, 58), (59, 78)]),
+    (30.0, 90.0, []),                   # in a gap of a segment
+    (150.0, 195.0, []),                 # between the segments
+    (-60.0, -10.0, []), (300.0, 400.0, []),
+])
+def test_range_from_times(rt, t0, t1, ranges):
+    assert rt.getRangeFromTimes(t0, t1) == ranges
+
+
+def test_nearest_package(rt):
+    ts = rt.headers['timestamp']
+    for sec in np.arange(-20.0, 230.0, 0.3):
+        t = rt.start_time + sec
+        assert abs(ts[rt.getNearestPackage(sec)] - t) == np.abs(ts - t).min()
+    # the tie between the overlapping runs goes to either of them
+    assert rt.getNearestPackage(6.0) in (12, 22)
+
+
+def test_pos_from_time_by_brute_force(rt):
+    ts = rt.headers['timestamp']
+    for sec in np.arange(-20.0, 230.0, 0.3):
+        t = rt.start_time + sec
+        for s, e in rt.time_segments:
+            if ts[s] <= t <= ts[e]:
+                assert rt.getPosFromTime(sec) == s + np.flatnonzero(ts[s:e+1] <= t)[-1]
+                break
+        else:
+            assert rt.getPosFromTime(sec) == rt.getNearestPackage(sec)